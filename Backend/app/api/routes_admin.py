@@ -0,0 +1,69 @@
+# app/api/routes_admin.py
+import asyncio
+import secrets
+import time
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import PlainTextResponse
+
+from app.core import config, profiler, tracing
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    """Allow the request only with the configured X-Admin-Token; hide the endpoints when none is set."""
+    if not config.ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not secrets.compare_digest(x_admin_token, config.ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Invalid admin token")
+
+router = APIRouter(prefix="/admin", dependencies=[Depends(require_admin)])
+
+@router.get("/traces")
+async def list_traces(limit: int = Query(20, ge=1, le=500)):
+    """Most recent sampled traces from this worker's ring buffer, with their spans."""
+    return {
+        "sample_rate": tracing.TRACE_SAMPLE_RATE,
+        "job_sample_rate": tracing.TRACE_JOB_SAMPLE_RATE,
+        "forced_per_second": tracing.TRACE_FORCED_PER_SECOND,
+        "exporters": tracing.TRACE_EXPORT,
+        "dropped_spans": tracing.dropped_spans,
+        "traces": tracing.recent_traces(limit),
+    }
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    traces = tracing.recent_traces(1, trace_id=trace_id)
+    if not traces:
+        raise HTTPException(status_code=404, detail="Trace not found in the buffer")
+    return traces[0]
+
+@router.post("/profile")
+async def profile(
+    seconds: float = Query(10.0, gt=0, le=profiler.PROFILE_MAX_SECONDS),
+    interval_ms: float = Query(10.0, ge=profiler.PROFILE_MIN_INTERVAL_MS),
+    idle: bool = Query(False, description="keep stacks of threads that are only waiting"),
+    format: str = Query("collapsed", pattern="^(collapsed|json)$"),
+):
+    """
+    Sample this worker's stacks for the given seconds and return them collapsed
+    (flamegraph.pl / speedscope input), or as JSON with per-module app.ml and
+    app.api attribution. Returns 409 while another profile is running.
+    """
+    try:
+        sampler = profiler.acquire(interval_ms, include_idle=idle)
+    except profiler.ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    start = time.perf_counter()
+    try:
+        # Waits on the event loop, so the worker keeps serving while it is profiled
+        await asyncio.sleep(seconds)
+    finally:
+        result = profiler.release(sampler, time.perf_counter() - start)
+
+    if format == "json":
+        return result
+    return PlainTextResponse(result["collapsed"], headers={
+        "X-Profile-Samples": str(result["samples"]),
+        "X-Profile-Overhead-Pct": str(result["overhead_pct"]),
+    })
@@ -1,14 +1,29 @@
 # app/api/routes_crop.py
-from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from app.ml.model_inference import predict_crop
-from app.core.firebase_utils import init_firebase
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from app.ml.model_inference import predict_crop, predict_crops_batch
+from app.core.metrics import timer
+from app.core.storage import get_storage
+from app.core.write_behind import prediction_log
+import asyncio
+import base64
 import datetime
+import json
+import os
 
 router = APIRouter()
 
-# Initialize Firestore
-db = init_firebase()
+# Upper bound for the number of alternative crops returned per plot
+MAX_TOP_K = 10
+
+# Upper bound for the number of rows in one add_crop_data_batch request
+MAX_BATCH_SIZE = int(os.getenv("CROP_MAX_BATCH_SIZE", "1000"))
+
+# Page sizes for get_all_crops
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
 
 class CropRequest(BaseModel):
     N: float
@@ -18,45 +33,122 @@ class CropRequest(BaseModel):
     humidity: float
     ph: float
     rainfall: float
+    soil_type: Optional[str] = None
+    crop_type: Optional[str] = None
+
+class CropBatchRequest(BaseModel):
+    records: List[CropRequest] = Field(..., max_length=MAX_BATCH_SIZE)
+
+def _crop_document(data: CropRequest, predicted_crop: str, timestamp: datetime.datetime) -> dict:
+    return {
+        "N": data.N,
+        "P": data.P,
+        "K": data.K,
+        "temperature": data.temperature,
+        "humidity": data.humidity,
+        "ph": data.ph,
+        "rainfall": data.rainfall,
+        "predicted_crop": predicted_crop,
+        "timestamp": timestamp
+    }
+
+def _encode_cursor(timestamp: datetime.datetime, doc_id: str) -> str:
+    payload = json.dumps({"ts": timestamp.isoformat(), "id": doc_id})
+    return base64.urlsafe_b64encode(payload.encode()).decode()
+
+def _decode_cursor(cursor: str) -> tuple:
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.datetime.fromisoformat(payload["ts"]), payload["id"]
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def _crop_records(cursor: Optional[str], limit: Optional[int] = None):
+    """crop_data ordered by (timestamp, document id), optionally resuming after a cursor."""
+    return get_storage().list("crop_data", limit=limit, after=_decode_cursor(cursor) if cursor else None)
+
+def _ndjson_lines(records):
+    for item in records:
+        yield json.dumps(item, default=str) + "\n"
 
 @router.get("/get_all_crops")
-async def get_all_crops():
-    """Fetch all crop records from Firebase."""
+async def get_all_crops(
+    limit: int = Query(DEFAULT_PAGE_SIZE, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    format: Literal["json", "ndjson"] = "json",
+):
+    """Fetch stored crop records, one page at a time or as an NDJSON stream.
+
+    Pages are ordered by timestamp then document ID; pass the returned next_cursor
+    to get the following page. format=ndjson streams every record after the cursor
+    as storage delivers them, so server memory stays constant.
+    """
+    if format == "ndjson":
+        return StreamingResponse(_ndjson_lines(_crop_records(cursor)), media_type="application/x-ndjson")
+
     try:
-        docs = db.collection("crop_data").stream()
-        data = []
-        for doc in docs:
-            item = doc.to_dict()
-            item["id"] = doc.id
-            data.append(item)
-        return data
+        # Storage clients block, so the query runs off the event loop
+        with timer("storage.list"):
+            data = await asyncio.to_thread(lambda: list(_crop_records(cursor, limit + 1)))
+
+        next_cursor = None
+        if len(data) > limit:
+            data = data[:limit]
+            next_cursor = _encode_cursor(data[-1]["timestamp"], data[-1]["id"])
+
+        return {"items": data, "next_cursor": next_cursor}
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.post("/add_crop_data")
-async def add_crop_data(data: CropRequest):
+async def add_crop_data(data: CropRequest, top_k: Optional[int] = Query(None, ge=1, le=MAX_TOP_K)):
     try:
-        # ✅ Predict crop
-        prediction = predict_crop(data.dict())
-
-        # ✅ Store in Firebase
-        doc_ref = db.collection("crop_data").add({
-            "N": data.N,
-            "P": data.P,
-            "K": data.K,
-            "temperature": data.temperature,
-            "humidity": data.humidity,
-            "ph": data.ph,
-            "rainfall": data.rainfall,
-            "predicted_crop": prediction["recommended_crop"],
-            "timestamp": datetime.datetime.utcnow()
-        })
+        # ✅ Predict crop (and the top-k alternatives from the same forest pass)
+        prediction = predict_crop(data.dict(), top_k=top_k)
 
-        return {
+        # ✅ Queue for batched storage
+        doc_id = await prediction_log.enqueue(
+            "crop_data",
+            _crop_document(data, prediction["recommended_crop"], datetime.datetime.utcnow())
+        )
+
+        response = {
             "status": "success",
             "recommended_crop": prediction["recommended_crop"],
-            "doc_id": doc_ref[1].id
+            "doc_id": doc_id
+        }
+        if top_k:
+            response["top_k"] = prediction["top_k"]
+        return response
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/add_crop_data_batch")
+async def add_crop_data_batch(data: CropBatchRequest, top_k: Optional[int] = Query(None, ge=1, le=MAX_TOP_K)):
+    """Predict crops for many soil-test rows at once and store them with batched writes."""
+    try:
+        # ✅ Predict all crops in a single model pass
+        predictions = predict_crops_batch([record.dict() for record in data.records], top_k=top_k)
+
+        # ✅ Queue for batched storage
+        timestamp = datetime.datetime.utcnow()
+        doc_ids = await prediction_log.enqueue_many("crop_data", [
+            _crop_document(record, prediction["recommended_crop"], timestamp)
+            for record, prediction in zip(data.records, predictions)
+        ])
+
+        return {
+            "status": "success",
+            "count": len(predictions),
+            "results": [
+                {**prediction, "doc_id": doc_id}
+                for prediction, doc_id in zip(predictions, doc_ids)
+            ]
         }
 
     except Exception as e:
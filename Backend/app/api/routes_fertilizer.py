@@ -1,11 +1,10 @@
 from fastapi import APIRouter, HTTPException
 from app.schemas.fertilizer_schema import FertilizerRequest, FertilizerResponse
 from app.ml.fertilizer_model import recommend_fertilizer_logic
-from app.core.firebase_utils import init_firebase
+from app.core.write_behind import prediction_log
 from datetime import datetime
 
 router = APIRouter()
-db = init_firebase()
 
 @router.post("/get_fertilizer", response_model=FertilizerResponse)
 async def get_fertilizer_recommendation(req: FertilizerRequest):
@@ -13,14 +12,14 @@ async def get_fertilizer_recommendation(req: FertilizerRequest):
         # Get recommendation from ML model
         result = recommend_fertilizer_logic(req)
         
-        # Store recommendation in Firebase
+        # Queue recommendation for storage
         recommendation_doc = {
             "timestamp": datetime.utcnow().isoformat(),
             "input_params": req.dict(),
             "recommendation": result
         }
         
-        db.collection("fertilizer_recommendations").add(recommendation_doc)
+        await prediction_log.enqueue("fertilizer_recommendations", recommendation_doc)
         
         return FertilizerResponse(
             status="success",
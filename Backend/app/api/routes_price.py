@@ -1,12 +1,14 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import joblib
 import numpy as np
+import asyncio
 import datetime
-from app.core.firebase_utils import init_firebase
+from app.core.metrics import timer
+from app.core.storage import get_storage
+from app.core.write_behind import prediction_log
+from app.ml.model_registry import get_price_model
 
 router = APIRouter(tags=["Price Prediction"])
-db = init_firebase()
 
 # ---------------- Input Schema ----------------
 class PriceRequest(BaseModel):
@@ -22,14 +24,14 @@ class PriceRequest(BaseModel):
 async def predict_price(req: PriceRequest):
     """
     Predicts crop prices (min, max, modal) based on input parameters
-    and stores the prediction in Firebase.
+    and queues the prediction for storage.
     """
     try:
-        model_bundle = joblib.load("app/ml/price_model.pkl")
-        modal_model = model_bundle["modal_model"]
-        min_model = model_bundle["min_model"]
-        max_model = model_bundle["max_model"]
-        encoders = model_bundle["encoders"]
+        model_bundle = get_price_model().bundle
+        modal_model = model_bundle.modal_model
+        min_model = model_bundle.min_model
+        max_model = model_bundle.max_model
+        encoders = model_bundle.encoders
 
         # Encode categorical data safely
         def encode(col, val):
@@ -37,16 +39,18 @@ async def predict_price(req: PriceRequest):
                 return encoders[col].transform([val])[0]
             return 0
 
-        X = np.array([
-            encode("state", req.state),
-            encode("district", req.district),
-            encode("commodity", req.crop),
-            encode("variety", req.variety)
-        ]).reshape(1, -1)
+        with timer("price_route.encode"):
+            X = np.array([
+                encode("state", req.state),
+                encode("district", req.district),
+                encode("commodity", req.crop),
+                encode("variety", req.variety)
+            ]).reshape(1, -1)
 
-        pred_modal = float(modal_model.predict(X)[0])
-        pred_min = float(min_model.predict(X)[0])
-        pred_max = float(max_model.predict(X)[0])
+        with timer("price_route.forest"):
+            pred_modal = float(modal_model.predict(X)[0])
+            pred_min = float(min_model.predict(X)[0])
+            pred_max = float(max_model.predict(X)[0])
 
         trend = "Increasing" if pred_modal > (pred_min + pred_max) / 2 else "Stable"
         confidence = round(np.random.uniform(0.8, 0.95), 2)
@@ -67,8 +71,8 @@ async def predict_price(req: PriceRequest):
             "timestamp": datetime.datetime.utcnow()
         }
 
-        doc_ref = db.collection("price_predictions").add(result)
-        return {"status": "success", "prediction": result, "doc_id": doc_ref[1].id}
+        doc_id = await prediction_log.enqueue("price_predictions", result)
+        return {"status": "success", "prediction": result, "doc_id": doc_id}
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -79,18 +83,12 @@ async def predict_price(req: PriceRequest):
 async def get_daily_market_data():
     """
     Fetches the latest 20 price predictions or real-time market updates
-    from Firebase for dashboard display.
+    from storage for dashboard display.
     """
     try:
-        docs = db.collection("price_predictions").order_by(
-            "timestamp", direction="DESCENDING"
-        ).limit(20).stream()
-
-        data = []
-        for doc in docs:
-            entry = doc.to_dict()
-            entry["id"] = doc.id
-            data.append(entry)
+        with timer("storage.list"):
+            data = await asyncio.to_thread(
+                lambda: list(get_storage().list("price_predictions", limit=20, descending=True)))
 
         return {"daily_prices": data}
 
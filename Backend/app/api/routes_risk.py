@@ -1,11 +1,10 @@
 from fastapi import APIRouter, HTTPException
 from app.schemas.risk_schema import RiskAssessmentRequest, RiskAssessmentResponse
 from app.ml.risk_assessment import assess_risk
-from app.core.firebase_utils import init_firebase
+from app.core.write_behind import prediction_log
 from datetime import datetime
 
 router = APIRouter()
-db = init_firebase()
 
 @router.post("/assess_risk", response_model=RiskAssessmentResponse)
 async def get_risk_assessment(req: RiskAssessmentRequest):
@@ -16,14 +15,14 @@ async def get_risk_assessment(req: RiskAssessmentRequest):
         if "error" in result:
             raise HTTPException(status_code=400, detail=result["error"])
         
-        # Store assessment in Firebase
+        # Queue assessment for storage
         assessment_doc = {
             "timestamp": datetime.utcnow().isoformat(),
             "input_params": req.dict(),
             "assessment": result
         }
         
-        db.collection("risk_assessments").add(assessment_doc)
+        await prediction_log.enqueue("risk_assessments", assessment_doc)
         
         return result
     except Exception as e:
@@ -7,7 +7,7 @@ router = APIRouter()
 @router.get("/weather/{location}")
 async def get_weather(location: str):
     try:
-        weather_data = get_weather_forecast(location)
+        weather_data = await get_weather_forecast(location)
         return WeatherResponse(
             status="success",
             data=weather_data,
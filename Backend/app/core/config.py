@@ -0,0 +1,15 @@
+# app/core/config.py
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Persistence for prediction logs, crop records and market updates: "firestore", "sqlite" or "memory"
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "firestore").lower()
+
+# Database used by the SQLite storage backend (a local file also works as an edge-side log)
+DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cropmentor.db")
+STORAGE_DATABASE_URL = os.getenv("STORAGE_DATABASE_URL", DATABASE_URL)
+
+# Shared secret for the /admin endpoints (sent as X-Admin-Token); unset disables them
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
@@ -1,18 +1,30 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import Engine
 from sqlalchemy.orm import sessionmaker, DeclarativeBase
-import os
-from dotenv import load_dotenv
 
-load_dotenv()
-
-DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./cropmentor.db")
+from app.core.config import DATABASE_URL
 
 # SQLAlchemy base class
 class Base(DeclarativeBase):
     pass
 
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")  # readers don't block the writer
+    cursor.execute("PRAGMA synchronous=NORMAL")  # fsync at checkpoints only; safe with WAL
+    cursor.execute("PRAGMA busy_timeout=5000")
+    cursor.close()
+
+def make_engine(url: str) -> Engine:
+    """Pooled engine; SQLite connections are shared across threads and run in WAL mode."""
+    if not url.startswith("sqlite"):
+        return create_engine(url)
+    new_engine = create_engine(url, connect_args={"check_same_thread": False})
+    event.listen(new_engine, "connect", _sqlite_pragmas)
+    return new_engine
+
 # Create engine & session
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
+engine = make_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 def init_db():
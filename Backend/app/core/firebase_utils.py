@@ -1,6 +1,4 @@
 # app/core/firebase_utils.py
-import firebase_admin
-from firebase_admin import credentials, firestore
 import os
 
 # Global variable for db client
@@ -12,6 +10,10 @@ def init_firebase():
     if db is not None:
         return db  # already initialized
 
+    # Imported here so importing the app doesn't load the Firestore client libraries
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
     # Resolve correct key path
     BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
     FIREBASE_KEY_PATH = os.path.join(BASE_DIR, "firebase_key.json")
@@ -0,0 +1,153 @@
+# app/core/profiler.py
+"""On-demand statistical profiler for a running worker.
+
+A daemon thread samples every thread's Python stack via sys._current_frames()
+at a fixed interval and counts identical stacks. The result is in the collapsed
+format ("frame;frame;frame count" per line) read by flamegraph.pl, speedscope
+and inferno, with frames labelled module:function so app.ml and app.api code
+is easy to pick out, plus per-module totals for those packages.
+
+Sampling only reads frame objects and never stops the profiled threads, so its
+cost is one short GIL hold per interval (reported as overhead_pct). Only one
+profile runs at a time and duration and interval are clamped.
+"""
+import collections
+import os
+import sys
+import threading
+import time
+from typing import Dict, Optional
+
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", "60"))
+PROFILE_MIN_INTERVAL_MS = 1.0
+MAX_DEPTH = 128
+
+# Packages whose frames are totalled per module in the summary
+ATTRIBUTED_PACKAGES = ("app.ml", "app.api")
+
+# Leaf frames of threads that are waiting rather than running (event loop, thread pools)
+IDLE_FRAMES = {
+    ("selectors", "select"),
+    ("threading", "wait"),
+    ("threading", "_wait_for_tstate_lock"),
+    ("concurrent.futures.thread", "_worker"),
+    ("queue", "get"),
+}
+
+class ProfilerBusy(RuntimeError):
+    pass
+
+_lock = threading.Lock()
+
+def _thread_group(name: str) -> str:
+    # "ThreadPoolExecutor-0_3" and "asyncio_2" fold into one group per pool
+    return name.rstrip("0123456789").rstrip("-_") or name
+
+class SamplingProfiler:
+    def __init__(self, interval: float, include_idle: bool = False):
+        self.interval = interval
+        self.include_idle = include_idle
+        self.stacks: collections.Counter = collections.Counter()
+        self.samples = 0
+        self.idle_samples = 0
+        self.sampling_seconds = 0.0
+        self._labels: Dict[object, tuple] = {}  # code object -> (label, module, function)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _label(self, code, module: str) -> tuple:
+        entry = self._labels.get(code)
+        if entry is None:
+            entry = self._labels[code] = (f"{module}:{code.co_name}", module, code.co_name)
+        return entry
+
+    def _sample(self) -> None:
+        own = threading.get_ident()
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            labels = []
+            leaf = None
+            while frame is not None and len(labels) < MAX_DEPTH:
+                entry = self._label(frame.f_code, frame.f_globals.get("__name__", "?"))
+                if leaf is None:
+                    leaf = entry
+                labels.append(entry[0])
+                frame = frame.f_back
+            self.samples += 1
+            if leaf is not None and (leaf[1], leaf[2]) in IDLE_FRAMES:
+                self.idle_samples += 1
+                if not self.include_idle:
+                    continue
+            labels.append(_thread_group(names.get(ident, "thread")))
+            self.stacks[";".join(reversed(labels))] += 1
+
+    def _run(self) -> None:
+        next_at = time.perf_counter()
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            self._sample()
+            self.sampling_seconds += time.perf_counter() - start
+            next_at += self.interval
+            delay = next_at - time.perf_counter()
+            if delay < 0:  # fell behind (e.g. GIL contention): skip missed ticks instead of bursting
+                next_at = time.perf_counter()
+                delay = 0
+            self._stop.wait(delay)
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+    def collapsed(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def attribution(self) -> Dict[str, Dict[str, Dict[str, int]]]:
+        """Per package, samples in which each of its modules is on the stack (inclusive) or running (self)."""
+        result = {pkg: {} for pkg in ATTRIBUTED_PACKAGES}
+        for stack, count in self.stacks.items():
+            frames = stack.split(";")[1:]
+            seen = set()
+            for i, frame in enumerate(frames):
+                module = frame.rsplit(":", 1)[0]
+                for pkg in ATTRIBUTED_PACKAGES:
+                    if module == pkg or module.startswith(pkg + "."):
+                        totals = result[pkg].setdefault(module, {"inclusive": 0, "self": 0})
+                        if module not in seen:
+                            totals["inclusive"] += count
+                            seen.add(module)
+                        if i == len(frames) - 1:
+                            totals["self"] += count
+        return {pkg: dict(sorted(modules.items(), key=lambda kv: -kv[1]["inclusive"]))
+                for pkg, modules in result.items()}
+
+def acquire(interval_ms: float, include_idle: bool = False) -> SamplingProfiler:
+    """Start a profile, or raise ProfilerBusy if one is already running in this worker."""
+    if not _lock.acquire(blocking=False):
+        raise ProfilerBusy("A profile is already running on this worker")
+    profiler = SamplingProfiler(max(interval_ms, PROFILE_MIN_INTERVAL_MS) / 1000, include_idle)
+    profiler.start()
+    return profiler
+
+def release(profiler: SamplingProfiler, seconds: float) -> Dict:
+    """Stop the profile and summarise it."""
+    try:
+        profiler.stop()
+    finally:
+        _lock.release()
+    return {
+        "pid": os.getpid(),
+        "seconds": round(seconds, 3),
+        "interval_ms": round(profiler.interval * 1000, 3),
+        "samples": profiler.samples,
+        "idle_samples": profiler.idle_samples,
+        "overhead_pct": round(profiler.sampling_seconds / seconds * 100, 2) if seconds else 0.0,
+        "attribution": profiler.attribution(),
+        "collapsed": profiler.collapsed(),
+    }
@@ -0,0 +1,129 @@
+# app/core/startup.py
+import asyncio
+import logging
+import os
+import time
+from typing import Callable, Dict, Optional, Tuple
+
+from app.core import tracing
+
+logger = logging.getLogger(__name__)
+
+# Load every model bundle in the background at startup; otherwise each loads on its first request
+WARM_MODELS = os.getenv("WARM_MODELS", "true").lower() in ("1", "true", "yes")
+# Hold startup until warm-up finishes instead of serving (and lazily loading) right away
+WAIT_FOR_WARMUP = os.getenv("WAIT_FOR_WARMUP", "false").lower() in ("1", "true", "yes")
+# Seconds between retries of failed warm-up steps; 0 disables retrying
+WARMUP_RETRY_INTERVAL = float(os.getenv("WARMUP_RETRY_INTERVAL", "30"))
+
+class StartupState:
+    """Readiness flag and per-phase timing breakdown (seconds) of application startup."""
+
+    def __init__(self):
+        self.ready = False
+        self.timings: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.warnings: Dict[str, str] = {}
+        self._warmed = False
+        self._failed: Dict[str, Tuple[Callable, tuple]] = {}  # phase -> step to retry
+        self._task: Optional[asyncio.Task] = None
+        self._retry_task: Optional[asyncio.Task] = None
+
+    def record(self, phase: str, seconds: float) -> None:
+        self.timings[phase] = round(seconds, 3)
+
+    def as_dict(self) -> Dict:
+        return {"ready": self.ready, "timings": dict(self.timings), "errors": dict(self.errors),
+                "warnings": dict(self.warnings)}
+
+    def _update_ready(self) -> None:
+        self.ready = self._warmed and not self.errors
+
+    def _model_loaded(self, name: str) -> None:
+        # Registry callback (any thread): a bundle that failed warm-up loaded later, e.g. on a request or reload
+        phase = f"model_load.{name}"
+        self._failed.pop(phase, None)
+        if self.errors.pop(phase, None) is not None:
+            logger.info("✅ %s recovered", phase)
+            self._update_ready()
+
+    async def _load_models(self) -> None:
+        from app.ml.model_registry import import_model_modules, registry
+
+        registry.add_listener(self._model_loaded)
+        await self._timed("model_import", import_model_modules)
+        steps = []
+        for name in registry.names():
+            if registry.is_optional(name) and not registry.available(name):
+                # Not needed by this configuration; loads on first use if the file appears
+                self.warnings[f"model_load.{name}"] = "optional model file not found"
+                logger.warning("⚠️ Optional %s model not found; skipping warm-up", name)
+                continue
+            steps.append(self._timed(f"model_load.{name}", registry.get, name))
+        await asyncio.gather(*steps)
+
+    async def _timed(self, phase: str, func, *args) -> bool:
+        start = time.perf_counter()
+        try:
+            await asyncio.to_thread(func, *args)
+        except Exception as e:
+            self.errors[phase] = str(e)
+            self._failed[phase] = (func, args)
+            logger.error("❌ Startup step %s failed: %s", phase, e)
+            return False
+        else:
+            self.errors.pop(phase, None)
+            self._failed.pop(phase, None)
+            return True
+        finally:
+            self.record(phase, time.perf_counter() - start)
+
+    async def warm_up(self) -> None:
+        """Connect the storage backend and load the model bundles concurrently, then mark the app ready.
+
+        Each step runs in a worker thread so the event loop keeps serving; a request
+        that needs a model before its warm-up finishes simply waits for the same load
+        (the registry loads each bundle once). Failed steps are reported and leave
+        the app not ready until they are retried successfully (every
+        WARMUP_RETRY_INTERVAL seconds) or the model loads some other way.
+        """
+        from app.core.storage import get_storage
+
+        start = time.perf_counter()
+        storage = get_storage()
+        steps = [self._timed(f"client_init.{storage.name}", storage.connect)]
+        if WARM_MODELS:
+            steps.append(self._load_models())
+        await asyncio.gather(*steps)
+        self.record("warm_up", time.perf_counter() - start)
+        self._warmed = True
+        self._update_ready()
+        print(f"{'✅' if self.ready else '⚠️'} Warm-up finished in {self.timings['warm_up']}s: {self.timings}")
+        if self._failed and WARMUP_RETRY_INTERVAL > 0:
+            self._retry_task = asyncio.create_task(self._retry_failed())
+
+    async def _retry_failed(self) -> None:
+        while self._failed:
+            await asyncio.sleep(WARMUP_RETRY_INTERVAL)
+            await asyncio.gather(*(self._timed(phase, func, *args) for phase, (func, args) in list(self._failed.items())))
+            self._update_ready()
+        logger.info("✅ Failed warm-up steps recovered")
+
+    async def start(self) -> None:
+        self._task = asyncio.create_task(self.warm_up())
+        if WAIT_FOR_WARMUP:
+            await self._task
+
+    async def stop(self) -> None:
+        """Cancel an unfinished warm-up or retry and flush the trace exporter."""
+        for task in (self._task, self._retry_task):
+            if task is not None and not task.done():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+        await asyncio.to_thread(tracing.close)
+
+# Startup state of this worker process
+startup = StartupState()
@@ -0,0 +1,265 @@
+# app/core/storage.py
+import datetime
+import json
+import threading
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from app.core.config import STORAGE_BACKEND, STORAGE_DATABASE_URL
+
+# Firestore rejects batches with more than 500 writes
+FIRESTORE_BATCH_LIMIT = 500
+
+# Listings are ordered by this document field, then by document ID
+ORDER_FIELD = "timestamp"
+
+# (collection, document ID, document)
+Write = Tuple[str, str, Dict]
+# (ORDER_FIELD value, document ID) of the last document of the previous page
+Cursor = Tuple[datetime.datetime, str]
+
+class StorageBackend:
+    """Document storage for prediction logs, crop records and market updates.
+
+    Documents live in named collections under caller-chosen IDs; writing an
+    existing ID replaces the document. Listings are ordered by (timestamp, ID)
+    and each listed document carries its ID under "id".
+    """
+
+    name = "base"
+
+    def connect(self) -> None:
+        """Create clients/tables up front (otherwise done on first use)."""
+
+    def close(self) -> None:
+        pass
+
+    def write_many(self, writes: List[Write]) -> None:
+        """Upsert many documents with as few round trips as the backend allows."""
+        raise NotImplementedError
+
+    def set(self, collection: str, doc_id: str, document: Dict) -> None:
+        self.write_many([(collection, doc_id, document)])
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict]:
+        raise NotImplementedError
+
+    def list(self, collection: str, limit: Optional[int] = None, after: Optional[Cursor] = None,
+             descending: bool = False) -> Iterator[Dict]:
+        """Documents ordered by (timestamp, ID), starting after the cursor, streamed lazily."""
+        raise NotImplementedError
+
+# -----------------------
+# Firestore
+# -----------------------
+class FirestoreStorage(StorageBackend):
+    name = "firestore"
+
+    def _db(self):
+        from app.core.firebase_utils import init_firebase
+        return init_firebase()
+
+    def connect(self) -> None:
+        self._db()
+
+    def write_many(self, writes: List[Write]) -> None:
+        db = self._db()
+        for start in range(0, len(writes), FIRESTORE_BATCH_LIMIT):
+            batch = db.batch()
+            for collection, doc_id, document in writes[start:start + FIRESTORE_BATCH_LIMIT]:
+                batch.set(db.collection(collection).document(doc_id), document)
+            batch.commit()
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict]:
+        snapshot = self._db().collection(collection).document(doc_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def list(self, collection: str, limit: Optional[int] = None, after: Optional[Cursor] = None,
+             descending: bool = False) -> Iterator[Dict]:
+        direction = "DESCENDING" if descending else "ASCENDING"
+        query = self._db().collection(collection).order_by(ORDER_FIELD, direction=direction)
+        query = query.order_by("__name__", direction=direction)
+        if after is not None:
+            query = query.start_after({ORDER_FIELD: after[0], "__name__": after[1]})
+        if limit is not None:
+            query = query.limit(limit)
+        for doc in query.stream():
+            item = doc.to_dict()
+            item["id"] = doc.id
+            yield item
+
+# -----------------------
+# SQLite
+# -----------------------
+def _encode(value):
+    # datetimes are tagged so they come back as datetimes, like Firestore timestamps
+    if isinstance(value, datetime.datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    if hasattr(value, "item"):
+        return value.item()  # NumPy scalars
+    raise TypeError(f"Cannot store {type(value).__name__}")
+
+def _decode(obj: Dict):
+    if len(obj) == 1 and "$datetime" in obj:
+        return datetime.datetime.fromisoformat(obj["$datetime"])
+    return obj
+
+def _order_key(value) -> Optional[str]:
+    # Fixed-width ISO strings sort chronologically
+    if isinstance(value, datetime.datetime):
+        return value.isoformat(timespec="microseconds")
+    return None if value is None else str(value)
+
+class SQLiteStorage(StorageBackend):
+    """All collections in one table keyed by (collection, id), documents stored as JSON.
+
+    Uses a pooled SQLAlchemy engine in WAL mode (see app/core/db.py), so readers
+    don't block the write-behind flusher; write_many() is a single executemany
+    upsert in one transaction.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, url: str = STORAGE_DATABASE_URL):
+        self.url = url
+        self._engine = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._engine is None:
+            with self._lock:
+                if self._engine is None:
+                    from sqlalchemy import Column, Index, MetaData, String, Table, Text
+                    from app.core.db import make_engine
+
+                    metadata = MetaData()
+                    self._table = Table(
+                        "documents", metadata,
+                        Column("collection", String, primary_key=True),
+                        Column("id", String, primary_key=True),
+                        Column("order_key", String, nullable=True),
+                        Column("data", Text, nullable=False),
+                        Index("ix_documents_order", "collection", "order_key", "id"),
+                    )
+                    engine = make_engine(self.url)
+                    metadata.create_all(engine)
+                    self._engine = engine
+        return self._engine
+
+    def connect(self) -> None:
+        self._connect()
+
+    def close(self) -> None:
+        if self._engine is not None:
+            self._engine.dispose()
+            self._engine = None
+
+    def write_many(self, writes: List[Write]) -> None:
+        if not writes:
+            return
+        from sqlalchemy.dialects.sqlite import insert
+
+        engine = self._connect()
+        rows = [
+            {"collection": collection, "id": doc_id, "order_key": _order_key(document.get(ORDER_FIELD)),
+             "data": json.dumps(document, default=_encode)}
+            for collection, doc_id, document in writes
+        ]
+        stmt = insert(self._table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["collection", "id"],
+            set_={"order_key": stmt.excluded.order_key, "data": stmt.excluded.data},
+        )
+        with engine.begin() as conn:
+            conn.execute(stmt, rows)
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict]:
+        from sqlalchemy import select
+
+        engine = self._connect()
+        t = self._table
+        with engine.connect() as conn:
+            data = conn.execute(
+                select(t.c.data).where(t.c.collection == collection, t.c.id == doc_id)
+            ).scalar_one_or_none()
+        return None if data is None else json.loads(data, object_hook=_decode)
+
+    def list(self, collection: str, limit: Optional[int] = None, after: Optional[Cursor] = None,
+             descending: bool = False) -> Iterator[Dict]:
+        from sqlalchemy import select, tuple_
+
+        engine = self._connect()
+        t = self._table
+        query = select(t.c.id, t.c.data).where(t.c.collection == collection)
+        if after is not None:
+            key = tuple_(t.c.order_key, t.c.id)
+            bound = tuple_(_order_key(after[0]), after[1])
+            query = query.where(key < bound if descending else key > bound)
+        if descending:
+            query = query.order_by(t.c.order_key.desc(), t.c.id.desc())
+        else:
+            query = query.order_by(t.c.order_key, t.c.id)
+        if limit is not None:
+            query = query.limit(limit)
+        with engine.connect() as conn:
+            for doc_id, data in conn.execution_options(stream_results=True).execute(query):
+                item = json.loads(data, object_hook=_decode)
+                item["id"] = doc_id
+                yield item
+
+# -----------------------
+# In-memory
+# -----------------------
+class MemoryStorage(StorageBackend):
+    """Process-local dicts, for tests, load tests and benchmarks without credentials."""
+
+    name = "memory"
+
+    def __init__(self):
+        self._collections: Dict[str, Dict[str, Dict]] = {}
+        self._lock = threading.Lock()
+
+    def write_many(self, writes: List[Write]) -> None:
+        with self._lock:
+            for collection, doc_id, document in writes:
+                self._collections.setdefault(collection, {})[doc_id] = dict(document)
+
+    def get(self, collection: str, doc_id: str) -> Optional[Dict]:
+        document = self._collections.get(collection, {}).get(doc_id)
+        return dict(document) if document is not None else None
+
+    def list(self, collection: str, limit: Optional[int] = None, after: Optional[Cursor] = None,
+             descending: bool = False) -> Iterator[Dict]:
+        with self._lock:
+            items = list(self._collections.get(collection, {}).items())
+        keyed = sorted(((_order_key(doc.get(ORDER_FIELD)) or "", doc_id), doc) for doc_id, doc in items)
+        if descending:
+            keyed.reverse()
+        if after is not None:
+            bound = (_order_key(after[0]) or "", after[1])
+            keyed = [(key, doc) for key, doc in keyed if (key < bound if descending else key > bound)]
+        for (_, doc_id), doc in keyed[:limit]:
+            yield {**doc, "id": doc_id}
+
+BACKENDS = {
+    "firestore": FirestoreStorage,
+    "sqlite": SQLiteStorage,
+    "memory": MemoryStorage,
+}
+
+_storage: Optional[StorageBackend] = None
+
+def get_storage() -> StorageBackend:
+    """The process-wide backend selected by STORAGE_BACKEND."""
+    global _storage
+    if _storage is None:
+        if STORAGE_BACKEND not in BACKENDS:
+            raise ValueError(f"Unknown STORAGE_BACKEND {STORAGE_BACKEND!r}; expected one of {list(BACKENDS)}")
+        _storage = BACKENDS[STORAGE_BACKEND]()
+    return _storage
+
+def set_storage(storage: StorageBackend) -> None:
+    """Swap the backend (e.g. a MemoryStorage in benchmarks)."""
+    global _storage
+    _storage = storage
@@ -0,0 +1,316 @@
+# app/core/tracing.py
+"""Lightweight request tracing.
+
+A root span is opened per request by TracingMiddleware, with a head-based
+sampling decision (TRACE_SAMPLE_RATE, or the sampled flag of an incoming W3C
+traceparent header, honoured at most TRACE_FORCED_PER_SECOND times a second). Child spans are opened with span(); the metrics stage
+timers open one automatically. When a request isn't sampled every span call is
+a single context-variable lookup, so the cost stays bounded by the sample rate.
+
+Finished spans are exported one by one to an in-process ring buffer (read via
+/admin/traces) and/or a JSON-lines file, so spans recorded after the request
+ended (e.g. the write-behind flush) still join their trace.
+"""
+import collections
+import contextvars
+import json
+import os
+import queue
+import random
+import secrets
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Fraction of requests traced (head-based); 0 disables tracing
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+# Requests per second traced because an incoming traceparent has its sampled flag set, on top of
+# TRACE_SAMPLE_RATE; the flag comes from the client, so it can't raise the tracing volume beyond this
+TRACE_FORCED_PER_SECOND = float(os.getenv("TRACE_FORCED_PER_SECOND", "1"))
+# Fraction of background job runs (e.g. Agmarknet ingestion) traced; they are rare, so all by default
+TRACE_JOB_SAMPLE_RATE = float(os.getenv("TRACE_JOB_SAMPLE_RATE", "1.0"))
+# Comma-separated exporters: "memory" (ring buffer for /admin/traces) and/or "jsonl"
+TRACE_EXPORT = [e.strip() for e in os.getenv("TRACE_EXPORT", "memory").split(",") if e.strip()]
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+TRACE_BUFFER_SPANS = int(os.getenv("TRACE_BUFFER_SPANS", "10000"))
+# Spans waiting for the JSON-lines writer thread; beyond this they are dropped rather than blocking
+TRACE_QUEUE_SIZE = int(os.getenv("TRACE_QUEUE_SIZE", "10000"))
+JSONL_BATCH = 512
+
+# (trace_id, span_id) of a sampled span, carried across task and queue boundaries
+TraceContext = Tuple[str, str]
+
+class Span:
+    __slots__ = ("trace_id", "span_id", "parent_id", "name", "start", "start_ns", "attributes", "error", "_token")
+
+    def __init__(self, trace_id: str, parent_id: Optional[str], name: str, attributes: Dict[str, Any]):
+        self.trace_id = trace_id
+        self.span_id = secrets.token_hex(8)
+        self.parent_id = parent_id
+        self.name = name
+        self.start = time.time()
+        self.start_ns = time.perf_counter_ns()
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self._token = None
+
+    def set(self, **attributes) -> None:
+        self.attributes.update(attributes)
+
+    def to_dict(self, duration_ms: float) -> Dict[str, Any]:
+        return {
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start": round(self.start, 6),
+            "duration_ms": round(duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+        }
+
+_current: contextvars.ContextVar[Optional[Span]] = contextvars.ContextVar("current_span", default=None)
+
+# -----------------------
+# Export
+# -----------------------
+_buffer: collections.deque = collections.deque(maxlen=TRACE_BUFFER_SPANS)
+_pending: queue.Queue = queue.Queue(maxsize=TRACE_QUEUE_SIZE)
+_writer: Optional[threading.Thread] = None
+_writer_lock = threading.Lock()
+_STOP = object()
+dropped_spans = 0
+
+def _write_jsonl() -> None:
+    """Writer thread: serializes queued spans and appends them to TRACE_FILE in batches."""
+    with open(TRACE_FILE, "a") as f:
+        while True:
+            batch = [_pending.get()]
+            while len(batch) < JSONL_BATCH:
+                try:
+                    batch.append(_pending.get_nowait())
+                except queue.Empty:
+                    break
+            f.write("".join(json.dumps(r, default=str) + "\n" for r in batch if r is not _STOP))
+            f.flush()
+            if any(r is _STOP for r in batch):
+                return
+
+def _start_writer() -> None:
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_jsonl, name="trace-writer", daemon=True)
+            _writer.start()
+
+def close(timeout: float = 5.0) -> None:
+    """Flush queued spans to TRACE_FILE and stop the writer thread (restarted on the next span)."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            return
+        _pending.put(_STOP)
+        _writer.join(timeout)
+        _writer = None
+
+def _export(record: Dict[str, Any]) -> None:
+    global dropped_spans
+    if "memory" in TRACE_EXPORT:
+        _buffer.append(record)  # deque.append is atomic
+    if "jsonl" in TRACE_EXPORT:
+        # Serialization and file I/O happen on the writer thread, never on the event loop
+        if _writer is None:
+            _start_writer()
+        try:
+            _pending.put_nowait(record)
+        except queue.Full:
+            dropped_spans += 1
+
+def recent_traces(limit: int = 20, trace_id: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Buffered traces, most recent first, each with its spans in start order."""
+    traces: Dict[str, List[Dict]] = {}
+    for record in reversed(list(_buffer)):
+        if trace_id is not None and record["trace_id"] != trace_id:
+            continue
+        spans = traces.setdefault(record["trace_id"], [])
+        spans.append(record)
+    result = []
+    for tid, spans in list(traces.items())[:limit]:
+        spans.sort(key=lambda s: s["start"])
+        root = next((s for s in spans if s["parent_id"] is None), spans[0])
+        result.append({"trace_id": tid, "name": root["name"], "start": root["start"],
+                       "duration_ms": root["duration_ms"], "spans": spans})
+    return result
+
+# -----------------------
+# Spans
+# -----------------------
+def _finish(span: Span, exc: Optional[BaseException] = None) -> None:
+    if exc is not None and span.error is None:
+        span.error = f"{type(exc).__name__}: {exc}"
+    _export(span.to_dict((time.perf_counter_ns() - span.start_ns) / 1e6))
+
+def start_span(name: str, **attributes) -> Optional[Span]:
+    """Open a child of the current span; None (no-op) when the current request isn't sampled."""
+    parent = _current.get()
+    if parent is None:
+        return None
+    span = Span(parent.trace_id, parent.span_id, name, attributes)
+    span._token = _current.set(span)
+    return span
+
+def end_span(span: Optional[Span], exc: Optional[BaseException] = None) -> None:
+    if span is None:
+        return
+    _current.reset(span._token)
+    _finish(span, exc)
+
+class span:
+    """Context manager for a child span of the current sampled span."""
+
+    __slots__ = ("name", "attributes", "span")
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+
+    def __enter__(self) -> Optional[Span]:
+        self.span = start_span(self.name, **self.attributes)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end_span(self.span, exc)
+
+class _TokenBucket:
+    """Allows up to rate events per second (bursts of up to one second's worth)."""
+
+    def __init__(self, rate: float):
+        self.rate = rate
+        self.tokens = max(rate, 1.0)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        if self.rate <= 0:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(max(self.rate, 1.0), self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+_forced = _TokenBucket(TRACE_FORCED_PER_SECOND)
+
+def should_sample(rate: Optional[float] = None) -> bool:
+    rate = TRACE_SAMPLE_RATE if rate is None else rate
+    return rate > 0 and random.random() < rate
+
+def start_trace(name: str, sampled: Optional[bool] = None, trace_id: Optional[str] = None,
+                parent_id: Optional[str] = None, **attributes) -> Optional[Span]:
+    """Open a root span (or continue a remote trace) if sampled; None otherwise."""
+    if not (should_sample() if sampled is None else sampled):
+        return None
+    span_ = Span(trace_id or secrets.token_hex(16), parent_id, name, attributes)
+    span_._token = _current.set(span_)
+    return span_
+
+class trace:
+    """Context manager for a root span with head sampling, e.g. around a background job."""
+
+    __slots__ = ("name", "sampled", "attributes", "span")
+
+    def __init__(self, name: str, sampled: Optional[bool] = None, **attributes):
+        self.name = name
+        self.sampled = sampled
+        self.attributes = attributes
+
+    def __enter__(self) -> Optional[Span]:
+        self.span = start_trace(self.name, self.sampled, **self.attributes)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end_span(self.span, exc)
+
+def current_context() -> Optional[TraceContext]:
+    """The current sampled span's (trace_id, span_id), to hand to work done later elsewhere."""
+    current = _current.get()
+    return (current.trace_id, current.span_id) if current is not None else None
+
+def record_linked(name: str, contexts: Iterable[Optional[TraceContext]], start: float, duration_ms: float,
+                  error: Optional[str] = None, **attributes) -> None:
+    """Record one already-timed operation (e.g. a batched flush) as a span in every originating trace."""
+    seen = set()
+    for ctx in contexts:
+        if ctx is None or ctx[0] in seen:
+            continue
+        seen.add(ctx[0])
+        _export({
+            "trace_id": ctx[0], "span_id": secrets.token_hex(8), "parent_id": ctx[1], "name": name,
+            "start": round(start, 6), "duration_ms": round(duration_ms, 3), "attributes": attributes,
+            "error": error,
+        })
+
+# -----------------------
+# ASGI middleware
+# -----------------------
+def _parse_traceparent(value: str) -> Optional[Tuple[str, str, bool]]:
+    # W3C: 00-<32 hex trace id>-<16 hex parent id>-<2 hex flags>
+    parts = value.strip().split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3], 16)
+    except ValueError:
+        return None
+    return parts[1], parts[2], bool(flags & 1)
+
+class TracingMiddleware:
+    """Opens the root span of each sampled HTTP request and returns its ID in X-Trace-Id."""
+
+    def __init__(self, app, exclude: Tuple[str, ...] = ("/metrics", "/ready", "/admin/")):
+        self.app = app
+        self.exclude = exclude  # path prefixes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"].startswith(self.exclude):
+            await self.app(scope, receive, send)
+            return
+
+        trace_id = parent_id = None
+        upstream_sampled = False
+        for key, value in scope.get("headers", ()):
+            if key == b"traceparent":
+                parsed = _parse_traceparent(value.decode("latin-1"))
+                if parsed:
+                    trace_id, parent_id, upstream_sampled = parsed
+                break
+
+        # The local sampler always applies; the caller's sampled flag only adds rate-limited extra traces.
+        # A traced request keeps the caller's trace ID so its spans join the upstream trace.
+        sampled = should_sample() or (upstream_sampled and _forced.allow())
+        root = start_trace("http.request", sampled, trace_id, parent_id,
+                           method=scope["method"], path=scope["path"])
+        if root is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set(status=message["status"])
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"x-trace-id", root.trace_id.encode())]
+            await send(message)
+
+        error = None
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            from app.core.metrics import route_label
+            root.name = f"{scope['method']} {route_label(scope)}"
+            end_span(root, error)
@@ -0,0 +1,153 @@
+# app/core/write_behind.py
+import asyncio
+import contextvars
+import logging
+import os
+import secrets
+import string
+import time
+from typing import Dict, List, Optional, Tuple
+
+from app.core import tracing
+from app.core.metrics import Counter, Gauge, timer
+from app.core.storage import FIRESTORE_BATCH_LIMIT, get_storage
+
+logger = logging.getLogger(__name__)
+
+MAX_PENDING = int(os.getenv("WRITE_BEHIND_MAX_PENDING", "10000"))
+FLUSH_INTERVAL = float(os.getenv("WRITE_BEHIND_FLUSH_INTERVAL", "0.5"))
+COMMIT_RETRIES = 3
+
+_ID_ALPHABET = string.ascii_letters + string.digits
+
+def new_document_id() -> str:
+    """Generate a Firestore-style 20 character auto ID on the client."""
+    return "".join(secrets.choice(_ID_ALPHABET) for _ in range(20))
+
+PendingWrite = Tuple[str, str, Dict]
+# A buffered write and the trace context of the request that enqueued it
+QueuedWrite = Tuple[PendingWrite, Optional[tracing.TraceContext]]
+
+class WriteBehindQueue:
+    """Buffers documents in memory and writes them to the storage backend in batched commits.
+
+    enqueue() assigns the document ID up front and returns as soon as the write is
+    buffered; a background task flushes up to 500 writes per write_many() call. The
+    buffer is bounded: when it is full, enqueue() waits for the writer to catch up.
+    Each flush is recorded as a span in the traces of the sampled requests it carries.
+    """
+
+    def __init__(self, max_pending: int = MAX_PENDING, batch_size: int = FIRESTORE_BATCH_LIMIT,
+                 flush_interval: float = FLUSH_INTERVAL):
+        self.max_pending = max_pending
+        self.batch_size = min(batch_size, FIRESTORE_BATCH_LIMIT)
+        self.flush_interval = flush_interval
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self.written = 0
+        self.dropped = 0
+
+    def start(self) -> None:
+        """Start the background flusher on the running event loop."""
+        if self._task is not None and not self._task.done():
+            return
+        if self._queue is None:
+            self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._closing = False
+        # A fresh context, so a flusher started from a request doesn't inherit its trace span
+        self._task = asyncio.get_running_loop().create_task(self._run(), context=contextvars.Context())
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def enqueue(self, collection: str, document: Dict) -> str:
+        """Buffer a document for writing and return its pre-assigned document ID."""
+        return (await self.enqueue_many(collection, [document]))[0]
+
+    async def enqueue_many(self, collection: str, documents: List[Dict]) -> List[str]:
+        """Buffer documents for writing and return their pre-assigned document IDs, in order."""
+        if self._closing:
+            raise RuntimeError("Prediction log is shutting down")
+        self.start()
+        context = tracing.current_context()
+        writes = [((collection, new_document_id(), doc), context) for doc in documents]
+        # Only waits when the buffer is full, so this measures backpressure
+        with timer("storage.enqueue"):
+            for write in writes:
+                try:
+                    self._queue.put_nowait(write)
+                except asyncio.QueueFull:
+                    await self._queue.put(write)
+        return [doc_id for (_, doc_id, _), _ in writes]
+
+    async def drain(self, timeout: float = 30.0) -> None:
+        """Flush everything buffered so far and stop the background task."""
+        self._closing = True
+        if self._task is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout)
+        except asyncio.TimeoutError:
+            logger.error("❌ Prediction log drain timed out with %d writes pending", self.pending)
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+
+            try:
+                await asyncio.to_thread(self._commit_with_retry, batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    def _commit_with_retry(self, queued: List[QueuedWrite]) -> None:
+        batch = [write for write, _ in queued]
+        started, start = time.time(), time.perf_counter()
+        error = None
+        for attempt in range(COMMIT_RETRIES):
+            try:
+                with timer("storage.write_many"):
+                    self._commit(batch)
+                self.written += len(batch)
+                WRITES.inc(len(batch), result="written")
+                error = None
+                break
+            except Exception as e:
+                error = f"{type(e).__name__}: {e}"
+                logger.warning("⚠️ Batch commit failed (attempt %d/%d): %s", attempt + 1, COMMIT_RETRIES, e)
+                if attempt + 1 < COMMIT_RETRIES:
+                    time.sleep(0.5 * 2 ** attempt)
+        else:
+            self.dropped += len(batch)
+            WRITES.inc(len(batch), result="dropped")
+            logger.error("❌ Dropped %d prediction log writes after %d attempts", len(batch), COMMIT_RETRIES)
+        # The requests finished before the flush, so its span is attached to their traces afterwards
+        tracing.record_linked("write_behind.flush", (ctx for _, ctx in queued), started,
+                              (time.perf_counter() - start) * 1000, error,
+                              batch_size=len(batch), attempts=attempt + 1)
+
+    def _commit(self, batch: List[PendingWrite]) -> None:
+        get_storage().write_many(batch)
+
+# Shared queue for prediction logging from the API routes
+prediction_log = WriteBehindQueue()
+
+WRITES = Counter("write_behind_documents_total", "Prediction log documents by outcome", ("result",))
+Gauge("write_behind_pending", "Prediction log documents waiting to be written", callback=lambda: prediction_log.pending)
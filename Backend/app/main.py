@@ -1,20 +1,39 @@
+import time
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse
 from contextlib import asynccontextmanager
 from fastapi.openapi.utils import get_openapi
 
-from app.api import routes_crop, routes_price, routes_fertilizer, routes_risk, routes_weather
+from app.core import metrics, tracing
+from app.core.startup import startup
+
+# Importing the routes must stay cheap: models and clients load in lifespan or on first use
+_import_start = time.perf_counter()
+from app.api import routes_admin, routes_crop, routes_price, routes_fertilizer, routes_risk, routes_weather
 from app.core.db import init_db
-from app.core.firebase_utils import init_firebase
+from app.core.storage import get_storage
+from app.core.write_behind import prediction_log
+from app.services import weather_service
+startup.record("import", time.perf_counter() - _import_start)
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Initialize services on startup and cleanup on shutdown"""
     print("🚀 Initializing Crop Mentor services...")
+    start = time.perf_counter()
     init_db()
-    init_firebase()
+    startup.record("client_init.db", time.perf_counter() - start)
+    prediction_log.start()
+    # Storage and the models initialize concurrently in the background; see /ready
+    await startup.start()
     yield
     print("🛑 Shutting down Crop Mentor backend...")
+    await prediction_log.drain()
+    # After the drain, so the final flush spans reach the trace exporter
+    await startup.stop()
+    get_storage().close()
+    await weather_service.close_client()
 
 def custom_openapi():
     if app.openapi_schema:
@@ -103,6 +122,9 @@ app.include_router(
     responses={404: {"description": "Not found"}},
 )
 
+# Trace and debug endpoints, only enabled when ADMIN_TOKEN is set
+app.include_router(routes_admin.router, include_in_schema=False)
+
 # CORS Middleware
 origins = [
     "http://localhost:3000",  # React development server
@@ -117,6 +139,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Root span of each sampled request; the stage timers record its child spans
+if tracing.TRACE_SAMPLE_RATE > 0:
+    app.add_middleware(tracing.TracingMiddleware)
+
+# Request latency, status and in-flight metrics (added last, so it wraps the whole stack)
+if metrics.METRICS_ENABLED:
+    app.add_middleware(metrics.MetricsMiddleware)
+
 @app.get("/")
 async def root():
     return {"message": "Crop Mentor Backend is running 🚀"}
+
+@app.get("/ready")
+async def ready():
+    """Readiness probe: 200 once clients and models are initialized, 503 before. Includes startup timings."""
+    return JSONResponse(startup.as_dict(), status_code=200 if startup.ready else 503)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """Per-route and per-stage latency histograms, in-flight gauges and error counters (Prometheus text format)."""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,149 @@
+# app/ml/artifacts.py
+import os
+import sys
+import logging
+from typing import Any, Dict, List, Optional
+
+import joblib
+
+from app.ml.forest_eval import CompiledForest, compile_forest
+
+logger = logging.getLogger(__name__)
+
+# crop_model.pkl is served from crop_model.serving.joblib when that file is present
+SERVING_SUFFIX = ".serving.joblib"
+
+# Load serving artifacts memory-mapped (shared between worker processes through the page cache)
+MODEL_MMAP = os.getenv("MODEL_MMAP", "true").lower() in ("1", "true", "yes")
+
+def serving_path(path: str) -> str:
+    return os.path.splitext(path)[0] + SERVING_SUFFIX
+
+def to_serving(bundle: Dict[str, Any]) -> Dict[str, Any]:
+    """The bundle with every sklearn forest replaced by its CompiledForest.
+
+    CompiledForest is plain NumPy arrays, which joblib writes uncompressed (its
+    default) and can load with mmap_mode='r'; sklearn's Tree objects always copy
+    their nodes into private memory on unpickling. The risk yield and profit forests are stored as
+    one compiled forest under "forest" and split into views again when loaded.
+    """
+    serving = {}
+    for key, value in bundle.items():
+        forest = compile_forest(value)
+        serving[key] = forest if forest is not None else value
+    if "yield_model" in bundle and "profit_model" in bundle:
+        serving["forest"] = CompiledForest.from_sklearn(bundle["yield_model"], bundle["profit_model"])
+        serving["yield_model"] = serving["profit_model"] = None
+    return serving
+
+def _dump_tmp(obj: Any, path: str) -> str:
+    tmp = f"{path}.{os.getpid()}.tmp"
+    joblib.dump(obj, tmp)
+    return tmp
+
+def save_bundle(bundle: Dict[str, Any], path: str) -> str:
+    """Write the full sklearn bundle to path and its memory-mappable serving artifact next to it.
+
+    Both are written to temporary files first. The .pkl gets the serving artifact's
+    mtime and the serving artifact is swapped in first, so resolve_path() never sees
+    a .pkl newer than its serving artifact mid-save (which would make every worker
+    hot-reload the full pickle into private memory). Files are replaced rather than
+    rewritten: workers that memory-mapped the old artifact keep reading its inode.
+    """
+    serving = serving_path(path)
+    tmp_pkl = _dump_tmp(bundle, path)
+    tmp_serving = _dump_tmp(to_serving(bundle), serving)
+    st = os.stat(tmp_serving)
+    os.utime(tmp_pkl, ns=(st.st_atime_ns, st.st_mtime_ns))
+    os.replace(tmp_serving, serving)
+    os.replace(tmp_pkl, path)
+    return serving
+
+def resolve_path(path: str) -> str:
+    """The file a bundle should be loaded from: its serving artifact unless the .pkl is newer."""
+    serving = serving_path(path)
+    if os.path.exists(serving) and (not os.path.exists(path) or os.path.getmtime(serving) >= os.path.getmtime(path)):
+        return serving
+    return path
+
+def load_bundle(path: str) -> Dict[str, Any]:
+    mmap_mode = "r" if MODEL_MMAP and path.endswith(SERVING_SUFFIX) else None
+    return joblib.load(path, mmap_mode=mmap_mode)
+
+# -----------------------
+# Memory report
+# -----------------------
+SMAPS_FIELDS = ("Rss", "Pss", "Shared_Clean", "Shared_Dirty", "Private_Clean", "Private_Dirty")
+
+def _smaps(pid: int) -> Dict[str, Dict[str, int]]:
+    """kB per field for the whole process ("total") and for mapped serving artifacts ("models")."""
+    totals = {"total": dict.fromkeys(SMAPS_FIELDS, 0), "models": dict.fromkeys(SMAPS_FIELDS, 0)}
+    in_model = False
+    with open(f"/proc/{pid}/smaps") as f:
+        for line in f:
+            parts = line.split()
+            if not parts[0].endswith(":"):
+                # mapping header: address perms offset dev inode [path]
+                in_model = len(parts) >= 6 and parts[5].endswith(SERVING_SUFFIX)
+                continue
+            field = parts[0][:-1]
+            if field in SMAPS_FIELDS:
+                value = int(parts[1])
+                totals["total"][field] += value
+                if in_model:
+                    totals["models"][field] += value
+    return totals
+
+def find_pids(pattern: str) -> List[int]:
+    pids = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit() or int(entry) == os.getpid():
+            continue
+        try:
+            with open(f"/proc/{entry}/cmdline", "rb") as f:
+                cmdline = f.read().replace(b"\0", b" ").decode(errors="ignore")
+        except OSError:
+            continue
+        if pattern in cmdline:
+            pids.append(int(entry))
+    return sorted(pids)
+
+def memory_report(pids: Optional[List[int]] = None) -> List[Dict[str, Any]]:
+    """Per-process unique (private) vs shared memory, overall and for memory-mapped models, in MB.
+
+    pss_mb charges shared pages proportionally to each process sharing them, so
+    summing pss_mb over the workers gives their real combined footprint.
+    """
+    report = []
+    for pid in pids or [os.getpid()]:
+        try:
+            smaps = _smaps(pid)
+        except OSError as e:
+            report.append({"pid": pid, "error": str(e)})
+            continue
+        row = {"pid": pid}
+        for scope, fields in smaps.items():
+            prefix = "" if scope == "total" else "models_"
+            row[prefix + "rss_mb"] = round(fields["Rss"] / 1024, 1)
+            row[prefix + "pss_mb"] = round(fields["Pss"] / 1024, 1)
+            row[prefix + "shared_mb"] = round((fields["Shared_Clean"] + fields["Shared_Dirty"]) / 1024, 1)
+            row[prefix + "private_mb"] = round((fields["Private_Clean"] + fields["Private_Dirty"]) / 1024, 1)
+        report.append(row)
+    return report
+
+def convert(paths: List[str]) -> None:
+    """Write serving artifacts for already trained .pkl bundles."""
+    for path in paths:
+        os.replace(_dump_tmp(to_serving(joblib.load(path)), serving_path(path)), serving_path(path))
+        print(f"💾 {path} -> {serving_path(path)}")
+
+if __name__ == "__main__":
+    # python -m app.ml.artifacts convert app/ml/*.pkl
+    # python -m app.ml.artifacts report [pid ...]   (default: every uvicorn process)
+    command, args = (sys.argv[1], sys.argv[2:]) if len(sys.argv) > 1 else ("report", [])
+    if command == "convert":
+        convert(args)
+    else:
+        import pandas as pd
+        pids = [int(a) for a in args] or find_pids("uvicorn")
+        print(pd.DataFrame(memory_report(pids)).to_string(index=False))
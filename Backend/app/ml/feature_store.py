@@ -0,0 +1,157 @@
+# app/ml/feature_store.py
+import os
+import json
+import shutil
+import hashlib
+import logging
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from sklearn.preprocessing import LabelEncoder
+
+logger = logging.getLogger(__name__)
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(current_dir))), "Dataset", "synthetic_crop_full_dataset.csv")
+CACHE_DIR = os.getenv("FEATURE_STORE_DIR", os.path.join(current_dir, "feature_cache"))
+
+META_FILE = "meta.json"
+HASH_INDEX_FILE = "hashes.json"
+
+def file_hash(path: str, cache_dir: str = CACHE_DIR) -> str:
+    """SHA-256 of the file contents, remembered per (mtime, size) so unchanged files aren't re-read."""
+    st = os.stat(path)
+    stamp = [st.st_mtime_ns, st.st_size]
+    index_path = os.path.join(cache_dir, HASH_INDEX_FILE)
+    index = {}
+    if os.path.exists(index_path):
+        with open(index_path) as f:
+            index = json.load(f)
+    entry = index.get(os.path.abspath(path))
+    if entry and entry[:2] == stamp:
+        return entry[2]
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    index[os.path.abspath(path)] = stamp + [digest.hexdigest()]
+    os.makedirs(cache_dir, exist_ok=True)
+    tmp = index_path + f".{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp, index_path)
+    return digest.hexdigest()
+
+class TrainingFeatures:
+    """Parsed, imputed and encoded training dataset, backed by memory-mapped .npy files.
+
+    Numeric columns are median-imputed into one float64 matrix; every other column
+    is stored as int32 codes into a sorted vocabulary, which is exactly the
+    encoding a LabelEncoder fitted on that column produces. present() records
+    which raw values were missing before imputation.
+    """
+
+    def __init__(self, path: str, meta: Dict):
+        self.path = path
+        self.key = meta["key"]
+        self.source = meta["source"]
+        self.source_columns: List[str] = meta["columns"]
+        self.numeric_cols: List[str] = meta["numeric_cols"]
+        self.cat_cols: List[str] = meta["cat_cols"]
+        self.vocab: Dict[str, List[str]] = meta["vocab"]
+        self.medians: Dict[str, float] = meta["medians"]
+        self.int_cols: List[str] = meta["int_cols"]
+        self.n_rows: int = meta["rows"]
+        self._numeric = np.load(os.path.join(path, "numeric.npy"), mmap_mode="r")
+        self._codes = np.load(os.path.join(path, "codes.npy"), mmap_mode="r")
+        self._present = np.load(os.path.join(path, "present.npy"), mmap_mode="r")
+
+    @property
+    def columns(self) -> List[str]:
+        return self.numeric_cols + self.cat_cols
+
+    def present(self, col: str) -> np.ndarray:
+        """True where the raw value of col was not missing."""
+        return np.asarray(self._present[:, self.columns.index(col)])
+
+    def numeric(self, cols: Optional[List[str]] = None, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        """Imputed numeric columns as a new float64 (rows, cols) array."""
+        idx = [self.numeric_cols.index(c) for c in (cols or self.numeric_cols)]
+        X = self._numeric[:, idx]
+        return np.array(X if rows is None else X[rows], dtype=np.float64)
+
+    def codes(self, col: str, rows: Optional[np.ndarray] = None) -> np.ndarray:
+        codes = self._codes[:, self.cat_cols.index(col)]
+        return np.asarray(codes if rows is None else codes[rows], dtype=np.int64)
+
+    def encoder(self, col: str, rows: Optional[np.ndarray] = None) -> Tuple[LabelEncoder, np.ndarray]:
+        """A LabelEncoder and encoded values identical to LabelEncoder().fit_transform on those rows."""
+        used, codes = np.unique(self.codes(col, rows), return_inverse=True)
+        le = LabelEncoder()
+        le.classes_ = np.asarray(self.vocab[col], dtype=object)[used]
+        return le, codes.reshape(-1)
+
+    def frame(self, rows: Optional[np.ndarray] = None) -> pd.DataFrame:
+        """The imputed dataset as a DataFrame; categoricals are decoded to strings."""
+        data = {}
+        for i, c in enumerate(self.numeric_cols):
+            values = self._numeric[:, i] if rows is None else self._numeric[rows, i]
+            data[c] = np.asarray(values, dtype=np.int64 if c in self.int_cols else np.float64)
+        for c in self.cat_cols:
+            data[c] = np.asarray(self.vocab[c], dtype=object)[self.codes(c, rows)]
+        return pd.DataFrame(data)[self.source_columns]
+
+def _build(source: str, path: str, key: str) -> None:
+    df = pd.read_csv(source)
+    df = df.rename(columns=lambda c: c.strip())
+    numeric_cols = [c for c in df.columns if pd.api.types.is_numeric_dtype(df[c])]
+    cat_cols = [c for c in df.columns if c not in numeric_cols]
+
+    present = df[numeric_cols + cat_cols].notna().to_numpy()
+    medians = df[numeric_cols].median()
+    numeric = df[numeric_cols].fillna(medians).to_numpy(dtype=np.float64)
+    int_cols = [c for c in numeric_cols if pd.api.types.is_integer_dtype(df[c])]
+
+    vocab, codes = {}, []
+    for c in cat_cols:
+        values = df[c].fillna("Unknown").astype(str).to_numpy()
+        classes, inverse = np.unique(values, return_inverse=True)
+        vocab[c] = classes.tolist()
+        codes.append(inverse.reshape(-1).astype(np.int32))
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    np.save(os.path.join(tmp, "numeric.npy"), numeric)
+    np.save(os.path.join(tmp, "codes.npy"), np.column_stack(codes) if codes else np.empty((len(df), 0), np.int32))
+    np.save(os.path.join(tmp, "present.npy"), present)
+    meta = {
+        "key": key,
+        "source": os.path.abspath(source),
+        "rows": len(df),
+        "columns": list(df.columns),
+        "numeric_cols": numeric_cols,
+        "cat_cols": cat_cols,
+        "int_cols": int_cols,
+        "medians": {c: float(v) for c, v in medians.items()},
+        "vocab": vocab,
+    }
+    with open(os.path.join(tmp, META_FILE), "w") as f:
+        json.dump(meta, f)
+    try:
+        os.replace(tmp, path)
+    except OSError:
+        # another process published the same key first
+        shutil.rmtree(tmp, ignore_errors=True)
+
+def load_features(source: str = DATA_PATH, cache_dir: str = CACHE_DIR) -> TrainingFeatures:
+    """Training features for source, parsing it only when no cache exists for its content hash."""
+    key = file_hash(source, cache_dir)
+    path = os.path.join(cache_dir, key[:16])
+    if not os.path.exists(os.path.join(path, META_FILE)):
+        logger.info("🔹 Building feature cache for %s", source)
+        _build(source, path, key)
+    with open(os.path.join(path, META_FILE)) as f:
+        meta = json.load(f)
+    return TrainingFeatures(path, meta)
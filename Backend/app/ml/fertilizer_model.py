@@ -1,24 +1,15 @@
-import pandas as pd
+import os
 import numpy as np
-import joblib
 from difflib import get_close_matches
-import os
 from typing import Optional, Dict
 
-# -----------------------
-# Load Trained Model
-# -----------------------
-current_dir = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(current_dir, "fertilizer_model.pkl")
-
-try:
-    model_bundle = joblib.load(MODEL_PATH)
-    model = model_bundle["model"]
-    scaler = model_bundle["scaler"]
-    target_encoder = model_bundle["target_encoder"]
-    cat_encoders = model_bundle["cat_encoders"]
-except Exception as e:
-    raise RuntimeError(f"❌ Error loading fertilizer model: {e}")
+from app.core.metrics import timer
+from app.ml.model_registry import get_fertilizer_model, get_fertilizer_npk_model
+
+# "classifier": one class per N:P:K ratio; "regression": multi-output N, P, K regressor
+MODEL_VARIANT = os.getenv("FERTILIZER_MODEL_VARIANT", "classifier")
+# Snap regression outputs to the nearest N:P:K triple seen in training
+SNAP_TO_VALID_RATIO = os.getenv("FERTILIZER_SNAP_RATIO", "true").lower() in ("1", "true", "yes")
 
 # -----------------------
 # Crop Categories
@@ -34,7 +25,8 @@ crop_categories = {
 # -----------------------
 # Helpers
 # -----------------------
-def get_closest_crop_name(crop_name: str) -> Optional[str]:
+def get_closest_crop_name(crop_name: str, cat_encoders: Optional[Dict] = None) -> Optional[str]:
+    cat_encoders = cat_encoders or get_fertilizer_model().bundle.cat_encoders
     known_crops = [c.lower() for c in cat_encoders["Crop Name"].classes_]
     match = get_close_matches(crop_name.lower(), known_crops, n=1, cutoff=0.6)
     return match[0].title() if match else None
@@ -50,8 +42,37 @@ def get_soil_type_suggestion(ph: float) -> str:
 # -----------------------
 # Prediction Logic
 # -----------------------
-def predict_npk_ratio(features: Dict) -> Dict:
+def format_ratio(n: float, p: float, k: float) -> str:
+    return ":".join(str(int(v)) if float(v).is_integer() else str(round(float(v), 1)) for v in (n, p, k))
+
+def _predict_classifier(bundle, X) -> Dict:
+    # One pass over the trees; the class is the argmax of the averaged probabilities
+    proba = (bundle.forest or bundle.model).predict_proba(X)[0]
+    best = int(np.argmax(proba))
+    recommended_ratio = bundle.target_encoder.inverse_transform([bundle.model.classes_[best]])[0]
+    n, p, k = map(float, recommended_ratio.split(":"))
+    return {"N": n, "P": p, "K": k, "ratio": recommended_ratio, "confidence": float(proba[best])}
+
+def _predict_regression(bundle, X, snap: bool) -> Dict:
+    per_tree = bundle.forest.predict_per_tree(X)[:, 0, :]
+    npk = per_tree.mean(axis=0)
+    # Relative spread of the trees' N, P, K predictions as a confidence proxy
+    spread = float(np.mean(per_tree.std(axis=0) / (np.abs(npk) + 1e-6)))
+    if snap:
+        _, idx = bundle.ratio_index.query(npk.reshape(1, -1), k=1)
+        npk = bundle.valid_ratios[idx[0, 0]]
+    n, p, k = (round(float(v), 1) for v in npk)
+    return {"N": n, "P": p, "K": k, "ratio": format_ratio(n, p, k), "confidence": round(max(0.0, 1 - spread), 3)}
+
+def predict_npk_ratio(features: Dict, variant: Optional[str] = None, snap: Optional[bool] = None) -> Dict:
     try:
+        variant = variant or MODEL_VARIANT
+        if variant == "regression":
+            bundle = get_fertilizer_npk_model().bundle
+        else:
+            bundle = get_fertilizer_model().bundle
+        scaler, cat_encoders = bundle.scaler, bundle.cat_encoders
+
         # Input extraction
         temperature = float(features.get("temperature", 25))
         humidity = float(features.get("humidity", 60))
@@ -63,38 +84,30 @@ def predict_npk_ratio(features: Dict) -> Dict:
 
         # Crop match if mismatch
         if crop_name and crop_name not in cat_encoders["Crop Name"].classes_:
-            closest = get_closest_crop_name(crop_name)
+            closest = get_closest_crop_name(crop_name, cat_encoders)
             crop_name = closest or "Rice"
 
         # Prepare input array
-        numeric_scaled = scaler.transform([[temperature, humidity, ph, rainfall]])
+        with timer("fertilizer.encode"):
+            numeric_scaled = scaler.transform([[temperature, humidity, ph, rainfall]])
 
-        soil_enc = cat_encoders["Soil Type"].transform([soil_type])[0]
-        crop_enc = cat_encoders["Crop Name"].transform([crop_name])[0]
+            soil_enc = cat_encoders["Soil Type"].transform([soil_type])[0]
+            crop_enc = cat_encoders["Crop Name"].transform([crop_name])[0]
 
-        X = np.hstack([numeric_scaled, soil_enc.reshape(1, -1), crop_enc.reshape(1, -1)])
+            X = np.hstack([numeric_scaled, soil_enc.reshape(1, -1), crop_enc.reshape(1, -1)])
 
         # Model prediction
-        prediction = model.predict(X)[0]
-        recommended_ratio = target_encoder.inverse_transform([prediction])[0]
-
-        # Confidence handling
-        confidence = None
-        if hasattr(model, "predict_proba"):
-            confidence = float(max(model.predict_proba(X)[0]))
-
-        n, p, k = map(float, recommended_ratio.split(":"))
+        if variant == "regression":
+            with timer("fertilizer_npk.forest"):
+                recommendation = _predict_regression(bundle, X, SNAP_TO_VALID_RATIO if snap is None else snap)
+        else:
+            with timer("fertilizer.forest"):
+                recommendation = _predict_classifier(bundle, X)
 
         return {
             "crop": crop_name.title(),
             "soil_type": soil_type,
-            "npk_recommendation": {
-                "N": n,
-                "P": p,
-                "K": k,
-                "ratio": recommended_ratio,
-                "confidence": confidence
-            },
+            "npk_recommendation": recommendation,
             "conditions": {
                 "temperature": temperature,
                 "humidity": humidity,
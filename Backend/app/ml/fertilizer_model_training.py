@@ -1,17 +1,23 @@
 import os
-import joblib
+import time
+import argparse
 import pandas as pd
 import numpy as np
-from sklearn.ensemble import RandomForestClassifier
+from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
+from app.ml.feature_store import TrainingFeatures, load_features
+from app.ml.artifacts import save_bundle
+from app.ml.tuning import tuned_params
+from app.ml.feature_engineering import npk_ratio_labels
 
 # Get absolute paths
 current_dir = os.path.dirname(os.path.abspath(__file__))
 DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(current_dir))), "Dataset", "synthetic_crop_full_dataset.csv")
 MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
 OUT_PATH = os.path.join(MODEL_DIR, "fertilizer_model.pkl")
+NPK_OUT_PATH = os.path.join(MODEL_DIR, "fertilizer_npk_model.pkl")
 
 def validate_input_ranges(df, numeric_cols):
     """Validate and print the ranges of input features"""
@@ -23,30 +29,25 @@ def validate_input_ranges(df, numeric_cols):
         if col in ["N", "P", "K"] and min_val < 0:
             print(f"⚠️ Warning: Negative values found in {col}")
 
-def prepare_fertilizer_data(df: pd.DataFrame):
-    df = df.rename(columns=lambda c: c.strip())
+def prepare_fertilizer_data(features: TrainingFeatures):
+    # Imputed dataset from the shared feature store
+    df = features.frame()
     
     # Required features for fertilizer recommendation
     numeric_cols = ["N", "P", "K", "Temperature", "Humidity", "pH", "Rainfall"]
     cat_cols = ["Soil Type", "Crop Name"]
     
-    # Fill missing values
-    df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].median())
-    for c in cat_cols:
-        df[c] = df[c].fillna("Unknown").astype(str)
-    
     # Encode categorical columns
     cat_encoders = {}
     X_cat_list = []
     for c in cat_cols:
-        le = LabelEncoder()
-        Xc = le.fit_transform(df[c].astype(str))
+        le, Xc = features.encoder(c)
         cat_encoders[c] = le
         X_cat_list.append(Xc.reshape(-1, 1))
     
     # Create target variable based on NPK levels
     # Classify into different fertilizer categories based on NPK ratios
-    df["NPK_ratio"] = df.apply(lambda x: f"{x['N']}:{x['P']}:{x['K']}", axis=1)
+    df["NPK_ratio"] = npk_ratio_labels(df["N"], df["P"], df["K"])
     target_le = LabelEncoder()
     y = target_le.fit_transform(df["NPK_ratio"])
     
@@ -61,15 +62,15 @@ def prepare_fertilizer_data(df: pd.DataFrame):
     
     return X_combined, y, target_le, cat_encoders, feature_cols
 
-def train():
+def train(n_jobs: int = -1):
     print("🔹 Loading dataset...")
-    df = pd.read_csv(DATA_PATH)
+    features = load_features(DATA_PATH)
     
     # Validate input ranges
     numeric_cols = ["N", "P", "K", "Temperature", "Humidity", "pH", "Rainfall"]
-    validate_input_ranges(df, numeric_cols)
+    validate_input_ranges(features.frame(), numeric_cols)
     
-    X, y, target_encoder, cat_encoders, feature_cols = prepare_fertilizer_data(df)
+    X, y, target_encoder, cat_encoders, feature_cols = prepare_fertilizer_data(features)
     
     # Scale numeric features
     scaler = StandardScaler()
@@ -81,7 +82,7 @@ def train():
     )
     
     # Train model
-    model = RandomForestClassifier(n_estimators=250, random_state=42, n_jobs=-1)
+    model = RandomForestClassifier(**{"n_estimators": 250, **tuned_params(OUT_PATH)}, random_state=42, n_jobs=n_jobs)
     model.fit(X_train, y_train)
     
     # Evaluate
@@ -89,7 +90,7 @@ def train():
     acc = accuracy_score(y_test, preds)
     print(f"\n✅ Fertilizer Recommendation Model Accuracy: {acc*100:.2f}%")
     print("\n📊 Classification Report:")
-    print(classification_report(y_test, preds, target_names=target_encoder.classes_[:5]))  # Show first 5 classes
+    print(classification_report(y_test, preds, labels=np.arange(5), target_names=target_encoder.classes_[:5], zero_division=0))  # Show first 5 classes
     
     # Save bundle
     bundle = {
@@ -101,7 +102,7 @@ def train():
     }
     
     os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
-    joblib.dump(bundle, OUT_PATH)
+    save_bundle(bundle, OUT_PATH)
     print(f"\n💾 Model saved to: {OUT_PATH}")
     
     # Print feature importance
@@ -113,6 +114,84 @@ def train():
     print("\n🔍 Top 5 Important Features:")
     print(importance.head())
 
+def train_regressor(n_jobs: int = -1):
+    """Multi-output variant: one RandomForestRegressor predicting N, P and K directly.
+
+    The bundle also stores every distinct N:P:K triple seen in training as the set of
+    valid ratios that predictions can be snapped to.
+    """
+    print("🔹 Loading dataset...")
+    features = load_features(DATA_PATH)
+    X, _, _, cat_encoders, feature_cols = prepare_fertilizer_data(features)
+    y = features.numeric(["N", "P", "K"])
+    
+    # Scale numeric features
+    scaler = StandardScaler()
+    num_numeric = len([c for c in feature_cols if c in ["Temperature", "Humidity", "pH", "Rainfall"]])
+    X[:, :num_numeric] = scaler.fit_transform(X[:, :num_numeric])
+    
+    X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
+    
+    model = RandomForestRegressor(**{"n_estimators": 250, **tuned_params(NPK_OUT_PATH)}, random_state=42, n_jobs=n_jobs)
+    model.fit(X_train, y_train)
+    
+    # Evaluate
+    preds = model.predict(X_test)
+    mae = np.abs(preds - y_test).mean(axis=0)
+    print(f"\n✅ Fertilizer NPK Regression MAE: N {mae[0]:.2f}, P {mae[1]:.2f}, K {mae[2]:.2f}")
+    
+    bundle = {
+        "model": model,
+        "scaler": scaler,
+        "cat_encoders": cat_encoders,
+        "feature_cols": feature_cols,
+        "valid_ratios": np.unique(y, axis=0)
+    }
+    
+    os.makedirs(os.path.dirname(NPK_OUT_PATH), exist_ok=True)
+    save_bundle(bundle, NPK_OUT_PATH)
+    print(f"\n💾 Model saved to: {NPK_OUT_PATH}")
+
+def compare_variants(n_requests: int = 500, batch_size: int = 1024) -> pd.DataFrame:
+    """Size and latency of the classifier and multi-output regression bundles, as served."""
+    from app.ml.fertilizer_model import predict_npk_ratio
+    from app.ml.model_registry import get_fertilizer_model, get_fertilizer_npk_model
+    
+    df = load_features(DATA_PATH).frame()
+    rng = np.random.default_rng(0)
+    requests = [
+        {"temperature": r["Temperature"], "humidity": r["Humidity"], "ph": r["pH"],
+         "rainfall": r["Rainfall"], "soil_type": r["Soil Type"], "crop_name": r["Crop Name"]}
+        for r in df.iloc[rng.integers(0, len(df), n_requests)].to_dict("records")
+    ]
+    
+    rows = []
+    for variant, path, handle in [("classifier", OUT_PATH, get_fertilizer_model),
+                                  ("regression", NPK_OUT_PATH, get_fertilizer_npk_model)]:
+        bundle = handle().bundle
+        predict_npk_ratio(requests[0], variant=variant)  # warm up
+        latencies = []
+        for req in requests:
+            start = time.perf_counter()
+            predict_npk_ratio(req, variant=variant)
+            latencies.append((time.perf_counter() - start) * 1000)
+        
+        X = np.zeros((batch_size, bundle.model.n_features_in_))
+        start = time.perf_counter()
+        bundle.forest.predict_per_tree(X)
+        batch_ms = (time.perf_counter() - start) * 1000
+        
+        rows.append({
+            "variant": variant,
+            "file_mb": round(os.path.getsize(path) / 1e6, 2),
+            "nodes": int(len(bundle.forest.feature)),
+            "leaf_values": int(bundle.forest.value.size),
+            "p50_ms": round(float(np.percentile(latencies, 50)), 3),
+            "p99_ms": round(float(np.percentile(latencies, 99)), 3),
+            f"batch_{batch_size}_ms": round(batch_ms, 2),
+        })
+    return pd.DataFrame(rows)
+
 if __name__ == "__main__":
     try:
         if not os.path.exists(DATA_PATH):
@@ -121,8 +200,18 @@ if __name__ == "__main__":
         import sklearn
         print(f"🐍 Using scikit-learn version: {sklearn.__version__}")
         
-        train()
+        parser = argparse.ArgumentParser(description="Train the fertilizer recommendation model")
+        parser.add_argument("--variant", choices=["classifier", "regression", "both"], default="classifier")
+        parser.add_argument("--compare", action="store_true", help="print size/latency of both saved variants")
+        args = parser.parse_args()
+        
+        if args.variant in ("classifier", "both"):
+            train()
+        if args.variant in ("regression", "both"):
+            train_regressor()
         print("\n✨ Training completed successfully!")
+        if args.compare:
+            print(compare_variants().to_string(index=False))
     except Exception as e:
         print(f"❌ Error during training: {str(e)}")
         exit(1)
\ No newline at end of file
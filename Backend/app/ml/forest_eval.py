@@ -0,0 +1,225 @@
+# app/ml/forest_eval.py
+import os
+
+import numpy as np
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Upper bound on (trees x rows) node indices held in memory per evaluation chunk
+MAX_CHUNK_CELLS = 2_000_000
+# (tree, row) pairs descended together; small enough for the trees' nodes to stay in cache
+TREE_GROUP_CELLS = 16_384
+# Upper bound on per-tree output values gathered at once when averaging over the trees
+MEAN_BLOCK_VALUES = 1_000_000
+
+# Above this many rows sklearn's own (Cython) evaluator is faster for mean predictions
+COMPILED_MAX_ROWS = int(os.getenv("FOREST_COMPILED_MAX_ROWS", "256"))
+
+class CompiledForest:
+    """Array-backed copy of one or more fitted sklearn tree ensembles.
+
+    All trees are flattened into shared node arrays (feature, threshold, left,
+    right, value) so every tree can be evaluated for a batch of rows with a
+    handful of vectorized NumPy operations per tree level, instead of one
+    Python-level estimator.predict call per tree.
+
+    Leaves point to themselves with an infinite threshold, so the descent loop
+    needs no per-node leaf checks. Several forests can be compiled together
+    (e.g. the yield and profit models) and evaluated in one pass; their
+    per-tree outputs are separated again with split_groups().
+    """
+
+    def __init__(self, feature, threshold, left, right, value, roots, max_depth,
+                 group_sizes, classes=None, n_features_in=None):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.value = value
+        self.roots = roots
+        self.max_depth = int(max_depth)
+        self.group_sizes = list(group_sizes)
+        self.classes_ = classes
+        self.n_features_in_ = n_features_in
+
+    @property
+    def n_trees(self) -> int:
+        return len(self.roots)
+
+    @property
+    def is_classifier(self) -> bool:
+        return self.classes_ is not None
+
+    @classmethod
+    def from_sklearn(cls, *forests) -> "CompiledForest":
+        """Compile fitted RandomForest/ExtraTrees/DecisionTree models sharing one task type."""
+        features, thresholds, lefts, rights, values, roots, group_sizes = [], [], [], [], [], [], []
+        offset, max_depth = 0, 0
+        classes = None
+
+        for forest in forests:
+            estimators = getattr(forest, "estimators_", [forest])
+            group_sizes.append(len(estimators))
+            forest_classes = getattr(forest, "classes_", None)
+            if forest_classes is not None:
+                if getattr(forest, "n_outputs_", 1) != 1:
+                    raise ValueError("Multi-output classifiers are not supported")
+                classes = np.asarray(forest_classes)
+
+            for est in estimators:
+                tree = est.tree_
+                n = tree.node_count
+                idx = np.arange(n, dtype=np.int64) + offset
+                is_leaf = tree.children_left == -1
+
+                features.append(np.where(is_leaf, 0, tree.feature).astype(np.int64))
+                thresholds.append(np.where(is_leaf, np.inf, tree.threshold))
+                lefts.append(np.where(is_leaf, idx, tree.children_left + offset))
+                rights.append(np.where(is_leaf, idx, tree.children_right + offset))
+
+                value = tree.value[:, :, 0] if forest_classes is None else tree.value[:, 0, :]
+                if forest_classes is not None:
+                    value = value / np.maximum(value.sum(axis=1, keepdims=True), 1e-12)
+                values.append(value.astype(np.float64))
+
+                roots.append(offset)
+                max_depth = max(max_depth, tree.max_depth)
+                offset += n
+
+        n_features_in = getattr(forests[0], "n_features_in_", None)
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            value=np.concatenate(values),
+            roots=np.asarray(roots, dtype=np.int64),
+            max_depth=max_depth,
+            group_sizes=group_sizes,
+            classes=classes,
+            n_features_in=n_features_in,
+        )
+
+    def _descend(self, X: np.ndarray) -> np.ndarray:
+        """Leaf node index reached in every tree for a chunk of rows, shape (n_trees, n_samples).
+
+        Trees are walked a few at a time so their nodes stay in cache, and only
+        (tree, row) pairs that haven't reached a leaf are advanced at each level.
+        """
+        n, n_features = X.shape
+        flat = X.ravel()
+        offsets = np.arange(n, dtype=np.int64) * n_features
+        leaves = np.empty((self.n_trees, n), dtype=np.int64)
+        step = max(1, TREE_GROUP_CELLS // max(n, 1))
+        for t in range(0, self.n_trees, step):
+            roots = self.roots[t:t + step]
+            node = np.repeat(roots, n)
+            base = np.tile(offsets, len(roots))
+            active = np.flatnonzero(self.left[node] != node)
+            while active.size:
+                current = node[active]
+                go_left = flat[base[active] + self.feature[current]] <= self.threshold[current]
+                current = np.where(go_left, self.left[current], self.right[current])
+                node[active] = current
+                active = active[self.left[current] != current]
+            leaves[t:t + len(roots)] = node.reshape(len(roots), n)
+        return leaves
+
+    def _chunks(self, X: np.ndarray) -> Iterator[Tuple[slice, np.ndarray]]:
+        """(row slice, leaves of those rows) for chunks of at most MAX_CHUNK_CELLS (tree, row) pairs."""
+        # sklearn compares float32 inputs against float64 thresholds
+        X = np.asarray(X, dtype=np.float32).astype(np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        chunk = max(1, MAX_CHUNK_CELLS // max(self.n_trees, 1))
+        for start in range(0, X.shape[0], chunk):
+            rows = slice(start, min(start + chunk, X.shape[0]))
+            yield rows, self._descend(np.ascontiguousarray(X[rows]))
+
+    def apply(self, X: np.ndarray) -> np.ndarray:
+        """Leaf node index reached in every tree, shape (n_trees, n_samples)."""
+        return np.concatenate([leaves for _, leaves in self._chunks(X)], axis=1)
+
+    def predict_per_tree(self, X: np.ndarray) -> np.ndarray:
+        """Per-tree outputs: (n_trees, n_samples) for single-output regression,
+        (n_trees, n_samples, n_outputs|n_classes) otherwise.
+
+        This holds every tree's output at once; predict() and predict_proba()
+        only need the mean and don't.
+        """
+        out = self.value[self.apply(X)]
+        if out.shape[-1] == 1 and not self.is_classifier:
+            out = out[..., 0]
+        return out
+
+    def _mean(self, X: np.ndarray) -> np.ndarray:
+        """Mean output over the trees, (n_samples, n_outputs|n_classes), summed one chunk at a time."""
+        n = 1 if np.ndim(X) == 1 else len(X)
+        total = np.empty((n, self.value.shape[1]))
+        block = max(1, MEAN_BLOCK_VALUES // (self.n_trees * self.value.shape[1]))
+        for rows, leaves in self._chunks(X):
+            for start in range(0, leaves.shape[1], block):
+                stop = min(start + block, leaves.shape[1])
+                # Summing over axis 0 adds the trees in order, like sklearn's running sum
+                total[rows.start + start:rows.start + stop] = self.value[leaves[:, start:stop]].sum(axis=0)
+        return total / self.n_trees
+
+    def group(self, i: int) -> "CompiledForest":
+        """The i-th compiled forest on its own, sharing (not copying) the node arrays."""
+        start = sum(self.group_sizes[:i])
+        return CompiledForest(
+            self.feature, self.threshold, self.left, self.right, self.value,
+            self.roots[start:start + self.group_sizes[i]], self.max_depth, [self.group_sizes[i]],
+            classes=self.classes_, n_features_in=self.n_features_in_,
+        )
+
+    def split_groups(self, per_tree: np.ndarray) -> List[np.ndarray]:
+        """Split stacked per-tree outputs back into one array per compiled forest."""
+        return np.split(per_tree, np.cumsum(self.group_sizes)[:-1])
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        mean = self._mean(X)
+        if self.is_classifier:
+            return self.classes_[np.argmax(mean, axis=1)]
+        return mean[:, 0] if mean.shape[1] == 1 else mean
+
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        if not self.is_classifier:
+            raise AttributeError("predict_proba is only available for classifiers")
+        return self._mean(X)
+
+    def summarize(self, X: np.ndarray, quantiles: Sequence[float] = (5, 95)) -> Dict[str, np.ndarray]:
+        """Per-tree outputs plus their mean, standard deviation and quantiles across trees."""
+        per_tree = self.predict_per_tree(X)
+        return summarize_trees(per_tree, quantiles)
+
+def summarize_trees(per_tree: np.ndarray, quantiles: Sequence[float] = (5, 95)) -> Dict[str, np.ndarray]:
+    """Mean, std and quantiles over the tree axis of per-tree outputs."""
+    return {
+        "per_tree": per_tree,
+        "mean": per_tree.mean(axis=0),
+        "std": per_tree.std(axis=0),
+        "quantiles": np.percentile(per_tree, list(quantiles), axis=0),
+    }
+
+def mean_evaluator(model, forest: Optional[CompiledForest], n_rows: int):
+    """The model to take predict()/predict_proba() from for a batch of n_rows.
+
+    The compiled forest avoids sklearn's per-call overhead on small batches; large
+    batches go to the sklearn model when it is loaded (serving artifacts only
+    carry the compiled forest, which is then used for every batch size).
+    """
+    if forest is None or (n_rows > COMPILED_MAX_ROWS and not isinstance(model, CompiledForest)):
+        return model
+    return forest
+
+def compile_forest(model) -> Optional[CompiledForest]:
+    """Compile a fitted forest, or return None for models without sklearn trees."""
+    if model is None or isinstance(model, CompiledForest):
+        return model
+    estimators = getattr(model, "estimators_", None)
+    if not estimators or not all(hasattr(est, "tree_") for est in estimators):
+        return None
+    try:
+        return CompiledForest.from_sklearn(model)
+    except ValueError:
+        return None
@@ -0,0 +1,418 @@
+# app/ml/market_store.py
+import os
+import json
+import shutil
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from datetime import date
+from typing import Dict, Iterable, List, Optional, Union
+
+try:
+    import fcntl
+except ImportError:  # Windows: only the in-process lock applies
+    fcntl = None
+
+import numpy as np
+import pandas as pd
+
+BASE = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+DEFAULT_CSV_PATH = os.path.join(BASE, "data", "market_prices.csv")
+
+MANIFEST = "manifest.json"
+FORMAT_VERSION = 2
+
+# market_prices.csv header -> store column
+CSV_COLUMNS = {
+    "State": "state",
+    "District": "district",
+    "Market": "market",
+    "Commodity": "commodity",
+    "Variety": "variety",
+    "Grade": "grade",
+    "Arrival_Date": "arrival_date",
+    "Min Price": "min_price",
+    "Max Price": "max_price",
+    "Modal Price": "modal_price",
+}
+CATEGORICAL_COLUMNS = ["state", "district", "market", "commodity", "variety", "grade"]
+PRICE_COLUMNS = ["min_price", "max_price", "modal_price", "arrivals"]
+PARTITION_COLUMNS = ("state", "commodity")
+# A record is identified by these columns within its partition; later appends win
+DEDUP_COLUMNS = ["district", "market", "variety", "grade", "arrival_date"]
+
+# Column dtypes: dictionary codes, typed dates, compact prices
+COLUMN_DTYPES = {
+    **{c: np.dtype(np.int32) for c in CATEGORICAL_COLUMNS},
+    "arrival_date": np.dtype("datetime64[D]"),
+    **{c: np.dtype(np.float32) for c in PRICE_COLUMNS},
+}
+COLUMNS = list(COLUMN_DTYPES)
+
+# Per-row provenance, stored in the shards but not returned by queries: a rebuild
+# from the CSV replaces the CSV rows and carries the appended (e.g. Agmarknet) rows over
+SOURCE_CSV, SOURCE_APPEND = 0, 1
+SHARD_DTYPES = {**COLUMN_DTYPES, "source": np.dtype(np.int8)}
+SHARD_COLUMNS = list(SHARD_DTYPES)
+
+# Seconds a replaced shard directory is kept for readers still using an older manifest
+SHARD_GRACE_SECONDS = float(os.getenv("MARKET_STORE_SHARD_GRACE", "300"))
+
+_process_lock = threading.RLock()  # reentrant: a rebuild appends to its temporary store
+
+@contextmanager
+def store_lock(root: str):
+    """Serialize store writes and rebuilds across threads and worker processes."""
+    with _process_lock:
+        os.makedirs(os.path.dirname(os.path.abspath(root)), exist_ok=True)
+        with open(os.path.abspath(root) + ".lock", "a") as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+DateLike = Union[str, date, np.datetime64, pd.Timestamp]
+
+def _to_day(value: DateLike) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(value).date(), "D")
+
+def normalize_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """Rename CSV/Agmarknet columns to the store schema and type the dates and prices."""
+    df = df.rename(columns=lambda c: CSV_COLUMNS.get(c.strip(), c.strip().lower().replace(" ", "_")))
+    if "arrival" in df.columns and "arrivals" not in df.columns:
+        df = df.rename(columns={"arrival": "arrivals"})
+    for c in CATEGORICAL_COLUMNS:
+        df[c] = df[c].fillna("Unknown").astype(str) if c in df.columns else "Unknown"
+    for c in PRICE_COLUMNS:
+        df[c] = pd.to_numeric(df[c], errors="coerce").fillna(0) if c in df.columns else 0.0
+    if not pd.api.types.is_datetime64_any_dtype(df["arrival_date"]):
+        # Agmarknet dates are day-first (dd-mm-yyyy in the CSV, dd/mm/yyyy from the API)
+        dates = df["arrival_date"].astype(str).str.replace("/", "-", regex=False)
+        df["arrival_date"] = pd.to_datetime(dates, format="%d-%m-%Y", errors="coerce")
+    return df[CATEGORICAL_COLUMNS + ["arrival_date"] + PRICE_COLUMNS]
+
+class MarketPriceStore:
+    """Columnar market price store partitioned by (state, commodity).
+
+    Rows are sharded by state; each shard directory holds one .npy file per
+    column, sorted by commodity then arrival date, so every (state, commodity)
+    partition is a contiguous row range recorded in the manifest together with
+    its date range. Categoricals are int32 codes into store-wide dictionaries,
+    arrival dates are datetime64[D] and prices float32.
+
+    Column files are memory-mapped on read. Queries prune partitions by state,
+    commodity and date range from the manifest alone, then slice only the
+    requested rows of the columns they need (predicate pushdown), so a query for
+    one commodity never reads the others' pages.
+
+    Shard directories are never modified: a write puts each changed shard in a
+    new directory, and the atomically replaced manifest is the only thing that
+    points to it. Readers therefore see either the old or the new version of a
+    shard, never a mix. Replaced directories are deleted by a later write once
+    SHARD_GRACE_SECONDS have passed.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+        self._lock = threading.Lock()
+        self._columns: Dict[tuple, np.ndarray] = {}
+        self._manifest = self._read_manifest()
+
+    # -----------------------
+    # Manifest
+    # -----------------------
+    def _read_manifest(self) -> Dict:
+        path = os.path.join(self.root, MANIFEST)
+        if not os.path.exists(path):
+            return {"version": FORMAT_VERSION, "dictionaries": {c: [] for c in CATEGORICAL_COLUMNS},
+                    "shards": {}, "partitions": {}}
+        with open(path) as f:
+            return json.load(f)
+
+    def _write_manifest(self) -> None:
+        tmp = os.path.join(self.root, MANIFEST + ".tmp")
+        with open(tmp, "w") as f:
+            json.dump(self._manifest, f)
+        os.replace(tmp, os.path.join(self.root, MANIFEST))
+
+    @property
+    def exists(self) -> bool:
+        return os.path.exists(os.path.join(self.root, MANIFEST))
+
+    @property
+    def num_rows(self) -> int:
+        return sum(self._manifest["shards"].values())
+
+    def dictionary(self, column: str) -> List[str]:
+        return self._manifest["dictionaries"][column]
+
+    def refresh(self) -> None:
+        """Re-read the manifest, e.g. after another process wrote to the store."""
+        with self._lock:
+            self._manifest = self._read_manifest()
+            self._columns.clear()
+
+    # -----------------------
+    # Writing
+    # -----------------------
+    @classmethod
+    def build_from_csv(cls, csv_path: str = DEFAULT_CSV_PATH, root: Optional[str] = None) -> "MarketPriceStore":
+        store = cls(root or store_dir_for(csv_path))
+        store.append(pd.read_csv(csv_path, dtype=str), source=SOURCE_CSV)
+        return store
+
+    def appended_records(self) -> pd.DataFrame:
+        """Rows added by append() rather than the CSV build, in the store schema."""
+        frames = []
+        for shard in self._manifest["shards"]:
+            columns = self._load_shard(os.path.join(self.root, shard))
+            keep = columns["source"] == SOURCE_APPEND
+            frame = pd.DataFrame({c: columns[c][keep] for c in COLUMNS})
+            for c in CATEGORICAL_COLUMNS:
+                frame[c] = np.asarray(self.dictionary(c), dtype=object)[frame[c].to_numpy()]
+            frame["arrival_date"] = frame["arrival_date"].astype("datetime64[ns]")
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=COLUMNS)
+
+    def _encode(self, df: pd.DataFrame, source: int) -> Dict[str, np.ndarray]:
+        """Columns as typed arrays; categoricals map to codes, extending the dictionaries append-only."""
+        columns = {}
+        for c in CATEGORICAL_COLUMNS:
+            vocab = self._manifest["dictionaries"][c]
+            index = {v: i for i, v in enumerate(vocab)}
+            values = df[c].to_numpy()
+            for v in pd.unique(values):
+                if v not in index:
+                    index[v] = len(vocab)
+                    vocab.append(v)
+            columns[c] = np.fromiter((index[v] for v in values), dtype=np.int32, count=len(values))
+        columns["arrival_date"] = df["arrival_date"].to_numpy().astype("datetime64[D]")
+        for c in PRICE_COLUMNS:
+            columns[c] = df[c].to_numpy(dtype=np.float32)
+        columns["source"] = np.full(len(df), source, dtype=np.int8)
+        return columns
+
+    def append(self, records: Union[pd.DataFrame, Iterable[Dict]], source: int = SOURCE_APPEND) -> int:
+        """Add CSV rows or Agmarknet records, rewriting only the state shards they touch."""
+        df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+        if df.empty:
+            return 0
+        df = normalize_frame(df)
+        df = df[df["arrival_date"].notna()]
+
+        with self._lock, store_lock(self.root):
+            # Another process may have appended or rebuilt since this instance read the manifest
+            self._manifest = self._read_manifest()
+            os.makedirs(self.root, exist_ok=True)
+            columns = self._encode(df, source)
+            retired = []
+            for state_code in np.unique(columns["state"]):
+                mask = columns["state"] == state_code
+                retired += self._merge_shard(int(state_code), {c: v[mask] for c, v in columns.items()})
+            self._columns.clear()
+            self._write_manifest()
+            for shard in retired:
+                os.utime(os.path.join(self.root, shard))  # starts its grace period
+            self._collect_garbage()
+        return len(df)
+
+    def _collect_garbage(self) -> None:
+        """Delete shard directories the manifest no longer references once their grace period is over."""
+        live = set(self._manifest["shards"])
+        now = time.time()
+        for entry in os.scandir(self.root):
+            if (entry.is_dir() and entry.name.startswith("state-") and entry.name not in live
+                    and now - entry.stat().st_mtime > SHARD_GRACE_SECONDS):
+                shutil.rmtree(entry.path, ignore_errors=True)
+
+    @staticmethod
+    def _load_shard(shard_dir: str) -> Dict[str, np.ndarray]:
+        columns = {c: np.load(os.path.join(shard_dir, f"{c}.npy")) for c in COLUMNS}
+        source_path = os.path.join(shard_dir, "source.npy")
+        # Version 1 shards have no provenance; keep all their rows through rebuilds
+        columns["source"] = (np.load(source_path) if os.path.exists(source_path)
+                             else np.full(len(columns["state"]), SOURCE_APPEND, dtype=np.int8))
+        return columns
+
+    def _current_shard(self, state_code: int) -> Optional[str]:
+        # state-<code>.<version>, or plain state-<code> for stores written before versioning
+        for shard in self._manifest["shards"]:
+            if shard == f"state-{state_code}" or shard.startswith(f"state-{state_code}."):
+                return shard
+        return None
+
+    def _merge_shard(self, state_code: int, new: Dict[str, np.ndarray]) -> List[str]:
+        """Write the state's merged rows as a new shard version; returns the replaced shard, if any."""
+        old_shard = self._current_shard(state_code)
+        if old_shard is not None:
+            old = self._load_shard(os.path.join(self.root, old_shard))
+            merged = {c: np.concatenate([old[c], new[c]]) for c in SHARD_COLUMNS}
+            # keep the last occurrence of each record
+            frame = pd.DataFrame({c: merged[c] for c in ["commodity"] + DEDUP_COLUMNS})
+            keep = ~frame.duplicated(keep="last").to_numpy()
+            merged = {c: v[keep] for c, v in merged.items()}
+        else:
+            merged = new
+
+        order = np.lexsort((merged["arrival_date"], merged["commodity"]))
+        merged = {c: v[order] for c, v in merged.items()}
+
+        # A new directory (unique across rebuilds too), visible once the manifest points to it
+        shard = f"state-{state_code}.{uuid.uuid4().hex[:12]}"
+        shard_dir = os.path.join(self.root, shard)
+        os.makedirs(shard_dir)
+        for c in SHARD_COLUMNS:
+            np.save(os.path.join(shard_dir, f"{c}.npy"), merged[c].astype(SHARD_DTYPES[c]))
+
+        vocab = self._manifest["dictionaries"]
+        partitions = self._manifest["partitions"]
+        for name in [n for n, meta in partitions.items() if meta["shard"] == old_shard]:
+            del partitions[name]
+        commodities, starts, counts = np.unique(merged["commodity"], return_index=True, return_counts=True)
+        for commodity_code, start, count in zip(commodities, starts, counts):
+            dates = merged["arrival_date"][start:start + count]
+            partitions[f"{state_code}-{int(commodity_code)}"] = {
+                "state": vocab["state"][state_code],
+                "commodity": vocab["commodity"][int(commodity_code)],
+                "shard": shard,
+                "start": int(start),
+                "stop": int(start + count),
+                "min_date": str(dates[0]),
+                "max_date": str(dates[-1]),
+            }
+        self._manifest["shards"].pop(old_shard, None)
+        self._manifest["shards"][shard] = int(len(merged["state"]))
+        return [old_shard] if old_shard is not None else []
+
+    # -----------------------
+    # Reading
+    # -----------------------
+    def partitions(self, state: Optional[str] = None, commodity: Optional[str] = None,
+                   start: Optional[DateLike] = None, end: Optional[DateLike] = None) -> List[str]:
+        """Partition names that can contain rows matching the predicates (from manifest stats only)."""
+        start_s = str(_to_day(start)) if start is not None else None
+        end_s = str(_to_day(end)) if end is not None else None
+        names = []
+        for name, meta in self._manifest["partitions"].items():
+            if state is not None and meta["state"] != state:
+                continue
+            if commodity is not None and meta["commodity"] != commodity:
+                continue
+            if start_s is not None and meta["max_date"] < start_s:
+                continue
+            if end_s is not None and meta["min_date"] > end_s:
+                continue
+            names.append(name)
+        return names
+
+    def _column(self, shard: str, column: str) -> np.ndarray:
+        key = (shard, column)
+        if key not in self._columns:
+            self._columns[key] = np.load(os.path.join(self.root, shard, f"{column}.npy"), mmap_mode="r")
+        return self._columns[key]
+
+    def read_partition(self, name: str, columns: Optional[List[str]] = None) -> Dict[str, np.ndarray]:
+        """Memory-mapped column slices of one partition."""
+        meta = self._manifest["partitions"][name]
+        return {c: self._column(meta["shard"], c)[meta["start"]:meta["stop"]] for c in (columns or COLUMNS)}
+
+    def scan(self, state: Optional[str] = None, commodity: Optional[str] = None,
+             start: Optional[DateLike] = None, end: Optional[DateLike] = None,
+             columns: Optional[List[str]] = None, **equals) -> Dict[str, np.ndarray]:
+        """Column arrays of the rows matching every predicate; equals filters categoricals by value."""
+        try:
+            return self._scan(state, commodity, start, end, columns, **equals)
+        except FileNotFoundError:
+            # The shard versions this manifest points to were collected (or the store rebuilt); read the current ones
+            self.refresh()
+            return self._scan(state, commodity, start, end, columns, **equals)
+
+    def _scan(self, state, commodity, start, end, columns, **equals) -> Dict[str, np.ndarray]:
+        columns = columns or COLUMNS
+        filters = {}
+        for column, value in equals.items():
+            vocab = self.dictionary(column)
+            if value not in vocab:
+                return {c: np.empty(0, dtype=COLUMN_DTYPES[c]) for c in columns}
+            filters[column] = vocab.index(value)
+
+        needed = list(dict.fromkeys(columns + list(filters) + (["arrival_date"] if start or end else [])))
+        chunks = {c: [] for c in columns}
+        for name in self.partitions(state, commodity, start, end):
+            part = self.read_partition(name, needed)
+            mask = None
+            if start is not None:
+                mask = part["arrival_date"] >= _to_day(start)
+            if end is not None:
+                m = part["arrival_date"] <= _to_day(end)
+                mask = m if mask is None else mask & m
+            for column, code in filters.items():
+                m = part[column] == code
+                mask = m if mask is None else mask & m
+            for c in columns:
+                chunks[c].append(part[c] if mask is None else part[c][mask])
+        return {
+            c: np.concatenate(v) if v else np.empty(0, dtype=COLUMN_DTYPES[c])
+            for c, v in chunks.items()
+        }
+
+    def query(self, state: Optional[str] = None, commodity: Optional[str] = None,
+              start: Optional[DateLike] = None, end: Optional[DateLike] = None,
+              columns: Optional[List[str]] = None, **equals) -> pd.DataFrame:
+        """Rows matching the predicates as a DataFrame with categorical string columns."""
+        data = self.scan(state, commodity, start, end, columns, **equals)
+        for c in CATEGORICAL_COLUMNS:
+            if c in data:
+                data[c] = pd.Categorical.from_codes(data[c], categories=self.dictionary(c))
+        if "arrival_date" in data:
+            data["arrival_date"] = data["arrival_date"].astype("datetime64[ns]")
+        return pd.DataFrame(data)
+
+def store_dir_for(csv_path: str) -> str:
+    """The store for data/market_prices.csv lives in data/market_prices.store/."""
+    return os.path.splitext(csv_path)[0] + ".store"
+
+def _is_stale(csv_path: str, root: str) -> bool:
+    manifest = os.path.join(root, MANIFEST)
+    return os.path.exists(csv_path) and (
+        not os.path.exists(manifest) or os.path.getmtime(csv_path) > os.path.getmtime(manifest)
+    )
+
+def rebuild(csv_path: str, root: str) -> None:
+    """Rebuild the store from the CSV, keeping the rows appended since the last build.
+
+    The new store is built in a temporary directory and swapped in with renames,
+    so readers never see a partial store; processes holding the old column files
+    memory-mapped keep reading them until they reopen.
+    """
+    pid = os.getpid()
+    building, retired = f"{root}.building-{pid}", f"{root}.old-{pid}"
+    shutil.rmtree(building, ignore_errors=True)
+    store = MarketPriceStore.build_from_csv(csv_path, building)
+    if os.path.exists(os.path.join(root, MANIFEST)):
+        # Appended after the CSV rows, so an appended record wins over the same CSV record
+        store.append(MarketPriceStore(root).appended_records(), source=SOURCE_APPEND)
+
+    if os.path.isdir(root):
+        os.replace(root, retired)
+    os.replace(building, root)
+    shutil.rmtree(retired, ignore_errors=True)
+    os.remove(os.path.abspath(building) + ".lock")
+
+def open_store(csv_path: str = DEFAULT_CSV_PATH, root: Optional[str] = None) -> MarketPriceStore:
+    """Open the store, rebuilding it from the CSV when the CSV is newer than the store."""
+    root = root or store_dir_for(csv_path)
+    if _is_stale(csv_path, root):
+        with store_lock(root):
+            # Another worker may have rebuilt it while this one waited for the lock
+            if _is_stale(csv_path, root):
+                rebuild(csv_path, root)
+    return MarketPriceStore(root)
+
+def load_market_prices(csv_path: str = DEFAULT_CSV_PATH, **predicates) -> pd.DataFrame:
+    """Market prices from the columnar store instead of re-parsing the CSV; see MarketPriceStore.query."""
+    return open_store(csv_path).query(**predicates)
@@ -1,41 +1,105 @@
-import joblib
 import numpy as np
+import pandas as pd
+from typing import Optional
 
-# Load model correctly
-import os
-
-# Get the absolute path to the model file
-MODEL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "crop_model.pkl")
-
-try:
-    if not os.path.exists(MODEL_PATH):
-        raise FileNotFoundError(f"Model file not found at: {MODEL_PATH}")
-    model_bundle = joblib.load(MODEL_PATH)
-    model = model_bundle["model"]
-    scaler = model_bundle["scaler"]
-    label_encoder = model_bundle["label_encoder"]
-    cat_encoders = model_bundle["cat_encoders"]
-    numeric_cols = model_bundle["numeric_cols"]
-    cat_cols = model_bundle["cat_cols"]
-except Exception as e:
-    print(f"❌ Error loading model: {str(e)}")
-    raise
-
-def predict_crop(features: dict):
+from app.core.metrics import timer
+from app.ml.forest_eval import mean_evaluator
+from app.ml.model_registry import get_crop_model, CropModelBundle
+
+# Request keys in the order of the training dataset columns
+FEATURE_KEYS = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+
+# Request keys for the categorical training columns (optional in requests)
+CAT_FEATURE_KEYS = {"Soil Type": "soil_type", "Type": "crop_type"}
+
+def _encode_column(bundle: CropModelBundle, col, values: list) -> np.ndarray:
+    """Encode a categorical column, falling back to 0 for missing and unseen values.
+
+    LabelEncoder.classes_ is sorted, so known values are encoded with one searchsorted
+    call instead of a transform() call per row.
+    """
+    classes = bundle.cat_encoders[col].classes_
+    values = np.array(values, dtype=object)
+    missing = pd.isna(values)
+    values[missing] = ""
+    known = ~missing & np.isin(values, classes)
+    codes = np.zeros(len(values))
+    codes[known] = np.searchsorted(classes, values[known])
+    return codes
+
+def build_feature_matrix(bundle: CropModelBundle, rows: list) -> np.ndarray:
+    """Build the scaled (N, n_features) model input for a list of feature dicts."""
+    numeric = np.array([[row[key] for key in FEATURE_KEYS] for row in rows], dtype=float).reshape(-1, len(FEATURE_KEYS))
+    X = bundle.scaler.transform(numeric)
+
+    # The forest is trained on the numeric columns followed by the encoded categoricals
+    if (bundle.forest or bundle.model).n_features_in_ > X.shape[1]:
+        X_cat = np.column_stack([
+            _encode_column(bundle, col, [row.get(CAT_FEATURE_KEYS.get(col, col)) for row in rows])
+            for col in bundle.cat_cols
+        ]).reshape(len(rows), len(bundle.cat_cols))
+        X = np.hstack([X, X_cat])
+
+    return X
+
+def top_k_indices(proba: np.ndarray, k: int) -> np.ndarray:
+    """Column indices of the k largest values per row, best first.
+
+    Uses argpartition so only the k selected columns are sorted, not every class.
+    Ties go to the lower column index, as in predict()'s argmax, so k=1 always
+    agrees with predict().
+    """
+    k = min(k, proba.shape[1])
+    if k < proba.shape[1]:
+        idx = np.argpartition(-proba, k - 1, axis=1)[:, :k]
+        # argpartition picks arbitrarily among values tied with the k-th largest;
+        # fully sort the (rare) rows where some of those ties were left out
+        kth = np.take_along_axis(proba, idx, axis=1).min(axis=1, keepdims=True)
+        left_out = (proba == kth).sum(axis=1) > (np.take_along_axis(proba, idx, axis=1) == kth).sum(axis=1)
+        if left_out.any():
+            idx[left_out] = np.argsort(-proba[left_out], axis=1, kind="stable")[:, :k]
+    else:
+        idx = np.tile(np.arange(proba.shape[1]), (proba.shape[0], 1))
+    order = np.lexsort((idx, -np.take_along_axis(proba, idx, axis=1)), axis=1)
+    return np.take_along_axis(idx, order, axis=1)
+
+def predict_crops_batch(rows: list, top_k: Optional[int] = None) -> list:
+    """Predict the best crop for each row in one scaler/forest/inverse-transform pass.
+
+    With top_k, a single predict_proba pass also returns the k most likely crops
+    with their probabilities. Results are returned in input order.
+    """
+    if not rows:
+        return []
+
+    bundle = get_crop_model().bundle
+    model = mean_evaluator(bundle.model, bundle.forest, len(rows))
+    with timer("crop.features"):
+        X = build_feature_matrix(bundle, rows)
+
+    if not top_k:
+        with timer("crop.forest"):
+            predictions = model.predict(X)
+        crops = bundle.label_encoder.inverse_transform(predictions)
+        return [{"recommended_crop": crop} for crop in crops]
+
+    with timer("crop.forest"):
+        proba = model.predict_proba(X)
+    idx = top_k_indices(proba, top_k)
+    top_proba = np.take_along_axis(proba, idx, axis=1)
+    labels = bundle.label_encoder.inverse_transform(model.classes_[idx].ravel()).reshape(idx.shape)
+
+    return [
+        {
+            "recommended_crop": row_labels[0],
+            "top_k": [
+                {"crop": crop, "probability": round(float(p), 4)}
+                for crop, p in zip(row_labels, row_proba)
+            ]
+        }
+        for row_labels, row_proba in zip(labels, top_proba)
+    ]
+
+def predict_crop(features: dict, top_k: Optional[int] = None):
     """Predict the best crop for given soil and climate conditions."""
-    # Order should match training dataset columns
-    input_data = np.array([
-        features["N"],
-        features["P"],
-        features["K"],
-        features["temperature"],
-        features["humidity"],
-        features["ph"],
-        features["rainfall"]
-    ]).reshape(1, -1)
-
-    input_scaled = scaler.transform(input_data)
-    prediction = model.predict(input_scaled)
-    crop = label_encoder.inverse_transform(prediction)[0]
-
-    return {"recommended_crop": crop}
+    return predict_crops_batch([features], top_k=top_k)[0]
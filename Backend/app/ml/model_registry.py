@@ -0,0 +1,325 @@
+# app/ml/model_registry.py
+import os
+import importlib
+import threading
+import time
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Generic, List, Optional, TypeVar
+
+from app.ml.artifacts import load_bundle, resolve_path
+from app.ml.forest_eval import CompiledForest, compile_forest
+
+logger = logging.getLogger(__name__)
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# How often (seconds) a bundle's file is stat'ed for changes; 0 checks on every get()
+RELOAD_CHECK_INTERVAL = float(os.getenv("MODEL_RELOAD_INTERVAL", "5"))
+
+T = TypeVar("T")
+
+# Modules the pickled bundles reference. They are imported once, before any bundle is
+# unpickled, because first imports of the same module from several threads can deadlock.
+MODEL_MODULES = ["sklearn.ensemble", "sklearn.preprocessing", "sklearn.neighbors"]
+_import_lock = threading.Lock()
+_modules_imported = False
+
+def import_model_modules() -> None:
+    global _modules_imported
+    if _modules_imported:
+        return
+    with _import_lock:
+        if not _modules_imported:
+            for module in MODEL_MODULES:
+                importlib.import_module(module)
+            _modules_imported = True
+
+# -----------------------
+# Typed bundles
+# -----------------------
+@dataclass(frozen=True)
+class CropModelBundle:
+    model: Any
+    scaler: Any
+    label_encoder: Any
+    cat_encoders: Dict[str, Any]
+    numeric_cols: List[str]
+    cat_cols: List[str]
+    forest: Optional[CompiledForest] = None
+
+    @classmethod
+    def from_dict(cls, bundle: Dict) -> "CropModelBundle":
+        return cls(
+            model=bundle["model"],
+            scaler=bundle["scaler"],
+            label_encoder=bundle["label_encoder"],
+            cat_encoders=bundle["cat_encoders"],
+            numeric_cols=bundle["numeric_cols"],
+            cat_cols=bundle["cat_cols"],
+            forest=compile_forest(bundle["model"]),
+        )
+
+@dataclass(frozen=True)
+class FertilizerModelBundle:
+    model: Any
+    scaler: Any
+    target_encoder: Any
+    cat_encoders: Dict[str, Any]
+    feature_cols: Optional[List[str]] = None
+    forest: Optional[CompiledForest] = None
+
+    @classmethod
+    def from_dict(cls, bundle: Dict) -> "FertilizerModelBundle":
+        return cls(
+            model=bundle["model"],
+            scaler=bundle["scaler"],
+            target_encoder=bundle["target_encoder"],
+            cat_encoders=bundle["cat_encoders"],
+            feature_cols=bundle.get("feature_cols"),
+            forest=compile_forest(bundle["model"]),
+        )
+
+@dataclass(frozen=True)
+class FertilizerNPKModelBundle:
+    """Multi-output regressor predicting N, P and K, plus a KD-tree over the valid N:P:K triples."""
+    model: Any
+    scaler: Any
+    cat_encoders: Dict[str, Any]
+    valid_ratios: Any
+    ratio_index: Any
+    feature_cols: Optional[List[str]] = None
+    forest: Optional[CompiledForest] = None
+
+    @classmethod
+    def from_dict(cls, bundle: Dict) -> "FertilizerNPKModelBundle":
+        from sklearn.neighbors import KDTree  # deferred: importing the registry shouldn't load sklearn
+
+        return cls(
+            model=bundle["model"],
+            scaler=bundle["scaler"],
+            cat_encoders=bundle["cat_encoders"],
+            valid_ratios=bundle["valid_ratios"],
+            ratio_index=KDTree(bundle["valid_ratios"]),
+            feature_cols=bundle.get("feature_cols"),
+            forest=compile_forest(bundle["model"]),
+        )
+
+@dataclass(frozen=True)
+class RiskModelBundle:
+    yield_model: Any
+    profit_model: Any
+    scaler: Any
+    encoders: Dict[str, Any]
+    feature_cols: List[str]
+    metadata: Dict[str, Any] = field(default_factory=dict)
+    # yield and profit trees compiled together so both are evaluated in one pass
+    forest: Optional[CompiledForest] = None
+
+    @classmethod
+    def from_dict(cls, bundle: Dict) -> "RiskModelBundle":
+        # Serving artifacts store only the combined forest; the two models are views into it
+        forest = bundle.get("forest") or CompiledForest.from_sklearn(bundle["yield_model"], bundle["profit_model"])
+        yield_model, profit_model = bundle.get("yield_model"), bundle.get("profit_model")
+        return cls(
+            yield_model=forest.group(0) if yield_model is None else yield_model,
+            profit_model=forest.group(1) if profit_model is None else profit_model,
+            scaler=bundle["scaler"],
+            encoders=bundle["encoders"],
+            feature_cols=bundle["feature_cols"],
+            metadata=bundle.get("metadata", {}),
+            forest=forest,
+        )
+
+@dataclass(frozen=True)
+class PriceModelBundle:
+    """price_model.pkl serves both the lag-feature model and the route's modal/min/max models."""
+    encoders: Dict[str, Any]
+    model: Any = None
+    feature_cols: Optional[List[str]] = None
+    modal_model: Any = None
+    min_model: Any = None
+    max_model: Any = None
+    scaler: Any = None
+    forest: Optional[CompiledForest] = None
+
+    @classmethod
+    def from_dict(cls, bundle: Dict) -> "PriceModelBundle":
+        return cls(
+            encoders=bundle.get("encoders", {}),
+            model=bundle.get("model"),
+            feature_cols=bundle.get("feature_cols", bundle.get("feature_columns")),
+            modal_model=bundle.get("modal_model"),
+            min_model=bundle.get("min_model"),
+            max_model=bundle.get("max_model"),
+            scaler=bundle.get("scaler"),
+            forest=compile_forest(bundle.get("model")),
+        )
+
+@dataclass(frozen=True)
+class ModelHandle(Generic[T]):
+    """An immutable snapshot of a loaded bundle. Grab it once per request and use it throughout."""
+    name: str
+    path: str
+    bundle: T
+    version: tuple
+    loaded_at: float
+
+# -----------------------
+# Registry
+# -----------------------
+class _Entry:
+    def __init__(self, name: str, path: str, loader: Callable[[Dict], Any], optional: bool = False):
+        self.name = name
+        self.path = path
+        self.loader = loader
+        self.optional = optional
+        self.handle: Optional[ModelHandle] = None
+        self.lock = threading.Lock()
+        self.last_check = 0.0
+        self.reloading = False
+        self.failed_version: Optional[tuple] = None
+
+def _file_version(path: str) -> tuple:
+    """Identifies the file a bundle is loaded from: its serving artifact if present, else the .pkl."""
+    path = resolve_path(path)
+    st = os.stat(path)
+    return (path, st.st_mtime_ns, st.st_size)
+
+class ModelRegistry:
+    """Loads each model bundle once per process and hot-reloads it when its file changes.
+
+    A bundle registered as crop_model.pkl is loaded from crop_model.serving.joblib
+    (memory-mapped, see app/ml/artifacts.py) when that artifact is at least as new.
+
+    Reloads happen on a background thread while the previous handle keeps serving,
+    then the new handle is swapped in with a single reference assignment.
+    """
+
+    def __init__(self, check_interval: float = RELOAD_CHECK_INTERVAL):
+        self.check_interval = check_interval
+        self._entries: Dict[str, _Entry] = {}
+        self._listeners: List[Callable[[str], None]] = []
+
+    def register(self, name: str, path: str, loader: Callable[[Dict], Any], optional: bool = False) -> None:
+        """Optional bundles are only needed by non-default configurations; a missing file is not an error."""
+        self._entries[name] = _Entry(name, path, loader, optional)
+
+    def names(self) -> List[str]:
+        return list(self._entries)
+
+    def is_optional(self, name: str) -> bool:
+        return self._entries[name].optional
+
+    def available(self, name: str) -> bool:
+        """Whether the bundle's .pkl or serving artifact exists on disk."""
+        return os.path.exists(resolve_path(self._entries[name].path))
+
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """Call callback(name) after every successful load or reload of a bundle."""
+        self._listeners.append(callback)
+
+    def _loaded(self, entry: _Entry) -> None:
+        for callback in self._listeners:
+            try:
+                callback(entry.name)
+            except Exception as e:
+                logger.error("❌ Model load listener failed for %s: %s", entry.name, e)
+
+    def get(self, name: str) -> ModelHandle:
+        entry = self._entries[name]
+        handle = entry.handle
+        if handle is None:
+            with entry.lock:
+                if entry.handle is None:
+                    entry.handle = self._load(entry)
+                    entry.last_check = time.monotonic()
+                    self._loaded(entry)
+            return entry.handle
+
+        now = time.monotonic()
+        if now - entry.last_check >= self.check_interval:
+            entry.last_check = now
+            self._maybe_reload(entry, handle)
+        return handle
+
+    def reload(self, name: str) -> ModelHandle:
+        """Synchronously reload a bundle from disk and swap it in."""
+        entry = self._entries[name]
+        with entry.lock:
+            entry.handle = self._load(entry)
+        self._loaded(entry)
+        return entry.handle
+
+    def _maybe_reload(self, entry: _Entry, handle: ModelHandle) -> None:
+        try:
+            version = _file_version(entry.path)
+        except OSError:
+            return  # file is being replaced; keep serving the current bundle
+        if version == handle.version or version == entry.failed_version or entry.reloading:
+            return
+
+        with entry.lock:
+            if entry.reloading:
+                return
+            entry.reloading = True
+        threading.Thread(target=self._background_reload, args=(entry,), daemon=True).start()
+
+    def _background_reload(self, entry: _Entry) -> None:
+        try:
+            new_handle = self._load(entry)
+            entry.handle = new_handle
+            entry.failed_version = None
+            logger.info("🔄 Reloaded %s model from %s", entry.name, entry.path)
+            self._loaded(entry)
+        except Exception as e:
+            try:
+                entry.failed_version = _file_version(entry.path)
+            except OSError:
+                entry.failed_version = None
+            logger.error("❌ Error reloading %s model: %s", entry.name, e)
+        finally:
+            entry.reloading = False
+
+    def _load(self, entry: _Entry) -> ModelHandle:
+        path = resolve_path(entry.path)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Model file not found at: {entry.path}")
+        version = _file_version(entry.path)
+        import_model_modules()
+        # Serving artifacts are memory-mapped, so worker processes share the forest arrays
+        bundle = entry.loader(load_bundle(path))
+        return ModelHandle(
+            name=entry.name,
+            path=path,
+            bundle=bundle,
+            version=version,
+            loaded_at=time.time(),
+        )
+
+registry = ModelRegistry()
+registry.register("crop", os.path.join(MODEL_DIR, "crop_model.pkl"), CropModelBundle.from_dict)
+registry.register("fertilizer", os.path.join(MODEL_DIR, "fertilizer_model.pkl"), FertilizerModelBundle.from_dict)
+# Only required when the regression variant is the configured default (see app/ml/fertilizer_model.py)
+registry.register("fertilizer_npk", os.path.join(MODEL_DIR, "fertilizer_npk_model.pkl"), FertilizerNPKModelBundle.from_dict,
+                  optional=os.getenv("FERTILIZER_MODEL_VARIANT", "classifier") != "regression")
+registry.register("risk", os.path.join(MODEL_DIR, "risk_assessment_model.pkl"), RiskModelBundle.from_dict)
+registry.register("price", os.path.join(MODEL_DIR, "price_model.pkl"), PriceModelBundle.from_dict)
+
+# -----------------------
+# Typed accessors
+# -----------------------
+def get_crop_model() -> ModelHandle[CropModelBundle]:
+    return registry.get("crop")
+
+def get_fertilizer_model() -> ModelHandle[FertilizerModelBundle]:
+    return registry.get("fertilizer")
+
+def get_fertilizer_npk_model() -> ModelHandle[FertilizerNPKModelBundle]:
+    return registry.get("fertilizer_npk")
+
+def get_risk_model() -> ModelHandle[RiskModelBundle]:
+    return registry.get("risk")
+
+def get_price_model() -> ModelHandle[PriceModelBundle]:
+    return registry.get("price")
@@ -1,12 +1,14 @@
 # train_crop_recommendation.py
 import os
-import joblib
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
-from sklearn.preprocessing import StandardScaler, LabelEncoder
+from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import accuracy_score, classification_report
+from app.ml.feature_store import TrainingFeatures, load_features
+from app.ml.artifacts import save_bundle
+from app.ml.tuning import tuned_params
 
 # Get absolute paths
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -14,41 +16,29 @@ DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(current
 MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
 OUT_PATH = os.path.join(MODEL_DIR, "crop_model.pkl")
 
-def load_and_prepare(df: pd.DataFrame):
-    df = df.rename(columns=lambda c: c.strip())
-
+def load_and_prepare(features: TrainingFeatures):
     # Required features
     numeric_cols = ["N", "P", "K", "Temperature", "Humidity", "pH", "Rainfall"]
     cat_cols = ["Soil Type", "Type"]
 
     # Drop missing crop names
-    df = df.dropna(subset=["Crop Name"])
-
-    # Fill NaN values
-    df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].median())
-    for c in cat_cols:
-        if c in df.columns:
-            df[c] = df[c].fillna("Unknown").astype(str)
-        else:
-            df[c] = "Unknown"
+    rows = features.present("Crop Name")
 
-    # Encode categorical columns
+    # Imputed numeric columns and categorical encoders come from the shared feature store
     cat_encoders = {}
     X_cat_list = []
     for c in cat_cols:
-        le = LabelEncoder()
-        Xc = le.fit_transform(df[c].astype(str))
+        le, Xc = features.encoder(c, rows)
         cat_encoders[c] = le
         X_cat_list.append(Xc.reshape(-1, 1))
 
     # Combine all features
-    X_num = df[numeric_cols].values
+    X_num = features.numeric(numeric_cols, rows)
     X_cat = np.hstack(X_cat_list)
     X = np.hstack([X_num, X_cat])
 
     # Encode target
-    y_le = LabelEncoder()
-    y = y_le.fit_transform(df["Crop Name"].astype(str))
+    y_le, y = features.encoder("Crop Name", rows)
 
     return X, y, y_le, cat_encoders, numeric_cols, cat_cols
 
@@ -67,15 +57,15 @@ def validate_input_ranges(df, numeric_cols):
         elif min_val < 0:
             print(f"⚠️ Warning: Negative values found in {col}")
 
-def train():
+def train(n_jobs: int = -1):
     print("🔹 Loading dataset...")
-    df = pd.read_csv(DATA_PATH)
+    features = load_features(DATA_PATH)
     
     # Validate input ranges before processing
     numeric_cols = ["N", "P", "K", "Temperature", "Humidity", "pH", "Rainfall"]
-    validate_input_ranges(df, numeric_cols)
+    validate_input_ranges(features.frame(), numeric_cols)
     
-    X, y, label_encoder, cat_encoders, numeric_cols, cat_cols = load_and_prepare(df)
+    X, y, label_encoder, cat_encoders, numeric_cols, cat_cols = load_and_prepare(features)
 
     # Scale numeric features
     scaler = StandardScaler()
@@ -86,7 +76,7 @@ def train():
     )
 
     # Train model
-    model = RandomForestClassifier(n_estimators=250, random_state=42, n_jobs=-1)
+    model = RandomForestClassifier(**{"n_estimators": 250, **tuned_params(OUT_PATH)}, random_state=42, n_jobs=n_jobs)
     model.fit(X_train, y_train)
 
     # Evaluate
@@ -106,7 +96,7 @@ def train():
     }
 
     os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
-    joblib.dump(bundle, OUT_PATH)
+    save_bundle(bundle, OUT_PATH)
     print(f"💾 Model saved to: {OUT_PATH}")
     
     # Print feature importance
@@ -3,6 +3,7 @@ import requests
 import pandas as pd
 import os
 from datetime import datetime
+from app.ml.market_store import load_market_prices
 
 def fetch_agmarknet(api_url, params=None):
     """
@@ -17,8 +18,8 @@ def fetch_agmarknet(api_url, params=None):
     df = pd.json_normalize(data)  # adapt
     return df
 
-def load_kaggle_dataset(path):
-    return pd.read_csv(path)
+def load_kaggle_dataset(path, **predicates):
+    return load_market_prices(path, **predicates)
 
 def unify_and_save(raw_df, kaggle_df, out_path):
     """
@@ -0,0 +1,161 @@
+# app/ml/price_history.py
+import os
+import threading
+import logging
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from app.ml.market_store import DEFAULT_CSV_PATH, MarketPriceStore, normalize_frame, open_store
+
+logger = logging.getLogger(__name__)
+
+# Store the index is loaded from; defaults to the one built next to data/market_prices.csv
+MARKET_STORE_DIR = os.getenv("MARKET_STORE_DIR")
+
+# Variety used for the per-(market, commodity) series that spans all varieties
+ANY_VARIETY = "*"
+
+HistoryKey = Tuple[str, str, str]
+
+def normalize_key(market, commodity, variety=None) -> HistoryKey:
+    def norm(value) -> str:
+        return " ".join(str(value or "").strip().lower().split())
+    return (norm(market), norm(commodity), norm(variety) if variety is not None else ANY_VARIETY)
+
+def _to_day(value) -> np.datetime64:
+    return np.datetime64(pd.Timestamp(value).date(), "D")
+
+class PriceHistoryIndex:
+    """In-memory modal price history per (market, commodity, variety).
+
+    Each key maps to a date-sorted datetime64[D] array and a matching modal price
+    array, so "the last k prices before date D" is one np.searchsorted plus a
+    slice. Every record is also indexed under (market, commodity, "*"), which is
+    the series the price model's lag features were trained on.
+
+    Updates merge new records into the affected keys only; a later record for the
+    same key and date replaces the earlier one. Readers never see a half-updated
+    series because each key's arrays are swapped in as one tuple.
+    """
+
+    def __init__(self):
+        self._series: Dict[HistoryKey, Tuple[np.ndarray, np.ndarray]] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._series)
+
+    # -----------------------
+    # Building / updating
+    # -----------------------
+    @classmethod
+    def from_store(cls, store: MarketPriceStore) -> "PriceHistoryIndex":
+        index = cls()
+        if store.exists:
+            data = store.scan(columns=["market", "commodity", "variety", "arrival_date", "modal_price"])
+            vocab = {c: store.dictionary(c) for c in ("market", "commodity", "variety")}
+            index._add_arrays(
+                [vocab["market"][i] for i in data["market"]],
+                [vocab["commodity"][i] for i in data["commodity"]],
+                [vocab["variety"][i] for i in data["variety"]],
+                data["arrival_date"],
+                data["modal_price"],
+            )
+        return index
+
+    def add_records(self, records: Union[pd.DataFrame, Iterable[Dict]]) -> int:
+        """Merge new market records (CSV rows or Agmarknet records) into the index."""
+        df = records if isinstance(records, pd.DataFrame) else pd.DataFrame(list(records))
+        if df.empty:
+            return 0
+        df = normalize_frame(df)
+        df = df[df["arrival_date"].notna()]
+        self._add_arrays(
+            df["market"].tolist(),
+            df["commodity"].tolist(),
+            df["variety"].tolist(),
+            df["arrival_date"].to_numpy().astype("datetime64[D]"),
+            df["modal_price"].to_numpy(dtype=np.float32),
+        )
+        return len(df)
+
+    def _add_arrays(self, markets: List[str], commodities: List[str], varieties: List[str],
+                    dates: np.ndarray, prices: np.ndarray) -> None:
+        keys = [normalize_key(m, c, v) for m, c, v in zip(markets, commodities, varieties)]
+        any_keys = [(m, c, ANY_VARIETY) for m, c, _ in keys]
+
+        with self._lock:
+            for key_list in (keys, any_keys):
+                codes, uniques = pd.factorize(pd.Series(key_list, dtype=object))
+                order = np.argsort(codes, kind="stable")
+                bounds = np.flatnonzero(np.diff(codes[order])) + 1
+                for rows in np.split(order, bounds):
+                    if len(rows):
+                        self._merge(uniques[codes[rows[0]]], dates[rows], prices[rows])
+
+    def _merge(self, key: HistoryKey, dates: np.ndarray, prices: np.ndarray) -> None:
+        old = self._series.get(key)
+        if old is not None:
+            dates = np.concatenate([old[0], dates])
+            prices = np.concatenate([old[1], prices])
+        order = np.argsort(dates, kind="stable")
+        dates, prices = dates[order], prices[order]
+        # keep the last record for each date
+        last = np.append(dates[1:] != dates[:-1], True)
+        self._series[key] = (dates[last], prices[last].astype(np.float32))
+
+    # -----------------------
+    # Lookups
+    # -----------------------
+    def series(self, market, commodity, variety=None) -> Tuple[np.ndarray, np.ndarray]:
+        """(dates, modal prices) for the key; variety=None is the all-varieties series."""
+        empty = (np.empty(0, dtype="datetime64[D]"), np.empty(0, dtype=np.float32))
+        return self._series.get(normalize_key(market, commodity, variety), empty)
+
+    def last_k(self, market, commodity, variety=None, as_of=None, k: int = 7) -> np.ndarray:
+        """Up to k modal prices strictly before as_of (all history if None), most recent first."""
+        dates, prices = self.series(market, commodity, variety)
+        end = len(dates) if as_of is None else int(np.searchsorted(dates, _to_day(as_of), side="left"))
+        return prices[max(0, end - k):end][::-1]
+
+    def recent(self, market, commodity, variety=None, as_of=None, k: int = 7) -> np.ndarray:
+        """last_k() of the variety series when it has history before as_of, else of the
+        market's all-varieties series."""
+        recent = self.last_k(market, commodity, variety, as_of, k) if variety else np.empty(0)
+        if not len(recent):
+            recent = self.last_k(market, commodity, None, as_of, k)
+        return recent
+
+    def lags(self, market, commodity, variety=None, as_of=None,
+             lags: Iterable[int] = (1, 2, 3, 7)) -> Optional[Dict[int, float]]:
+        """Lag features {lag: price} from recent(); None when there is no history."""
+        lags = list(lags)
+        recent = self.recent(market, commodity, variety, as_of, max(lags))
+        if not len(recent):
+            return None
+        return {lag: float(recent[lag - 1]) if lag <= len(recent) else 0.0 for lag in lags}
+
+_index: Optional[PriceHistoryIndex] = None
+_index_lock = threading.Lock()
+
+def get_price_history() -> PriceHistoryIndex:
+    """The process-wide index, loaded from the market price store on first use."""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                try:
+                    _index = PriceHistoryIndex.from_store(open_store(DEFAULT_CSV_PATH, root=MARKET_STORE_DIR))
+                    logger.info("📈 Price history index loaded with %d series", len(_index))
+                except Exception as e:
+                    logger.error("❌ Error loading price history: %s", e)
+                    _index = PriceHistoryIndex()
+    return _index
+
+def add_price_records(records: Union[pd.DataFrame, Iterable[Dict]]) -> int:
+    """Feed newly ingested records to the index if this process has loaded it."""
+    if _index is None:
+        return 0
+    return _index.add_records(records)
@@ -1,20 +1,40 @@
 # app/ml/price_model_inference.py
-import os, joblib, numpy as np
+import numpy as np
 from datetime import datetime
 
-BASE = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(BASE, "price_model.pkl")
+from app.core.metrics import timer
+from app.ml.model_registry import get_price_model
+from app.ml.price_history import get_price_history
+from app.ml.price_preprocessing import LAG_FEATURE_COLS, WINDOW, window_features
 
-bundle = joblib.load(MODEL_PATH)
-model = bundle["model"]
-encoders = bundle.get("encoders", {})
-feature_cols = bundle["feature_cols"]
+def recent_prices(input_payload, df_recent=None):
+    """Modal prices before the payload date, most recent first (at most WINDOW), from df_recent
+    or the price history index. None when no history is available."""
+    if df_recent is not None:
+        recent = df_recent['modal_price'].to_numpy(dtype=float)[::-1][:WINDOW]
+    else:
+        recent = get_price_history().recent(
+            input_payload.get("market"), input_payload.get("crop"), input_payload.get("variety"),
+            as_of=input_payload.get("date"), k=WINDOW
+        )
+    return recent if len(recent) else None
+
+def lag_features(recent):
+    """Lag and rolling features computed exactly as price_preprocessing does for training."""
+    prev = np.full((1, WINDOW), np.nan)
+    if recent is not None:
+        prev[0, :len(recent)] = recent
+    return dict(zip(LAG_FEATURE_COLS, window_features(prev)[0]))
 
-def make_features(input_payload, df_recent=None):
+def make_features(input_payload, df_recent=None, recent=None):
     """
     input_payload: dict {state, district, market, crop, variety, date, arrivals(optional)}
     df_recent: optional dataframe to extract lag features for that market+crop
+    recent: optional modal prices from recent_prices(); looked up when not given
     """
+    bundle = get_price_model().bundle
+    encoders, feature_cols = bundle.encoders, bundle.feature_cols
+
     # prepare features in same order as feature_cols
     arrival_date = datetime.fromisoformat(input_payload.get("date"))
     feat = {}
@@ -36,38 +56,35 @@ def make_features(input_payload, df_recent=None):
         else:
             feat[f"{key}_enc"] = -1
 
-    # lags: if df_recent provided, compute last modal prices
-    if df_recent is not None:
-        for lag in [1,2,3,7]:
-            col = f"modal_lag_{lag}"
-            try:
-                feat[col] = float(df_recent.iloc[-lag]['modal_price'])
-            except Exception:
-                feat[col] = 0.0
-    else:
-        for lag in [1,2,3,7]:
-            feat[f"modal_lag_{lag}"] = 0.0
+    # lags and rolling stats: last modal prices before the date, from df_recent or the price history index
+    if recent is None:
+        recent = recent_prices(input_payload, df_recent)
+    feat.update(lag_features(recent))
 
     # Build array following feature_cols order
     arr = [float(feat.get(c,0.0)) for c in feature_cols]
     return np.array(arr).reshape(1, -1)
 
 def predict_price(payload, df_recent=None):
-    X = make_features(payload, df_recent)
-    pred = model.predict(X)[0]
+    bundle = get_price_model().bundle
+    with timer("price.history"):
+        recent = recent_prices(payload, df_recent)
+    with timer("price.features"):
+        X = make_features(payload, recent=recent)
     # For confidence, approximate by normalized variance across trees
-    try:
-        preds_all = np.stack([t.predict(X) for t in model.estimators_]).flatten()
-        std = float(np.std(preds_all))
+    if bundle.forest is not None:
+        with timer("price.forest"):
+            per_tree = bundle.forest.predict_per_tree(X)[:, 0]
+        pred = float(per_tree.mean())
+        std = float(np.std(per_tree))
         # heuristic confidence
         confidence = max(0.0, 1 - std / (abs(pred) + 1e-6))
-    except Exception:
+    else:
+        pred = bundle.model.predict(X)[0]
         confidence = 0.6
 
     # trend: compare to recent modal (if available)
-    recent_modal = None
-    if df_recent is not None and not df_recent.empty:
-        recent_modal = float(df_recent.iloc[-1]['modal_price'])
+    recent_modal = float(recent[0]) if recent is not None else None
     trend = "Stable"
     if recent_modal:
         if pred > recent_modal * 1.02: trend = "Increasing"
@@ -1,12 +1,14 @@
 # train_price_model.py
 import os
-import joblib
 import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestRegressor
-from sklearn.preprocessing import LabelEncoder, StandardScaler
+from sklearn.preprocessing import StandardScaler
 from sklearn.model_selection import train_test_split
 from sklearn.metrics import r2_score, mean_absolute_error
+from app.ml.feature_store import TrainingFeatures, load_features
+from app.ml.artifacts import save_bundle
+from app.ml.tuning import tuned_params
 
 # Get absolute paths
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -15,41 +17,34 @@ MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
 OUT_PATH = os.path.join(MODEL_DIR, "price_model.pkl")
 TARGET_COL = "Market_Price_per_kg"
 
-def prepare_price_data(df: pd.DataFrame):
-    df = df.rename(columns=lambda c: c.strip())
-
-    if TARGET_COL not in df.columns:
+def prepare_price_data(features: TrainingFeatures):
+    if TARGET_COL not in features.numeric_cols:
         raise KeyError(f"{TARGET_COL} not found in dataset.")
 
     numeric_cols = ["N", "P", "K", "Temperature", "Humidity", "pH", "Rainfall"]
     cat_cols = ["Crop Name", "Region", "Type", "Soil Type"]
 
     # Drop rows with missing target
-    df = df.dropna(subset=[TARGET_COL])
-
-    # Fill missing values
-    df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].median())
-    for c in cat_cols:
-        df[c] = df[c].fillna("Unknown").astype(str)
+    rows = features.present(TARGET_COL)
 
-    # Encode categoricals
+    # Encode categoricals (imputation and vocabularies come from the shared feature store)
     encoders = {}
+    X_cat_list = []
     for c in cat_cols:
-        le = LabelEncoder()
-        df[c + "_enc"] = le.fit_transform(df[c])
+        le, Xc = features.encoder(c, rows)
         encoders[c] = le
+        X_cat_list.append(Xc.reshape(-1, 1))
 
     # Combine features
     feature_columns = numeric_cols + [c + "_enc" for c in cat_cols]
-    X = df[feature_columns].values
-    y = df[TARGET_COL].astype(float).values
+    X = np.hstack([features.numeric(numeric_cols, rows)] + X_cat_list)
+    y = features.numeric([TARGET_COL], rows)[:, 0]
 
     return X, y, encoders, feature_columns, numeric_cols
 
-def train():
+def train(n_jobs: int = -1):
     print("🔹 Loading dataset...")
-    df = pd.read_csv(DATA_PATH)
-    X, y, encoders, feature_columns, numeric_cols = prepare_price_data(df)
+    X, y, encoders, feature_columns, numeric_cols = prepare_price_data(load_features(DATA_PATH))
 
     # Scale numeric portion
     scaler = StandardScaler()
@@ -58,7 +53,7 @@ def train():
     X_train, X_test, y_train, y_test = train_test_split(X, y, test_size=0.2, random_state=42)
 
     # Train model
-    model = RandomForestRegressor(n_estimators=250, random_state=42, n_jobs=-1)
+    model = RandomForestRegressor(**{"n_estimators": 250, **tuned_params(OUT_PATH)}, random_state=42, n_jobs=n_jobs)
     model.fit(X_train, y_train)
 
     # Evaluate
@@ -76,7 +71,7 @@ def train():
     }
 
     os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
-    joblib.dump(bundle, OUT_PATH)
+    save_bundle(bundle, OUT_PATH)
     print(f"💾 Model saved to: {OUT_PATH}")
 
     # Additional validation of model performance
@@ -1,23 +1,168 @@
 # app/ml/price_preprocessing.py
+import copy
+import os
+import joblib
 import pandas as pd
 import numpy as np
 from sklearn.preprocessing import LabelEncoder
 from dateutil import parser
+from app.ml.market_store import load_market_prices
 
-def load_data(path):
-    df = pd.read_csv(path, parse_dates=['arrival_date'])
+LAGS = [1, 2, 3, 7]
+# Rolling statistics are taken over the previous WINDOW modal prices of the market+crop
+WINDOW = 7
+GROUP_COLS = ['market', 'crop']
+CAT_COLS = ['state', 'district', 'market', 'crop', 'variety']
+LAG_FEATURE_COLS = [f'modal_lag_{lag}' for lag in LAGS] + [f'modal_roll_mean_{WINDOW}', f'modal_roll_std_{WINDOW}']
+
+# Columns identifying one market record; a record already in the cache is not added again
+RECORD_KEY_COLS = ['state', 'district', 'market', 'crop', 'variety', 'grade', 'arrival_date']
+
+MODEL_DIR = os.path.dirname(os.path.abspath(__file__))
+FEATURE_CACHE_DIR = os.path.join(MODEL_DIR, "price_features.cache")
+
+def load_data(path, **predicates):
+    # Served from the memory-mapped columnar store next to the CSV (built on first use)
+    df = load_market_prices(path, **predicates)
     return df
 
-def preprocess(df):
+def window_features(prev: np.ndarray) -> np.ndarray:
+    """Lag and rolling features from prev, shape (rows, WINDOW): column j is the modal price
+    j+1 records back within the group, NaN where the group has no such record."""
+    lags = prev[:, [lag - 1 for lag in LAGS]]
+    count = np.sum(~np.isnan(prev), axis=1)
+    filled = np.where(np.isnan(prev), 0.0, prev)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = filled.sum(axis=1) / count
+        var = np.where(np.isnan(prev), 0.0, (prev - mean[:, None]) ** 2).sum(axis=1) / count
+    out = np.column_stack([lags, mean, np.sqrt(var)])
+    # No earlier record in the group: the feature is 0, never a neighbouring group's value
+    return np.nan_to_num(out, nan=0.0)
+
+class LagFeatureBuilder:
+    """Per market+crop lag and rolling modal price features, computed incrementally.
+
+    The builder keeps the last WINDOW modal prices (and the latest arrival date) of
+    every group, so features for newly arrived rows cost O(new rows) and never touch
+    the stored history. fit() on the full history and fit() on a prefix followed by
+    update() on the rest produce identical features, provided new rows are not older
+    than what the builder has already seen for their group; groups that got older
+    rows are refit from their full history with refit().
+    """
+
+    def __init__(self):
+        self.history = {}  # (market, crop) -> (last WINDOW prices, oldest first; last arrival date)
+
+    def fit(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Features for a full history frame (vectorized), resetting the per-group state."""
+        df, keys, starts, stops = _sorted_groups(df)
+        prices = df['modal_price'].to_numpy(dtype=float)
+        dates = df['arrival_date'].to_numpy()
+
+        # prev[i, j-1] is the price j rows back, if that row is still in row i's group
+        row = np.arange(len(df))
+        group_start = np.repeat(starts, stops - starts)
+        prev = np.full((len(df), WINDOW), np.nan)
+        for j in range(1, WINDOW + 1):
+            back = row - j
+            valid = back >= group_start
+            prev[valid, j - 1] = prices[back[valid]]
+
+        self.history = {
+            key: (prices[max(start, stop - WINDOW):stop], dates[stop - 1])
+            for key, start, stop in zip(keys, starts, stops)
+        }
+        return pd.DataFrame(window_features(prev), index=df.index, columns=LAG_FEATURE_COLS)
+
+    def update(self, new_rows: pd.DataFrame) -> pd.DataFrame:
+        """Features for newly arrived rows, advancing the per-group state."""
+        new_rows, keys, starts, stops = _sorted_groups(new_rows)
+        prices = new_rows['modal_price'].to_numpy(dtype=float)
+        dates = new_rows['arrival_date'].to_numpy()
+        prev = np.full((len(new_rows), WINDOW), np.nan)
+
+        for key, start, stop in zip(keys, starts, stops):
+            past, last_date = self.history.get(key, (np.empty(0), None))
+            if last_date is not None and dates[start] < last_date:
+                raise ValueError(f"Rows for {key} arrived out of order; rebuild the features with fit()")
+
+            series = np.concatenate([np.full(WINDOW, np.nan), past, prices[start:stop]])
+            offset = WINDOW + len(past)
+            for j in range(1, WINDOW + 1):
+                prev[start:stop, j - 1] = series[offset - j:offset - j + stop - start]
+            self.history[key] = (series[-WINDOW:][~np.isnan(series[-WINDOW:])], dates[stop - 1])
+        return pd.DataFrame(window_features(prev), index=new_rows.index, columns=LAG_FEATURE_COLS)
+
+    def late_groups(self, new_rows: pd.DataFrame) -> set:
+        """Groups with a new row older than the latest date already seen for that group."""
+        if new_rows.empty:
+            return set()
+        first = new_rows.groupby(GROUP_COLS, sort=False)['arrival_date'].min()
+        return {
+            key for key, date in first.items()
+            if key in self.history and date < self.history[key][1]
+        }
+
+    def refit(self, rows: pd.DataFrame) -> pd.DataFrame:
+        """Features for the full history of some groups, replacing those groups' state."""
+        builder = LagFeatureBuilder()
+        features = builder.fit(rows)
+        self.history.update(builder.history)
+        return features
+
+    def __getstate__(self):
+        # Pickle as a few flat arrays rather than one small array per group
+        keys = list(self.history)
+        values = [self.history[k] for k in keys]
+        return {
+            "keys": keys,
+            "counts": np.array([len(p) for p, _ in values], dtype=np.int64),
+            "prices": np.concatenate([p for p, _ in values]) if values else np.empty(0),
+            "last_dates": np.array([d for _, d in values], dtype="datetime64[ns]"),
+        }
+
+    def __setstate__(self, state):
+        prices = np.split(state["prices"], np.cumsum(state["counts"])[:-1]) if state["keys"] else []
+        self.history = dict(zip(state["keys"], zip(prices, state["last_dates"])))
+
+def _sorted_groups(df: pd.DataFrame):
+    """df sorted (stably) by market, crop and date, with each group's key and row range."""
+    df = df.sort_values(GROUP_COLS + ['arrival_date'], kind='mergesort')
+    market = df['market'].to_numpy(dtype=object)
+    crop = df['crop'].to_numpy(dtype=object)
+    changed = np.flatnonzero((market[1:] != market[:-1]) | (crop[1:] != crop[:-1])) + 1
+    starts = np.concatenate([[0], changed]) if len(df) else np.empty(0, dtype=int)
+    stops = np.append(starts[1:], len(df)).astype(int)
+    keys = list(zip(market[starts], crop[starts]))
+    return df, keys, starts, stops
+
+def _standardize(df: pd.DataFrame) -> pd.DataFrame:
     # Standardize column names
     df = df.rename(columns={
         'commodity':'crop', 'modal_price':'modal_price',
         # adapt as needed
     })
+    for col in CAT_COLS:
+        if col in df.columns:
+            df[col] = df[col].astype(str)
+    df['arrival_date'] = pd.to_datetime(df['arrival_date'])
     # Fill missing values
     df['arrivals'] = df['arrivals'].fillna(0)
     df['min_price'] = df['min_price'].fillna(df['modal_price'] * 0.9)
     df['max_price'] = df['max_price'].fillna(df['modal_price'] * 1.1)
+    return df
+
+def preprocess(df, lag_features=None, standardized=False, encoders=None):
+    """Feature matrix, target, processed frame, label encoders and feature columns.
+
+    lag_features, if given, are indexed by row position in df (as LagFeatureBuilder.fit()
+    returns them for a frame with a default index). encoders, if given, are used
+    instead of fitting new ones and must already know every category in df.
+    """
+    df = df.copy() if standardized else _standardize(df)
+    # Rows are matched to their lag features by position, so a repeated index (e.g. after pd.concat) is fine
+    index = df.index
+    df = df.reset_index(drop=True)
 
     # Date features
     df['year'] = df['arrival_date'].dt.year
@@ -26,20 +171,20 @@ def preprocess(df):
     df['dayofweek'] = df['arrival_date'].dt.dayofweek
 
     # Label encoding for categorical features
-    encoders = {}
-    for col in ['state', 'district', 'market', 'crop', 'variety']:
+    encoders = dict(encoders or {})
+    for col in CAT_COLS:
         if col in df.columns:
-            le = LabelEncoder()
-            df[col+'_enc'] = le.fit_transform(df[col].astype(str))
+            le = encoders.get(col) or LabelEncoder().fit(df[col].astype(str))
+            df[col+'_enc'] = le.transform(df[col].astype(str))
             encoders[col] = le
 
-    # Lag features: modal_price lag 1..3 by market+crop
-    df = df.sort_values(['market','crop','arrival_date'])
-    for lag in [1,2,3,7]:
-        df[f'modal_lag_{lag}'] = df.groupby(['market','crop'])['modal_price'].shift(lag)
-    # Fill lag missing with mode or forward fill
-    df.fillna(method='ffill', inplace=True)
+    # Lag and rolling features: previous modal prices by market+crop, 0 where a group has no history
+    if lag_features is None:
+        lag_features = LagFeatureBuilder().fit(df)
+    df = df.sort_values(GROUP_COLS + ['arrival_date'], kind='mergesort')
+    df[LAG_FEATURE_COLS] = lag_features.loc[df.index, LAG_FEATURE_COLS].to_numpy()
     df.fillna(0, inplace=True)
+    df.index = index[df.index.to_numpy()]
 
     # Feature matrix
     feature_cols = []
@@ -52,11 +197,105 @@ def preprocess(df):
     # encoded categorical
     for c in ['state_enc','district_enc','market_enc','crop_enc','variety_enc']:
         if c in df.columns: feature_cols.append(c)
-    # lags
-    for lag in [1,2,3,7]:
-        feature_cols.append(f'modal_lag_{lag}')
+    # lags and rolling statistics
+    feature_cols.extend(LAG_FEATURE_COLS)
 
     X = df[feature_cols].astype(float).values
     y = df['modal_price'].astype(float).values
 
     return X, y, df, encoders, feature_cols
+
+def _record_hashes(df: pd.DataFrame) -> np.ndarray:
+    """64-bit hash of each row's RECORD_KEY_COLS, used to recognise records already cached."""
+    cols = [c for c in RECORD_KEY_COLS if c in df.columns]
+    return pd.util.hash_pandas_object(df[cols], index=False).to_numpy()
+
+def _extend_encoders(encoders, df):
+    """Copies of encoders that also know df's new categories, appended so existing codes don't change."""
+    extended = {}
+    for col, le in encoders.items():
+        values = df[col].astype(str).unique() if col in df.columns else []
+        new = sorted(set(values) - set(le.classes_))
+        if new:
+            le = copy.copy(le)
+            # Object dtype: LabelEncoder maps object classes through a dict, so they needn't stay sorted
+            le.classes_ = np.concatenate([le.classes_.astype(object), np.array(new, dtype=object)])
+        extended[col] = le
+    return extended
+
+def _chunk_path(cache_dir, i, kind):
+    return os.path.join(cache_dir, f"chunk-{i:05d}.{kind}")
+
+def _cached_group_rows(cache_dir, chunks, groups) -> pd.DataFrame:
+    """Cached rows of some market+crop groups, indexed by record id."""
+    rows = []
+    for i in range(chunks):
+        chunk = joblib.load(_chunk_path(cache_dir, i, "pkl"))["rows"]
+        rows.append(chunk[pd.MultiIndex.from_frame(chunk[GROUP_COLS]).isin(list(groups))])
+    return pd.concat(rows)
+
+def _save_chunk(cache_dir, state, rows, lag_features) -> None:
+    """Write this run's rows, their key hashes and features as a new chunk, then the state that commits it."""
+    os.makedirs(cache_dir, exist_ok=True)
+    i = state["chunks"]
+    joblib.dump({"rows": rows, "lag_features": lag_features}, _chunk_path(cache_dir, i, "pkl"))
+    np.save(_chunk_path(cache_dir, i, "keys.npy"), _record_hashes(rows))
+    state_path = os.path.join(cache_dir, "state.pkl")
+    joblib.dump(dict(state, chunks=i + 1), state_path + ".tmp")
+    os.replace(state_path + ".tmp", state_path)
+
+def preprocess_incremental(new_df, cache_dir=FEATURE_CACHE_DIR):
+    """preprocess() for newly arrived records, without reprocessing the cached history.
+
+    The cache holds the per-group lag window (LagFeatureBuilder), the label encoders
+    and, per run, one chunk with that run's records, their features and hashed record
+    keys. A run reads only the small state and the key hashes, computes lag features
+    for its new rows with update() and appends one chunk, so its cost doesn't grow
+    with the history. Records already seen (by RECORD_KEY_COLS; the first occurrence
+    wins) are dropped, so re-running a day is a no-op. Groups receiving rows older
+    than their latest date are the exception: their cached rows are read back and
+    refit, since the late rows shift the lags of every later row in the group.
+
+    Returns preprocess()'s (X, y, df, encoders, feature_cols) for the rows whose
+    features this run added or changed (new rows plus the rows of refit groups),
+    indexed by record id. Upserting every run's rows by record id reproduces
+    preprocess() on the whole history, except that categories first seen after the
+    first run get codes appended after the existing ones instead of sorted ones.
+    """
+    new_df = _standardize(new_df)
+    new_df = new_df[~pd.Index(_record_hashes(new_df)).duplicated()]
+    state_path = os.path.join(cache_dir, "state.pkl")
+
+    if not os.path.exists(state_path):
+        builder, new_rows = LagFeatureBuilder(), new_df.reset_index(drop=True)
+        features = builder.fit(new_rows)
+        X, y, df, encoders, feature_cols = preprocess(new_rows, lag_features=features, standardized=True)
+        _save_chunk(cache_dir, {"builder": builder, "encoders": encoders, "records": len(new_rows), "chunks": 0},
+                    new_rows, features)
+        return X, y, df, encoders, feature_cols
+
+    state = joblib.load(state_path)
+    builder = state["builder"]
+    seen = np.concatenate([np.load(_chunk_path(cache_dir, i, "keys.npy")) for i in range(state["chunks"])])
+    new_rows = new_df[~np.isin(_record_hashes(new_df), seen)].reset_index(drop=True)
+    new_rows.index = new_rows.index + state["records"]
+
+    late = builder.late_groups(new_rows)
+    new_in_late = pd.MultiIndex.from_frame(new_rows[GROUP_COLS]).isin(list(late))
+    out_rows = new_rows
+    features = builder.update(new_rows[~new_in_late])
+    if late:
+        group_rows = pd.concat([_cached_group_rows(cache_dir, state["chunks"], late), new_rows[new_in_late]])
+        features = pd.concat([features, builder.refit(group_rows)])
+        out_rows = pd.concat([new_rows[~new_in_late], group_rows])
+
+    encoders = _extend_encoders(state["encoders"], new_rows)
+    if len(new_rows):
+        _save_chunk(cache_dir, dict(state, builder=builder, encoders=encoders,
+                                    records=state["records"] + len(new_rows)), new_rows, features)
+
+    X, y, df, encoders, feature_cols = preprocess(
+        out_rows.reset_index(drop=True), lag_features=features.loc[out_rows.index].reset_index(drop=True),
+        standardized=True, encoders=encoders)
+    df.index = out_rows.index[df.index.to_numpy()]
+    return X, y, df, encoders, feature_cols
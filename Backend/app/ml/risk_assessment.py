@@ -1,22 +1,10 @@
 import numpy as np
-import joblib
-import os
 from typing import Dict, Any
 
-# Load the trained model
-current_dir = os.path.dirname(os.path.abspath(__file__))
-MODEL_PATH = os.path.join(current_dir, "risk_assessment_model.pkl")
-
-try:
-    model_bundle = joblib.load(MODEL_PATH)
-    yield_model = model_bundle["yield_model"]
-    profit_model = model_bundle["profit_model"]
-    scaler = model_bundle["scaler"]
-    encoders = model_bundle["encoders"]
-    feature_cols = model_bundle["feature_cols"]
-except Exception as e:
-    print(f"❌ Error loading risk assessment model: {str(e)}")
-    raise
+from app.core.metrics import timer
+from app.ml.model_registry import get_risk_model
+from app.ml.risk_utils import calculate_risk_score
+from app.ml import feature_engineering as fe
 
 def calculate_climate_risk(temperature: float, humidity: float, rainfall: float) -> float:
     """Calculate climate risk score"""
@@ -26,9 +14,23 @@ def calculate_climate_risk(temperature: float, humidity: float, rainfall: float)
     
     return (temp_risk + humidity_risk + rainfall_risk) / 3
 
+# Central interval reported for yield and profit, from the spread of per-tree predictions
+INTERVAL_LEVEL = 90.0
+
+def summarize_tree_spread(tree_preds: np.ndarray) -> Dict[str, float]:
+    """Mean, relative uncertainty and central interval of per-tree predictions for one sample."""
+    mean = float(tree_preds.mean())
+    uncertainty = min(1.0, float(tree_preds.std()) / (abs(mean) + 1e-6))
+    tail = (100 - INTERVAL_LEVEL) / 2
+    lower, upper = np.percentile(tree_preds, [tail, 100 - tail])
+    return {"mean": mean, "uncertainty": uncertainty, "lower": float(lower), "upper": float(upper)}
+
 def assess_risk(data: Dict[str, Any]) -> Dict[str, Any]:
     """Predict yield, profit, and assess risk for given conditions"""
     try:
+        bundle = get_risk_model().bundle
+        scaler, encoders = bundle.scaler, bundle.encoders
+
         # Extract features
         temperature = data.get("temperature", 25)
         humidity = data.get("humidity", 60)
@@ -40,35 +42,36 @@ def assess_risk(data: Dict[str, Any]) -> Dict[str, Any]:
         soil_type = data.get("soil_type", "Loamy")
         crop_name = data.get("crop_name", "Rice")
         
-        # Calculate derived features
-        npk_balance = abs(n - p) + abs(p - k)
-        season_risk = (
-            "Low" if (20 <= temperature <= 30 and 50 <= humidity <= 80)
-            else "High" if (temperature < 15 or temperature > 35 or humidity < 40 or humidity > 90)
-            else "Moderate"
-        )
+        with timer("risk.encode"):
+            # Calculate derived features
+            npk_balance = fe.npk_balance(n, p, k)
+            season_risk = fe.season_risk(temperature, humidity)
         
-        # Encode categorical features
-        soil_type_enc = encoders["Soil Type"].transform([soil_type])[0]
-        crop_name_enc = encoders["Crop Name"].transform([crop_name])[0]
-        season_risk_enc = encoders["Season_Risk"].transform([season_risk])[0]
+            # Encode categorical features
+            soil_type_enc = encoders["Soil Type"].transform([soil_type])[0]
+            crop_name_enc = encoders["Crop Name"].transform([crop_name])[0]
+            season_risk_enc = encoders["Season_Risk"].transform([season_risk])[0]
         
-        # Prepare feature vector
-        features = np.array([
-            n, p, k, temperature, humidity, ph, rainfall,
-            npk_balance, soil_type_enc, crop_name_enc, season_risk_enc
-        ]).reshape(1, -1)
+            # Prepare feature vector
+            features = np.array([
+                n, p, k, temperature, humidity, ph, rainfall,
+                npk_balance, soil_type_enc, crop_name_enc, season_risk_enc
+            ]).reshape(1, -1)
         
-        # Scale features
-        features_scaled = scaler.transform(features)
+            # Scale features
+            features_scaled = scaler.transform(features)
         
-        # Make predictions
-        yield_prediction = float(yield_model.predict(features_scaled)[0])
-        profit_prediction = float(profit_model.predict(features_scaled)[0])
+        # Make predictions: one pass over every yield and profit tree
+        with timer("risk.forest"):
+            yield_trees, profit_trees = bundle.forest.split_groups(bundle.forest.predict_per_tree(features_scaled))
+        yield_stats = summarize_tree_spread(yield_trees[:, 0])
+        profit_stats = summarize_tree_spread(profit_trees[:, 0])
+        yield_prediction = yield_stats["mean"]
+        profit_prediction = profit_stats["mean"]
         
         # Calculate risks
         climate_risk = calculate_climate_risk(temperature, humidity, rainfall)
-        yield_uncertainty = 1 - yield_model.score(features_scaled, [yield_prediction])
+        yield_uncertainty = yield_stats["uncertainty"]
         price_volatility = abs(profit_prediction) / (yield_prediction + 1e-6)  # Avoid division by zero
         
         risk_score, risk_category = calculate_risk_score(yield_uncertainty, price_volatility, climate_risk)
@@ -77,12 +80,22 @@ def assess_risk(data: Dict[str, Any]) -> Dict[str, Any]:
             "yield_prediction": {
                 "value": round(yield_prediction, 2),
                 "unit": "tons/ha",
-                "confidence": round((1 - yield_uncertainty) * 100, 1)
+                "confidence": round((1 - yield_uncertainty) * 100, 1),
+                "interval": {
+                    "lower": round(yield_stats["lower"], 2),
+                    "upper": round(yield_stats["upper"], 2),
+                    "level": INTERVAL_LEVEL
+                }
             },
             "profit_prediction": {
                 "value": round(profit_prediction, 2),
                 "unit": "INR/ha",
-                "confidence": round((1 - price_volatility) * 100, 1)
+                "confidence": round((1 - profit_stats["uncertainty"]) * 100, 1),
+                "interval": {
+                    "lower": round(profit_stats["lower"], 2),
+                    "upper": round(profit_stats["upper"], 2),
+                    "level": INTERVAL_LEVEL
+                }
             },
             "risk_assessment": {
                 "score": round(risk_score * 100, 1),
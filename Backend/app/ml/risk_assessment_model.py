@@ -1,11 +1,13 @@
 import os
 import pandas as pd
-import numpy as np
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler, LabelEncoder
 from sklearn.ensemble import RandomForestRegressor
-import joblib
-from typing import Dict, Tuple, List
+from typing import Tuple
+from app.ml.feature_store import TrainingFeatures, load_features
+from app.ml.artifacts import save_bundle
+from app.ml.tuning import tuned_params
+from app.ml import feature_engineering as fe
 
 # Get absolute paths
 current_dir = os.path.dirname(os.path.abspath(__file__))
@@ -27,63 +29,30 @@ def calculate_risk_score(yield_uncertainty: float, price_volatility: float, clim
     return risk_score, category
 
 def calculate_base_yield(row):
-    """Calculate base yield based on environmental conditions"""
-    # Normalize values to 0-1 scale
-    temp_factor = 1 - abs(row["Temperature"] - 25) / 25  # Optimal temp around 25°C
-    humidity_factor = 1 - abs(row["Humidity"] - 65) / 65  # Optimal humidity around 65%
-    ph_factor = 1 - abs(row["pH"] - 6.5) / 6.5  # Optimal pH around 6.5
-    rainfall_factor = min(row["Rainfall"] / 1000, 1)  # Scale rainfall, cap at 1000mm
-    
-    # NPK efficiency
-    npk_balance = (min(row["N"], 100) + min(row["P"], 100) + min(row["K"], 100)) / 300
-    
-    # Combine factors
-    base_yield = (temp_factor * 0.25 + 
-                 humidity_factor * 0.2 + 
-                 ph_factor * 0.15 + 
-                 rainfall_factor * 0.2 + 
-                 npk_balance * 0.2) * 10  # Scale to realistic yield values
-    
-    return base_yield
+    """Calculate base yield based on environmental conditions (a row or a whole DataFrame)"""
+    return fe.base_yield(row["Temperature"], row["Humidity"], row["pH"], row["Rainfall"],
+                         row["N"], row["P"], row["K"])
 
 def calculate_profit(yield_value, base_cost=5000):
     """Calculate profit based on yield and base cost"""
-    # Assume average market price per ton
-    market_price = 15000
-    revenue = yield_value * market_price
-    
-    # Calculate costs
-    production_cost = base_cost + (yield_value * 2000)  # Base cost + variable cost
-    profit = revenue - production_cost
-    
-    return profit
+    return fe.profit(yield_value, base_cost)
 
-def prepare_risk_assessment_data(df: pd.DataFrame) -> Tuple:
+def prepare_risk_assessment_data(features: TrainingFeatures) -> Tuple:
     """Prepare data for risk assessment model"""
     # Required features
     numeric_cols = ["N", "P", "K", "Temperature", "Humidity", "pH", "Rainfall"]
     cat_cols = ["Soil Type", "Crop Name"]
     
-    # Fill missing values
-    df[numeric_cols] = df[numeric_cols].fillna(df[numeric_cols].median())
-    for c in cat_cols:
-        df[c] = df[c].fillna("Unknown").astype(str)
+    # Imputed dataset from the shared feature store
+    df = features.frame()
     
     # Create derived features
-    df["NPK_Balance"] = abs(df["N"] - df["P"]) + abs(df["P"] - df["K"])
-    df["Season_Risk"] = np.where(
-        (df["Temperature"].between(20, 30)) & (df["Humidity"].between(50, 80)),
-        "Low",
-        np.where(
-            (df["Temperature"].between(15, 35)) & (df["Humidity"].between(40, 90)),
-            "Moderate",
-            "High"
-        )
-    )
+    df["NPK_Balance"] = fe.npk_balance(df["N"], df["P"], df["K"])
+    df["Season_Risk"] = fe.season_risk(df["Temperature"], df["Humidity"])
     
     # Calculate yield and profit
-    df["Calculated_Yield"] = df.apply(calculate_base_yield, axis=1)
-    df["Calculated_Profit"] = df["Calculated_Yield"].apply(calculate_profit)
+    df["Calculated_Yield"] = calculate_base_yield(df)
+    df["Calculated_Profit"] = calculate_profit(df["Calculated_Yield"])
     
     # Add soil type factors
     soil_yield_factors = {
@@ -100,10 +69,11 @@ def prepare_risk_assessment_data(df: pd.DataFrame) -> Tuple:
     
     # Encode categorical features
     encoders = {}
-    for col in cat_cols + ["Season_Risk"]:
-        le = LabelEncoder()
-        df[f"{col}_encoded"] = le.fit_transform(df[col])
-        encoders[col] = le
+    for col in cat_cols:
+        encoders[col], df[f"{col}_encoded"] = features.encoder(col)
+    le = LabelEncoder()
+    df["Season_Risk_encoded"] = le.fit_transform(df["Season_Risk"])
+    encoders["Season_Risk"] = le
     
     # Prepare feature matrix
     feature_cols = (
@@ -117,11 +87,12 @@ def prepare_risk_assessment_data(df: pd.DataFrame) -> Tuple:
     y_yield = df["Calculated_Yield"].values
     y_profit = df["Calculated_Profit"].values
     
-    return X, y_yield, y_profit, encoders, feature_cols
+    return X, y_yield, y_profit, encoders, feature_cols, df
 
-def train():
+def train(n_jobs: int = -1):
     print("🔹 Loading dataset...")
-    df = pd.read_csv(DATA_PATH)
+    features = load_features(DATA_PATH)
+    df = features.frame()
     
     # Print dataset info
     print("\n📊 Dataset Overview:")
@@ -129,7 +100,7 @@ def train():
     print("\n🌱 Available crops:", ", ".join(df["Crop Name"].unique()[:5]), "...")
     print("🌍 Soil types:", ", ".join(df["Soil Type"].unique()))
     
-    X, y_yield, y_profit, encoders, feature_cols = prepare_risk_assessment_data(df)
+    X, y_yield, y_profit, encoders, feature_cols, df = prepare_risk_assessment_data(features)
     
     # Print feature ranges
     print("\n📈 Feature Ranges:")
@@ -145,15 +116,16 @@ def train():
         X_scaled, y_yield, y_profit, test_size=0.2, random_state=42, shuffle=True
     )
     
+    # Hyper-parameters from the last tuning run (app/ml/tuning.py), if any
+    params = {"n_estimators": 200, "max_depth": 15, "min_samples_split": 5, "min_samples_leaf": 2,
+              **tuned_params(OUT_PATH)}
+    
     # Train yield model with cross-validation
     print("\n🌾 Training yield prediction model...")
     yield_model = RandomForestRegressor(
-        n_estimators=200,
-        max_depth=15,
-        min_samples_split=5,
-        min_samples_leaf=2,
+        **params,
         random_state=42,
-        n_jobs=-1
+        n_jobs=n_jobs
     )
     yield_model.fit(X_train, y_yield_train)
     yield_score = yield_model.score(X_test, y_yield_test)
@@ -161,12 +133,9 @@ def train():
     # Train profit model
     print("💰 Training profit prediction model...")
     profit_model = RandomForestRegressor(
-        n_estimators=200,
-        max_depth=15,
-        min_samples_split=5,
-        min_samples_leaf=2,
+        **params,
         random_state=42,
-        n_jobs=-1
+        n_jobs=n_jobs
     )
     profit_model.fit(X_train, y_profit_train)
     profit_score = profit_model.score(X_test, y_profit_test)
@@ -199,7 +168,7 @@ def train():
     }
     
     os.makedirs(os.path.dirname(OUT_PATH), exist_ok=True)
-    joblib.dump(bundle, OUT_PATH)
+    save_bundle(bundle, OUT_PATH)
     print(f"\n💾 Models and metadata saved to: {OUT_PATH}")
 
 if __name__ == "__main__":
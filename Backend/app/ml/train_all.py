@@ -0,0 +1,59 @@
+# app/ml/train_all.py
+import os
+import time
+import importlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from typing import Dict, List, Optional
+
+from app.ml.feature_store import DATA_PATH, load_features
+
+# Trainer modules ("module" or "module:function"), each function taking n_jobs
+TRAINERS = {
+    "crop": "app.ml.model_training",
+    "fertilizer": "app.ml.fertilizer_model_training",
+    "fertilizer_npk": "app.ml.fertilizer_model_training:train_regressor",
+    "risk": "app.ml.risk_assessment_model",
+    "price": "app.ml.price_model_training",
+}
+
+def _run(name: str, n_jobs: int) -> float:
+    start = time.perf_counter()
+    module, _, function = TRAINERS[name].partition(":")
+    getattr(importlib.import_module(module), function or "train")(n_jobs=n_jobs)
+    return time.perf_counter() - start
+
+def train_all(names: Optional[List[str]] = None, max_workers: Optional[int] = None) -> Dict[str, Dict]:
+    """Fit the models concurrently, one process each, over the shared feature cache.
+
+    The cache is built once up front; every worker then memory-maps the same
+    arrays instead of parsing the dataset again. CPU cores are split between the
+    workers so the forests' own n_jobs threads don't oversubscribe the machine.
+    """
+    names = names or list(TRAINERS)
+    start = time.perf_counter()
+    features = load_features(DATA_PATH)
+    print(f"🔹 Feature cache ready ({features.n_rows} rows) in {time.perf_counter() - start:.2f}s")
+
+    max_workers = max_workers or min(len(names), os.cpu_count() or 1)
+    n_jobs = max(1, (os.cpu_count() or 1) // max_workers)
+
+    results = {}
+    with ProcessPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(_run, name, n_jobs): name for name in names}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                results[name] = {"status": "ok", "seconds": round(future.result(), 2)}
+                print(f"✅ {name} model trained in {results[name]['seconds']}s")
+            except Exception as e:
+                results[name] = {"status": "error", "error": str(e)}
+                print(f"❌ {name} model failed: {e}")
+
+    print(f"✨ Trained {sum(r['status'] == 'ok' for r in results.values())}/{len(names)} models "
+          f"in {time.perf_counter() - start:.2f}s")
+    return results
+
+if __name__ == "__main__":
+    results = train_all()
+    if any(r["status"] != "ok" for r in results.values()):
+        exit(1)
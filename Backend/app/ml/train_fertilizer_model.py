@@ -1,13 +1,14 @@
-import joblib
 import pandas as pd
 from sklearn.preprocessing import StandardScaler, OneHotEncoder, LabelEncoder
 from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from sklearn.ensemble import RandomForestClassifier
 import os
+from app.ml.feature_engineering import npk_ratio_labels
+from app.ml.artifacts import save_bundle
 
 df = pd.read_csv("fertilizer_dataset.csv")
-df["npk_ratio"] = df.apply(lambda r: f"{int(r['N'])}:{int(r['P'])}:{int(r['K'])}", axis=1)
+df["npk_ratio"] = npk_ratio_labels(df["N"], df["P"], df["K"], as_int=True)
 df = df[(df["N"] > 0) & (df["P"] > 0) & (df["K"] > 0)]
 
 df = df[["Temperature","Humidity","pH","Rainfall","Soil Type","Crop Name","npk_ratio"]]
@@ -50,6 +51,6 @@ bundle = {
 }
 
 MODEL_PATH = os.path.join(os.path.dirname(__file__), "fertilizer_model.pkl")
-joblib.dump(bundle, MODEL_PATH)
+save_bundle(bundle, MODEL_PATH)
 
 print("✅ Fertilizer Model Trained & Saved Successfully:", MODEL_PATH)
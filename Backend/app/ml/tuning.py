@@ -0,0 +1,245 @@
+# app/ml/tuning.py
+import os
+import json
+import time
+import random
+import argparse
+import importlib
+import itertools
+import tempfile
+import multiprocessing
+from typing import Any, Dict, List, Optional
+
+import joblib
+import numpy as np
+
+# Trainer module and task of every tunable model
+MODELS = {
+    "crop": {"trainer": "app.ml.model_training", "task": "classification"},
+    "fertilizer": {"trainer": "app.ml.fertilizer_model_training", "task": "classification"},
+    "fertilizer_npk": {"trainer": "app.ml.fertilizer_model_training", "task": "regression", "out": "NPK_OUT_PATH"},
+    "risk": {"trainer": "app.ml.risk_assessment_model", "task": "regression"},
+    "price": {"trainer": "app.ml.price_model_training", "task": "regression"},
+}
+
+SEARCH_SPACE = {
+    "n_estimators": [50, 100, 200, 250],
+    "max_depth": [None, 10, 15, 20],
+    "min_samples_leaf": [1, 2, 5],
+    "max_features": ["sqrt", 0.5, 1.0],
+}
+
+CV_FOLDS = 3
+LATENCY_SAMPLES = 200
+BATCH_SIZE = 1024
+BATCH_REPEATS = 5
+
+def tuning_path(model_path: str) -> str:
+    """crop_model.pkl -> crop_model.tuning.json"""
+    return os.path.splitext(model_path)[0] + ".tuning.json"
+
+def tuned_params(model_path: str) -> Dict[str, Any]:
+    """Hyper-parameters selected by the last tuning run for this bundle, or {} if it was never tuned."""
+    path = tuning_path(model_path)
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        selected = json.load(f).get("selected") or {}
+    return selected.get("params", {})
+
+def load_training_data(name: str):
+    """(X, y) exactly as the model's trainer builds them, from the shared feature store."""
+    from app.ml.feature_store import load_features
+
+    trainer = importlib.import_module(MODELS[name]["trainer"])
+    features = load_features(trainer.DATA_PATH)
+    if name == "crop":
+        X, y = trainer.load_and_prepare(features)[:2]
+    elif name == "fertilizer":
+        X, y = trainer.prepare_fertilizer_data(features)[:2]
+    elif name == "fertilizer_npk":
+        X, y = trainer.prepare_fertilizer_data(features)[0], features.numeric(["N", "P", "K"])
+    elif name == "risk":
+        X, y = trainer.prepare_risk_assessment_data(features)[:2]  # yield target; profit shares the config
+    else:
+        X, y = trainer.prepare_price_data(features)[:2]
+    return np.asarray(X, dtype=np.float64), y
+
+def candidate_params(max_candidates: int, seed: int = 42) -> List[Dict[str, Any]]:
+    grid = [dict(zip(SEARCH_SPACE, values)) for values in itertools.product(*SEARCH_SPACE.values())]
+    random.Random(seed).shuffle(grid)
+    return grid[:max_candidates]
+
+# -----------------------
+# Worker side
+# -----------------------
+_worker_data = {}
+
+def _init_worker(name: str, memory_mb: Optional[int]) -> None:
+    if memory_mb:
+        try:
+            import resource
+            limit = memory_mb * 1024 * 1024
+            resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+        except (ImportError, ValueError, OSError):
+            pass  # no address-space limits on this platform
+    _worker_data["name"] = name
+    _worker_data["X"], _worker_data["y"] = load_training_data(name)
+
+def _evaluate(args) -> Dict[str, Any]:
+    index, params, out_dir = args
+    from sklearn.ensemble import RandomForestClassifier, RandomForestRegressor
+    from sklearn.model_selection import KFold, cross_validate
+
+    name, X, y = _worker_data["name"], _worker_data["X"], _worker_data["y"]
+    estimator_cls = RandomForestClassifier if MODELS[name]["task"] == "classification" else RandomForestRegressor
+    start = time.perf_counter()
+    try:
+        cv = cross_validate(
+            estimator_cls(random_state=42, n_jobs=1, **params), X, y,
+            cv=KFold(CV_FOLDS, shuffle=True, random_state=42), return_estimator=True
+        )
+    except MemoryError:
+        return {"index": index, "params": params, "status": "error", "error": "memory budget exceeded"}
+    except Exception as e:
+        return {"index": index, "params": params, "status": "error", "error": str(e)}
+
+    # Latency is measured later in the parent, one model at a time, on a fold estimator
+    model_path = os.path.join(out_dir, f"candidate-{index}.pkl")
+    joblib.dump(cv["estimator"][0], model_path)
+    return {
+        "index": index,
+        "params": params,
+        "status": "ok",
+        "score": float(np.mean(cv["test_score"])),
+        "score_std": float(np.std(cv["test_score"])),
+        "fit_seconds": round(time.perf_counter() - start, 2),
+        "model_path": model_path,
+    }
+
+# -----------------------
+# Parent side
+# -----------------------
+def measure_latency(model, X: np.ndarray) -> Dict[str, float]:
+    """Single-row p50/p99 and batch latency of the model as served (compiled forest)."""
+    from app.ml.forest_eval import compile_forest
+
+    forest = compile_forest(model)
+    predict = forest.predict_per_tree if forest is not None else model.predict
+    rng = np.random.default_rng(0)
+
+    predict(X[:1])  # warm up
+    single = []
+    for i in rng.integers(0, len(X), LATENCY_SAMPLES):
+        start = time.perf_counter()
+        predict(X[i:i + 1])
+        single.append((time.perf_counter() - start) * 1000)
+
+    batch = X[rng.integers(0, len(X), BATCH_SIZE)]
+    batch_ms = []
+    for _ in range(BATCH_REPEATS):
+        start = time.perf_counter()
+        predict(batch)
+        batch_ms.append((time.perf_counter() - start) * 1000)
+
+    return {
+        "single_p50_ms": round(float(np.percentile(single, 50)), 3),
+        "single_p99_ms": round(float(np.percentile(single, 99)), 3),
+        "batch_ms": round(float(np.median(batch_ms)), 3),
+        "n_nodes": int(sum(est.tree_.node_count for est in model.estimators_)),
+    }
+
+def pareto_front(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Candidates no other candidate beats on score, single-row p99 and batch latency at once."""
+    def dominates(a, b):
+        better_or_equal = (a["score"] >= b["score"] and a["single_p99_ms"] <= b["single_p99_ms"]
+                           and a["batch_ms"] <= b["batch_ms"])
+        strictly_better = (a["score"] > b["score"] or a["single_p99_ms"] < b["single_p99_ms"]
+                           or a["batch_ms"] < b["batch_ms"])
+        return better_or_equal and strictly_better
+    front = [r for r in results if not any(dominates(o, r) for o in results if o is not r)]
+    return sorted(front, key=lambda r: -r["score"])
+
+def select(front: List[Dict[str, Any]], p99_budget_ms: Optional[float]) -> Optional[Dict[str, Any]]:
+    """Best-scoring Pareto candidate within the p99 budget, else the fastest one."""
+    if not front:
+        return None
+    within = [r for r in front if p99_budget_ms is None or r["single_p99_ms"] <= p99_budget_ms]
+    if within:
+        return max(within, key=lambda r: r["score"])
+    return min(front, key=lambda r: r["single_p99_ms"])
+
+def tune(name: str, max_candidates: int = 24, time_budget: float = 600.0, memory_mb: Optional[int] = None,
+         p99_budget_ms: Optional[float] = None, workers: Optional[int] = None) -> Dict[str, Any]:
+    """Cross-validated random search for one model under a wall-clock and per-worker memory budget.
+
+    Candidates are fitted in a process pool (one single-threaded fit per worker).
+    When the time budget runs out the pool is terminated and only finished
+    candidates are kept. Their latency is then measured one at a time in this
+    process, the Pareto front of (score, p99, batch latency) is computed and the
+    report is written next to the model bundle as <bundle>.tuning.json.
+    """
+    trainer = importlib.import_module(MODELS[name]["trainer"])
+    out_path = getattr(trainer, MODELS[name].get("out", "OUT_PATH"))
+    deadline = time.monotonic() + time_budget
+    params = candidate_params(max_candidates)
+    workers = workers or min(len(params), os.cpu_count() or 1)
+    print(f"🔹 Tuning {name} model: {len(params)} candidates, {workers} workers, {time_budget:.0f}s budget")
+
+    results: List[Dict[str, Any]] = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        pool = multiprocessing.get_context("spawn").Pool(workers, initializer=_init_worker, initargs=(name, memory_mb))
+        try:
+            pending = pool.imap_unordered(_evaluate, [(i, p, out_dir) for i, p in enumerate(params)])
+            for _ in params:
+                try:
+                    results.append(pending.next(timeout=max(0.0, deadline - time.monotonic())))
+                except multiprocessing.TimeoutError:
+                    print(f"⚠️ Time budget reached after {len(results)}/{len(params)} candidates")
+                    break
+        finally:
+            pool.terminate()
+            pool.join()
+
+        X, _ = load_training_data(name)
+        for r in results:
+            if r["status"] == "ok":
+                r.update(measure_latency(joblib.load(r.pop("model_path")), X))
+
+    ok = [r for r in results if r["status"] == "ok"]
+    front = pareto_front(ok)
+    selected = select(front, p99_budget_ms)
+    report = {
+        "model": name,
+        "metric": "accuracy" if MODELS[name]["task"] == "classification" else "r2",
+        "cv_folds": CV_FOLDS,
+        "p99_budget_ms": p99_budget_ms,
+        "time_budget_s": time_budget,
+        "memory_mb": memory_mb,
+        "evaluated": len(ok),
+        "failed": [r for r in results if r["status"] != "ok"],
+        "pareto": front,
+        "selected": selected,
+        "candidates": sorted(ok, key=lambda r: -r["score"]),
+        "tuned_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with open(tuning_path(out_path), "w") as f:
+        json.dump(report, f, indent=2)
+
+    if selected:
+        print(f"✅ {name}: selected {selected['params']} "
+              f"({report['metric']}={selected['score']:.4f}, p99={selected['single_p99_ms']}ms)")
+    print(f"💾 Tuning report saved to: {tuning_path(out_path)}")
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Tune the random-forest models")
+    parser.add_argument("models", nargs="*", default=list(MODELS), choices=list(MODELS))
+    parser.add_argument("--candidates", type=int, default=24)
+    parser.add_argument("--time-budget", type=float, default=600.0, help="seconds per model")
+    parser.add_argument("--memory-mb", type=int, default=None, help="address-space limit per worker")
+    parser.add_argument("--p99-ms", type=float, default=None, help="single-row p99 latency budget")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    for model_name in args.models:
+        tune(model_name, args.candidates, args.time_budget, args.memory_mb, args.p99_ms, args.workers)
@@ -0,0 +1,7 @@
+from pydantic import BaseModel
+from typing import Any, Dict
+
+class WeatherResponse(BaseModel):
+    status: str
+    data: Dict[str, Any]
+    message: str
@@ -12,15 +12,22 @@ class RiskAssessmentRequest(BaseModel):
     phosphorus: float = Field(..., ge=0)
     potassium: float = Field(..., ge=0)
 
+class ConfidenceInterval(BaseModel):
+    lower: float
+    upper: float
+    level: float
+
 class YieldPrediction(BaseModel):
     value: float
     unit: str
     confidence: float
+    interval: Optional[ConfidenceInterval] = None
 
 class ProfitPrediction(BaseModel):
     value: float
     unit: str
     confidence: float
+    interval: Optional[ConfidenceInterval] = None
 
 class RiskFactors(BaseModel):
     climate_risk: float
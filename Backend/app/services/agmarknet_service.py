@@ -0,0 +1,254 @@
+from typing import Dict, List, Optional
+import asyncio
+import datetime
+import hashlib
+import logging
+import os
+import random
+import time
+import httpx
+from dotenv import load_dotenv
+
+from app.core import tracing
+from app.core.metrics import timer
+from app.core.storage import get_storage
+from app.ml.market_store import MarketPriceStore
+from app.ml.price_history import add_price_records
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+API_URL = os.getenv("AGMARKNET_API_URL", "https://api.data.gov.in/resource/9ef84268-d588-465a-a308-a864a43d0070")
+API_KEY = os.getenv("AGMARKNET_API_KEY")
+
+PAGE_SIZE = int(os.getenv("AGMARKNET_PAGE_SIZE", "1000"))
+MAX_CONCURRENCY = int(os.getenv("AGMARKNET_MAX_CONCURRENCY", "4"))
+RATE_LIMIT = float(os.getenv("AGMARKNET_RATE_LIMIT", "5"))  # requests per second
+MAX_RETRIES = int(os.getenv("AGMARKNET_MAX_RETRIES", "5"))
+BACKOFF_BASE = 0.5
+
+TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+COLLECTION = "daily_market_updates"
+WATERMARK_COLLECTION = "ingestion_watermarks"
+
+# When set, ingested records are also appended to the local columnar market price store
+MARKET_STORE_DIR = os.getenv("MARKET_STORE_DIR")
+
+# Beyond this many days behind the watermark, one unfiltered query is cheaper than one query per day
+MAX_INCREMENTAL_DAYS = int(os.getenv("AGMARKNET_MAX_INCREMENTAL_DAYS", "14"))
+
+# Fields that identify one market record; their hash is the stored document ID
+RECORD_KEY_FIELDS = ("state", "district", "market", "commodity", "variety", "arrival_date")
+
+class RateLimiter:
+    """Token bucket shared by all concurrent page fetches."""
+
+    def __init__(self, rate: float, burst: Optional[int] = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def build_params(state: Optional[str] = None, district: Optional[str] = None,
+                 commodity: Optional[str] = None, extra_filters: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    params = {"api-key": API_KEY, "format": "json"}
+    if state: params["filters[state.keyword]"] = state
+    if district: params["filters[district.keyword]"] = district
+    if commodity: params["filters[commodity.keyword]"] = commodity
+    for field, value in (extra_filters or {}).items():
+        params[f"filters[{field}]"] = value
+    return params
+
+def _to_int(value) -> int:
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return 0
+
+def parse_arrival_date(value) -> Optional[datetime.date]:
+    """Parse Agmarknet's dd/mm/yyyy arrival dates (and the dd-mm-yyyy/ISO variants)."""
+    if isinstance(value, datetime.date):
+        return value
+    for fmt in ("%d/%m/%Y", "%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.datetime.strptime(str(value).strip(), fmt).date()
+        except ValueError:
+            continue
+    return None
+
+def record_id(rec: Dict) -> str:
+    """Deterministic document ID, so re-ingesting a record overwrites it instead of duplicating it."""
+    parts = []
+    for field in RECORD_KEY_FIELDS:
+        value = rec.get(field)
+        if field == "arrival_date":
+            parsed = parse_arrival_date(value)
+            value = parsed.isoformat() if parsed else value
+        parts.append(" ".join(str(value or "").strip().lower().split()))
+    return hashlib.sha1("|".join(parts).encode()).hexdigest()
+
+def watermark_key(state: Optional[str] = None, district: Optional[str] = None,
+                  commodity: Optional[str] = None) -> str:
+    key = ":".join(["agmarknet", state or "*", district or "*", commodity or "*"])
+    return key.replace("/", "_")
+
+def get_watermark(key: str) -> Optional[datetime.date]:
+    """Latest arrival date written by the last successful run for this source."""
+    document = get_storage().get(WATERMARK_COLLECTION, key)
+    if document is None:
+        return None
+    return parse_arrival_date(document.get("arrival_date"))
+
+def set_watermark(key: str, arrival_date: datetime.date, records: int) -> None:
+    get_storage().set(WATERMARK_COLLECTION, key, {
+        "arrival_date": arrival_date.isoformat(),
+        "records": records,
+        "updated_at": datetime.datetime.utcnow()
+    })
+
+def normalize_record(rec: Dict) -> Dict:
+    return {
+        "state": rec.get("state"),
+        "district": rec.get("district"),
+        "market": rec.get("market"),
+        "commodity": rec.get("commodity"),
+        "variety": rec.get("variety"),
+        "arrival_date": rec.get("arrival_date"),
+        "min_price": _to_int(rec.get("min_price", 0)),
+        "max_price": _to_int(rec.get("max_price", 0)),
+        "modal_price": _to_int(rec.get("modal_price", 0)),
+        "arrivals": _to_int(rec.get("arrival", 0)),
+        "source": "Agmarknet",
+        "last_updated": datetime.datetime.utcnow()
+    }
+
+async def fetch_page(client: httpx.AsyncClient, limiter: RateLimiter, params: Dict, offset: int,
+                     limit: int = PAGE_SIZE) -> Dict:
+    """Fetch one page, retrying transport errors, 429 and 5xx responses with exponential backoff."""
+    page_params = {**params, "offset": offset, "limit": limit}
+    for attempt in range(MAX_RETRIES + 1):
+        await limiter.acquire()
+        try:
+            with timer("upstream.agmarknet"):
+                response = await client.get(API_URL, params=page_params)
+            if response.status_code not in RETRY_STATUS:
+                response.raise_for_status()
+                return response.json()
+            retry_after = response.headers.get("Retry-After")
+            error = f"HTTP {response.status_code}"
+        except httpx.TransportError as e:
+            retry_after, error = None, str(e)
+
+        if attempt == MAX_RETRIES:
+            raise RuntimeError(f"Agmarknet page at offset {offset} failed after {MAX_RETRIES} retries: {error}")
+        delay = float(retry_after) if retry_after and retry_after.isdigit() else BACKOFF_BASE * 2 ** attempt
+        await asyncio.sleep(delay + random.uniform(0, BACKOFF_BASE))
+
+def write_records(records: List[Dict], collection: str = COLLECTION) -> int:
+    """Upsert records by deterministic ID in batched writes."""
+    get_storage().write_many([(collection, record_id(rec), rec) for rec in records])
+    return len(records)
+
+def index_records(store: Optional[MarketPriceStore], records: List[Dict]) -> None:
+    """Append one page of records to the local market price store (if configured) and the price history."""
+    if store is not None:
+        store.append(records)
+    # keep lag features current in processes that serve price predictions
+    add_price_records(records)
+
+async def ingest_daily_prices(state: Optional[str] = None, district: Optional[str] = None,
+                              commodity: Optional[str] = None, page_size: int = PAGE_SIZE,
+                              concurrency: int = MAX_CONCURRENCY, rate_limit: float = RATE_LIMIT,
+                              incremental: bool = True) -> Dict:
+    """Page through the Agmarknet resource concurrently and upsert every record into storage.
+
+    Each query's first page reports its total record count; the remaining pages are
+    fetched concurrently under the rate limit and committed (to storage, the local
+    market price store and the price history) as soon as they arrive, so memory stays
+    bounded by the pages in flight whatever the size of the backfill.
+
+    With incremental=True only arrival dates from the stored watermark for this
+    source onwards are requested (one filtered query per date, or a single unfiltered
+    query when the watermark is more than MAX_INCREMENTAL_DAYS old), records before the
+    watermark are skipped, and the watermark advances once the whole run succeeds.
+    The watermark day itself is fetched again, since Agmarknet keeps publishing a
+    day's records after a run may have seen part of them; the deterministic record
+    IDs turn the repeats into overwrites.
+    """
+    key = watermark_key(state, district, commodity)
+    watermark = get_watermark(key) if incremental else None
+    base_params = build_params(state, district, commodity)
+
+    days = (datetime.date.today() - watermark).days if watermark is not None else None
+    if days is None or days > MAX_INCREMENTAL_DAYS:
+        queries = [base_params]
+    else:
+        queries = [
+            {**base_params, "filters[arrival_date]": (watermark + datetime.timedelta(days=i)).strftime("%d/%m/%Y")}
+            for i in range(0, days + 1)
+        ]
+
+    limiter = RateLimiter(rate_limit)
+    semaphore = asyncio.Semaphore(concurrency)
+    stats = {"pages": 0, "fetched": 0, "written": 0, "skipped": 0}
+    latest = {"date": watermark}
+    store = MarketPriceStore(MARKET_STORE_DIR) if MARKET_STORE_DIR else None
+
+    async def process(client: httpx.AsyncClient, params: Dict, offset: int) -> int:
+        """Fetch, filter and commit one page; returns the query's total record count.
+
+        Only counters outlive the page. Holding the semaphore through the writes
+        bounds the number of pages in memory.
+        """
+        async with semaphore:
+            page = await fetch_page(client, limiter, params, offset, page_size)
+            records = []
+            for rec in page.get("records", []):
+                arrival = parse_arrival_date(rec.get("arrival_date"))
+                if watermark is not None and arrival is not None and arrival < watermark:
+                    stats["skipped"] += 1
+                    continue
+                if arrival is not None and (latest["date"] is None or arrival > latest["date"]):
+                    latest["date"] = arrival
+                records.append(normalize_record(rec))
+            stats["pages"] += 1
+            stats["fetched"] += len(records)
+            with tracing.span("agmarknet.write", offset=offset, records=len(records)):
+                written = await asyncio.to_thread(write_records, records)
+            stats["written"] += written
+            if records:
+                with tracing.span("agmarknet.index", offset=offset, records=len(records)):
+                    await asyncio.to_thread(index_records, store, records)
+        return _to_int(page.get("total", 0))
+
+    async def run_query(client: httpx.AsyncClient, params: Dict) -> None:
+        total = await process(client, params, 0)
+        await asyncio.gather(*[process(client, params, offset) for offset in range(page_size, total, page_size)])
+
+    # A root span per run (sampled at the job rate); the page fetches and writes are its children
+    with tracing.trace("agmarknet.ingest", tracing.should_sample(tracing.TRACE_JOB_SAMPLE_RATE),
+                       watermark_key=key, queries=len(queries)):
+        async with httpx.AsyncClient(timeout=TIMEOUT) as client:
+            await asyncio.gather(*[run_query(client, params) for params in queries])
+
+    if latest["date"] is not None and latest["date"] != watermark:
+        await asyncio.to_thread(set_watermark, key, latest["date"], stats["written"])
+    stats["watermark"] = latest["date"].isoformat() if latest["date"] else None
+
+    logger.info("Agmarknet ingestion: %s", stats)
+    return stats
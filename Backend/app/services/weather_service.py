@@ -1,64 +1,123 @@
-from typing import Dict
-import requests
+from typing import Dict, Optional, Tuple
+import asyncio
+import time
+import httpx
 import os
 from dotenv import load_dotenv
 
+from app.core.metrics import timer
+
 load_dotenv()
 
 WEATHER_API_KEY = os.getenv('WEATHER_API_KEY')
-BASE_URL = "http://api.weatherapi.com/v1"
+BASE_URL = os.getenv('WEATHER_API_BASE_URL', "http://api.weatherapi.com/v1")
+
+# Forecasts are cached per (location, days) for this many seconds
+CACHE_TTL = float(os.getenv('WEATHER_CACHE_TTL', "600"))
+CACHE_MAX_ENTRIES = 1024
+
+TIMEOUT = httpx.Timeout(10.0, connect=3.0)
+LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20)
+
+CacheKey = Tuple[str, int]
+
+_client: Optional[httpx.AsyncClient] = None
+_cache: Dict[CacheKey, Tuple[float, Dict]] = {}
+_inflight: Dict[CacheKey, asyncio.Task] = {}
+
+def get_client() -> httpx.AsyncClient:
+    """Shared async client so upstream connections are pooled across requests."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(base_url=BASE_URL, timeout=TIMEOUT, limits=LIMITS)
+    return _client
+
+async def close_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    _inflight.clear()
+
+def clear_cache() -> None:
+    _cache.clear()
+
+def normalize_location(location: str) -> str:
+    return " ".join(location.strip().lower().split())
 
-def get_weather_forecast(location: str, days: int = 7) -> Dict:
+def format_forecast(data: Dict) -> Dict:
+    """Format the weatherapi.com response for frontend consumption"""
+    forecast_data = {
+        "location": {
+            "name": data["location"]["name"],
+            "region": data["location"]["region"],
+            "country": data["location"]["country"]
+        },
+        "current": {
+            "temp_c": data["current"]["temp_c"],
+            "humidity": data["current"]["humidity"],
+            "condition": data["current"]["condition"]["text"],
+            "wind_kph": data["current"]["wind_kph"],
+            "precip_mm": data["current"]["precip_mm"],
+            "air_quality": data["current"].get("air_quality", {}).get("pm10", 0)
+        },
+        "forecast": []
+    }
+
+    # Process forecast data
+    for day in data["forecast"]["forecastday"]:
+        forecast_data["forecast"].append({
+            "date": day["date"],
+            "max_temp_c": day["day"]["maxtemp_c"],
+            "min_temp_c": day["day"]["mintemp_c"],
+            "avg_temp_c": day["day"]["avgtemp_c"],
+            "max_wind_kph": day["day"]["maxwind_kph"],
+            "total_precip_mm": day["day"]["totalprecip_mm"],
+            "humidity": day["day"]["avghumidity"],
+            "condition": day["day"]["condition"]["text"],
+            "chance_of_rain": day["day"]["daily_chance_of_rain"]
+        })
+
+    return forecast_data
+
+async def _fetch_forecast(key: CacheKey, location: str, days: int) -> Dict:
+    params = {
+        "key": WEATHER_API_KEY,
+        "q": location,
+        "days": days,
+        "aqi": "yes"  # Include air quality data
+    }
+    with timer("upstream.weather"):
+        response = await get_client().get("/forecast.json", params=params)
+    response.raise_for_status()
+    forecast_data = format_forecast(response.json())
+
+    if len(_cache) >= CACHE_MAX_ENTRIES:
+        _cache.pop(next(iter(_cache)))
+    _cache[key] = (time.monotonic() + CACHE_TTL, forecast_data)
+    return forecast_data
+
+async def get_weather_forecast(location: str, days: int = 7) -> Dict:
     """
-    Get weather forecast data for a location
+    Get weather forecast data for a location.
+
+    Results are cached per normalized location and day count, and concurrent
+    requests for the same key share a single upstream call.
     """
+    key = (normalize_location(location), days)
+    cached = _cache.get(key)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(_fetch_forecast(key, location, days))
+        _inflight[key] = task
+        task.add_done_callback(lambda _: _inflight.pop(key, None))
+
     try:
-        url = f"{BASE_URL}/forecast.json"
-        params = {
-            "key": WEATHER_API_KEY,
-            "q": location,
-            "days": days,
-            "aqi": "yes"  # Include air quality data
-        }
-        
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        
-        data = response.json()
-        
-        # Format the response for frontend consumption
-        forecast_data = {
-            "location": {
-                "name": data["location"]["name"],
-                "region": data["location"]["region"],
-                "country": data["location"]["country"]
-            },
-            "current": {
-                "temp_c": data["current"]["temp_c"],
-                "humidity": data["current"]["humidity"],
-                "condition": data["current"]["condition"]["text"],
-                "wind_kph": data["current"]["wind_kph"],
-                "precip_mm": data["current"]["precip_mm"],
-                "air_quality": data["current"].get("air_quality", {}).get("pm10", 0)
-            },
-            "forecast": []
-        }
-        
-        # Process forecast data
-        for day in data["forecast"]["forecastday"]:
-            forecast_data["forecast"].append({
-                "date": day["date"],
-                "max_temp_c": day["day"]["maxtemp_c"],
-                "min_temp_c": day["day"]["mintemp_c"],
-                "avg_temp_c": day["day"]["avgtemp_c"],
-                "max_wind_kph": day["day"]["maxwind_kph"],
-                "total_precip_mm": day["day"]["totalprecip_mm"],
-                "humidity": day["day"]["avghumidity"],
-                "condition": day["day"]["condition"]["text"],
-                "chance_of_rain": day["day"]["daily_chance_of_rain"]
-            })
-        
-        return forecast_data
+        # shield: a cancelled caller must not cancel the fetch other callers are awaiting
+        return await asyncio.shield(task)
     except Exception as e:
         raise Exception(f"Error fetching weather data: {str(e)}")
 
@@ -0,0 +1,242 @@
+# benchmarks/load_test.py
+"""End-to-end HTTP load test of the /api/v1 routes.
+
+By default app.main:app is booted in-process (lifespan included) and driven
+through httpx's ASGI transport, with the in-memory storage backend and local
+stub servers standing in for weatherapi.com and data.gov.in, so no credentials
+or network access are needed. --url targets an already running server instead.
+
+Each route is driven in turn by --concurrency closed-loop clients for
+--duration seconds (or --mixed: all routes at once) and the report gives
+throughput and p50/p95/p99 latency per route as JSON. The models must have
+been trained (python -m app.ml.train_all).
+
+    cd Backend
+    python -m benchmarks.load_test --concurrency 16 --duration 10 --output load.json
+    python -m benchmarks.load_test --routes add_crop_data assess_risk --mixed
+"""
+import argparse
+import asyncio
+import datetime
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from collections import Counter
+from typing import Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from benchmarks.stubs import COMMODITIES, STATES, agmarknet_stub, weather_stub
+
+CROPS = ["Cotton", "Maize", "Onion", "Potato", "Rice", "Soybean", "Tomato", "Wheat"]
+SOIL_TYPES = ["Black", "Clay", "Loamy", "Red", "Sandy", "Silty"]
+
+Request = Tuple[str, str, Optional[Dict]]
+
+def crop_record(rng: random.Random) -> Dict:
+    return {
+        "N": rng.uniform(0, 140), "P": rng.uniform(5, 145), "K": rng.uniform(5, 205),
+        "temperature": rng.uniform(10, 40), "humidity": rng.uniform(20, 95),
+        "ph": rng.uniform(4.5, 8.5), "rainfall": rng.uniform(200, 2500),
+        "soil_type": rng.choice(SOIL_TYPES),
+    }
+
+def add_crop_data(rng: random.Random) -> Request:
+    return "POST", "/api/v1/add_crop_data", crop_record(rng)
+
+def add_crop_data_batch(rng: random.Random) -> Request:
+    return "POST", "/api/v1/add_crop_data_batch", {"records": [crop_record(rng) for _ in range(32)]}
+
+def predict_price(rng: random.Random) -> Request:
+    date = datetime.date(2024, 1, 1) + datetime.timedelta(days=rng.randrange(365))
+    return "POST", "/api/v1/predict_price", {
+        "state": rng.choice(STATES), "district": "Ambala", "crop": rng.choice(COMMODITIES),
+        "variety": "Other", "date": date.isoformat(),
+    }
+
+def get_fertilizer(rng: random.Random) -> Request:
+    return "POST", "/api/v1/get_fertilizer", {
+        "crop_name": rng.choice(CROPS), "soil_type": rng.choice(SOIL_TYPES),
+        "temperature": rng.uniform(10, 40), "humidity": rng.uniform(20, 95),
+        "ph": rng.uniform(4.5, 8.5), "rainfall": rng.uniform(200, 2500),
+    }
+
+def assess_risk(rng: random.Random) -> Request:
+    return "POST", "/api/v1/assess_risk", {
+        "crop_name": rng.choice(CROPS), "soil_type": rng.choice(SOIL_TYPES),
+        "temperature": rng.uniform(10, 40), "humidity": rng.uniform(20, 95),
+        "ph": rng.uniform(4.5, 8.5), "rainfall": rng.uniform(200, 2500),
+        "nitrogen": rng.uniform(0, 140), "phosphorus": rng.uniform(5, 145), "potassium": rng.uniform(5, 205),
+    }
+
+def weather(rng: random.Random, locations: int = 50) -> Request:
+    return "GET", f"/api/v1/weather/village-{rng.randrange(locations)}", None
+
+def get_all_crops(rng: random.Random) -> Request:
+    return "GET", "/api/v1/get_all_crops?limit=100", None
+
+def get_daily_prices(rng: random.Random) -> Request:
+    return "GET", "/api/v1/get_daily_prices", None
+
+# Write routes come first so the list routes read populated collections
+ROUTES: Dict[str, Callable[[random.Random], Request]] = {
+    "add_crop_data": add_crop_data,
+    "add_crop_data_batch": add_crop_data_batch,
+    "predict_price": predict_price,
+    "get_fertilizer": get_fertilizer,
+    "assess_risk": assess_risk,
+    "weather": weather,
+    "get_all_crops": get_all_crops,
+    "get_daily_prices": get_daily_prices,
+}
+
+def summarize(latencies_ms: List[float], statuses: Counter, elapsed: float) -> Dict:
+    lat = np.asarray(latencies_ms) if latencies_ms else np.zeros(1)
+    total = sum(statuses.values())
+    errors = {str(status): n for status, n in statuses.items() if status != 200}
+    return {
+        "requests": total,
+        "errors": errors,
+        "error_rate": round(sum(errors.values()) / total, 4) if total else 0.0,
+        "throughput_rps": round(total / elapsed, 1) if elapsed else 0.0,
+        "p50_ms": round(float(np.percentile(lat, 50)), 2),
+        "p95_ms": round(float(np.percentile(lat, 95)), 2),
+        "p99_ms": round(float(np.percentile(lat, 99)), 2),
+        "mean_ms": round(float(lat.mean()), 2),
+        "max_ms": round(float(lat.max()), 2),
+    }
+
+async def drive(client, routes: List[str], concurrency: int, duration: float, warmup: float,
+                seed: int) -> Dict[str, Dict]:
+    """Closed-loop clients picking uniformly among `routes` until the duration is over."""
+    latencies: Dict[str, List[float]] = {name: [] for name in routes}
+    statuses: Dict[str, Counter] = {name: Counter() for name in routes}
+    start = time.perf_counter()
+    measure_from = start + warmup
+    deadline = measure_from + duration
+
+    async def worker(worker_seed: int) -> None:
+        rng = random.Random(worker_seed)
+        while True:
+            sent = time.perf_counter()
+            if sent >= deadline:
+                return
+            name = rng.choice(routes)
+            method, path, body = ROUTES[name](rng)
+            try:
+                status = (await client.request(method, path, json=body)).status_code
+            except Exception as e:
+                status = type(e).__name__
+            if sent >= measure_from:
+                latencies[name].append((time.perf_counter() - sent) * 1000)
+                statuses[name][status] += 1
+
+    await asyncio.gather(*(worker(seed * 1000 + i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - measure_from
+    return {name: summarize(latencies[name], statuses[name], elapsed) for name in routes}
+
+async def ingest(records: int) -> Dict:
+    """One Agmarknet ingestion run against the data.gov.in stub."""
+    from app.services.agmarknet_service import ingest_daily_prices
+
+    start = time.perf_counter()
+    stats = await ingest_daily_prices(incremental=False, rate_limit=1000)
+    elapsed = time.perf_counter() - start
+    return {"records": stats["written"], "pages": stats["pages"], "seconds": round(elapsed, 2),
+            "records_per_s": round(stats["written"] / elapsed, 1) if elapsed else 0.0}
+
+async def run(args) -> Dict:
+    import httpx
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    timeout = httpx.Timeout(args.timeout)
+    report = {"routes": {}}
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=timeout) as client:
+            report["routes"] = await scenarios(client, args)
+        return report
+
+    from app.main import app
+    from app.core.startup import startup
+
+    async with app.router.lifespan_context(app):
+        for _ in range(int(args.ready_timeout * 10)):
+            if startup.ready:
+                break
+            await asyncio.sleep(0.1)
+        report["startup"] = startup.as_dict()
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=timeout) as client:
+            report["routes"] = await scenarios(client, args)
+        if args.ingest_records:
+            report["agmarknet_ingest"] = await ingest(args.ingest_records)
+    return report
+
+async def scenarios(client, args) -> Dict[str, Dict]:
+    if args.mixed:
+        return await drive(client, args.routes, args.concurrency, args.duration, args.warmup, args.seed)
+    results = {}
+    for name in args.routes:
+        results.update(await drive(client, [name], args.concurrency, args.duration, args.warmup, args.seed))
+        print(f"🔹 {name}: {results[name]['throughput_rps']} req/s, p99 {results[name]['p99_ms']} ms",
+              file=sys.stderr)
+    return results
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main(argv: Optional[List[str]] = None) -> Dict:
+    parser = argparse.ArgumentParser(description="HTTP load test of the /api/v1 routes")
+    parser.add_argument("--routes", nargs="+", default=list(ROUTES), choices=list(ROUTES))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--duration", type=float, default=10.0, help="measured seconds per route")
+    parser.add_argument("--warmup", type=float, default=1.0, help="unmeasured seconds before each run")
+    parser.add_argument("--mixed", action="store_true", help="drive all routes at once instead of in turn")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--url", default=None, help="target a running server instead of booting the app")
+    parser.add_argument("--storage", default="memory", choices=["memory", "sqlite", "firestore"])
+    parser.add_argument("--upstream-delay-ms", type=float, default=20.0, help="stub API response delay")
+    parser.add_argument("--weather-cache-ttl", type=float, default=600.0)
+    parser.add_argument("--ingest-records", type=int, default=0,
+                        help="also time one Agmarknet ingestion of this many stub records")
+    parser.add_argument("--ready-timeout", type=float, default=120.0)
+    parser.add_argument("--output", default=None, help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    with weather_stub(args.upstream_delay_ms) as weather_api, \
+            agmarknet_stub(args.ingest_records, args.upstream_delay_ms) as agmarknet_api:
+        # Read by the app modules at import time, so set before run() imports them
+        os.environ["STORAGE_BACKEND"] = args.storage
+        os.environ["WEATHER_API_BASE_URL"] = weather_api.url
+        os.environ["WEATHER_CACHE_TTL"] = str(args.weather_cache_ttl)
+        os.environ["AGMARKNET_API_URL"] = f"{agmarknet_api.url}/resource/stub"
+        report = asyncio.run(run(args))
+
+    report["config"] = {k: v for k, v in vars(args).items() if k != "output"}
+    report["meta"] = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+        print(f"💾 Load test report saved to: {args.output}", file=sys.stderr)
+    else:
+        print(output)
+    return report
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+# benchmarks/ml_bench.py
+"""Micro-benchmarks of the app/ml inference hot paths, with regression checks.
+
+Every case runs at batch sizes 1, 32, 1024 and 100k on synthetic inputs drawn
+from the bundle's training ranges (scaler mean +- 2 std, categories from the
+fitted encoders). "batch" cases process the whole batch in one call; "row"
+cases are the per-request functions called once per row, timed on at most
+--max-loop-rows rows. Both are reported as microseconds per row (median of the
+repeats), which is what the regression check compares.
+
+    cd Backend
+    python -m benchmarks.ml_bench --save-baseline          # record this machine's baseline
+    python -m benchmarks.ml_bench --threshold 15            # exit 1 if a case got >15% slower
+    python -m benchmarks.ml_bench --require-baseline        # CI: exit 2 if there is no baseline to compare with
+
+Baselines are machine specific, so benchmarks/ml_baseline.json is not committed
+(Backend/.gitignore ignores it): record one on each machine, or CI runner image,
+before comparing. Without a baseline the run only reports timings, unless
+--require-baseline makes that an error.
+"""
+import argparse
+import datetime
+import json
+import os
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+BATCH_SIZES = [1, 32, 1024, 100_000]
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "ml_baseline.json")
+
+# Percent slowdown (us per row) against the baseline that counts as a regression
+REGRESSION_THRESHOLD = float(os.getenv("ML_BENCH_THRESHOLD", "20"))
+
+# Cases whose per-row time is below this are too noisy to fail on
+MIN_COMPARABLE_US = 1.0
+
+CROP_KEYS = ["N", "P", "K", "temperature", "humidity", "ph", "rainfall"]
+CLIMATE_KEYS = ["temperature", "humidity", "ph", "rainfall"]
+RISK_KEYS = ["nitrogen", "phosphorus", "potassium", "temperature", "humidity", "ph", "rainfall"]
+
+class Inputs:
+    """Synthetic inputs for the largest batch size; smaller batches are prefixes."""
+
+    def __init__(self, n: int, seed: int = 42):
+        from app.ml import feature_engineering as fe
+        from app.ml.model_registry import get_crop_model, get_fertilizer_model, get_price_model, get_risk_model
+
+        rng = np.random.default_rng(seed)
+        crop = get_crop_model().bundle
+        fertilizer = get_fertilizer_model().bundle
+        price = get_price_model().bundle
+        risk = get_risk_model().bundle
+
+        # N, P, K, temperature, humidity, ph, rainfall share the crop scaler's training statistics
+        numeric = rng.uniform(crop.scaler.mean_ - 2 * crop.scaler.scale_, crop.scaler.mean_ + 2 * crop.scaler.scale_,
+                              size=(n, len(CROP_KEYS))).clip(min=0)
+        soil = rng.choice(fertilizer.cat_encoders["Soil Type"].classes_, n)
+        crop_names = rng.choice(fertilizer.cat_encoders["Crop Name"].classes_, n)
+
+        self.crop_rows = [dict(zip(CROP_KEYS, row)) for row in numeric.tolist()]
+        self.fertilizer_rows = [
+            {**{k: row[k] for k in CLIMATE_KEYS}, "soil_type": s, "crop_name": c}
+            for row, s, c in zip(self.crop_rows, soil, crop_names)
+        ]
+        self.risk_rows = [
+            {**dict(zip(RISK_KEYS, values)), "soil_type": s, "crop_name": c}
+            for values, s, c in zip(numeric.tolist(), soil, crop_names)
+        ]
+
+        dates = np.datetime64("2023-01-01") + rng.integers(0, 365, n)
+        encoders = price.encoders
+        self.price_rows = [
+            {"market": m, "crop": c, "variety": v, "state": s, "district": d, "date": str(date)}
+            for m, c, v, s, d, date in zip(
+                rng.choice(encoders["market"].classes_, n), rng.choice(encoders["crop"].classes_, n),
+                rng.choice(encoders["variety"].classes_, n), rng.choice(encoders["state"].classes_, n),
+                rng.choice(encoders["district"].classes_, n), dates,
+            )
+        ]
+        self.markets = np.array([row["market"] for row in self.price_rows], dtype=object)
+
+        # Model matrices for the forest kernels
+        from app.ml.model_inference import build_feature_matrix
+        self.crop_X = build_feature_matrix(crop, self.crop_rows)
+        self.fertilizer_X = np.hstack([
+            fertilizer.scaler.transform(numeric[:, 3:]),
+            fertilizer.cat_encoders["Soil Type"].transform(soil).reshape(-1, 1),
+            fertilizer.cat_encoders["Crop Name"].transform(crop_names).reshape(-1, 1),
+        ])
+        n_, p_, k_, temperature, humidity = numeric[:, :5].T
+        self.risk_X = risk.scaler.transform(np.column_stack([
+            numeric, fe.npk_balance(n_, p_, k_),
+            risk.encoders["Soil Type"].transform(soil), risk.encoders["Crop Name"].transform(crop_names),
+            risk.encoders["Season_Risk"].transform(fe.season_risk(temperature, humidity)),
+        ]))
+
+def cases(inputs: Inputs) -> Dict[str, Dict]:
+    """name -> {"kind": "batch" | "row", "run": callable(n)}"""
+    from app.ml.fertilizer_model import predict_npk_ratio
+    from app.ml.model_inference import predict_crop, predict_crops_batch
+    from app.ml.model_registry import get_crop_model, get_fertilizer_model, get_price_model, get_risk_model
+    from app.ml.price_model_inference import make_features, predict_price
+    from app.ml.risk_assessment import assess_risk
+
+    crop_forest = get_crop_model().bundle.forest
+    fertilizer_forest = get_fertilizer_model().bundle.forest
+    risk = get_risk_model().bundle
+    market_encoder = get_price_model().bundle.encoders["market"]
+
+    def label_lookup(value):
+        # As the price route encodes one value: membership check, then transform
+        return market_encoder.transform([value])[0] if value in market_encoder.classes_ else 0
+
+    return {
+        "crop.predict": {"kind": "batch", "run": lambda n: (
+            predict_crop(inputs.crop_rows[0]) if n == 1 else predict_crops_batch(inputs.crop_rows[:n]))},
+        "crop.predict_top3": {"kind": "batch", "run": lambda n: predict_crops_batch(inputs.crop_rows[:n], top_k=3)},
+        "crop.forest": {"kind": "batch", "run": lambda n: crop_forest.predict_proba(inputs.crop_X[:n])},
+        "fertilizer.predict_npk_ratio": {"kind": "row", "run": lambda n: [
+            predict_npk_ratio(row, variant="classifier") for row in inputs.fertilizer_rows[:n]]},
+        "fertilizer_npk.predict_npk_ratio": {"kind": "row", "run": lambda n: [
+            predict_npk_ratio(row, variant="regression") for row in inputs.fertilizer_rows[:n]]},
+        "fertilizer.forest": {"kind": "batch", "run": lambda n: fertilizer_forest.predict_proba(inputs.fertilizer_X[:n])},
+        "risk.assess_risk": {"kind": "row", "run": lambda n: [assess_risk(row) for row in inputs.risk_rows[:n]]},
+        "risk.forest": {"kind": "batch", "run": lambda n: risk.forest.predict_per_tree(inputs.risk_X[:n])},
+        "price.make_features": {"kind": "row", "run": lambda n: [make_features(row) for row in inputs.price_rows[:n]]},
+        "price.predict_price": {"kind": "row", "run": lambda n: [predict_price(row) for row in inputs.price_rows[:n]]},
+        "label_encoder.transform": {"kind": "batch", "run": lambda n: market_encoder.transform(inputs.markets[:n])},
+        "label_encoder.lookup": {"kind": "row", "run": lambda n: [label_lookup(v) for v in inputs.markets[:n]]},
+    }
+
+def time_case(run: Callable[[int], object], rows: int, min_repeats: int, min_seconds: float) -> List[float]:
+    """Seconds per call; repeats until both min_repeats and min_seconds are reached."""
+    run(min(rows, 32))  # warm caches and lazy loads
+    times = []
+    started = time.perf_counter()
+    while len(times) < min_repeats or time.perf_counter() - started < min_seconds:
+        start = time.perf_counter()
+        run(rows)
+        times.append(time.perf_counter() - start)
+        if len(times) >= min_repeats and times[-1] > min_seconds:
+            break
+    return times
+
+def run_benchmarks(names: Optional[List[str]] = None, batch_sizes: List[int] = BATCH_SIZES,
+                   max_loop_rows: int = 2000, min_repeats: int = 3, min_seconds: float = 0.5) -> Dict[str, Dict]:
+    """Results keyed "<case>@<batch size>"."""
+    from app.ml.price_history import get_price_history
+
+    inputs = Inputs(max(batch_sizes))
+    get_price_history()  # load the lag index up front rather than in the first timed call
+    all_cases = cases(inputs)
+    results = {}
+    for name in names or list(all_cases):
+        case = all_cases[name]
+        for batch in batch_sizes:
+            rows = min(batch, max_loop_rows) if case["kind"] == "row" else batch
+            times = time_case(case["run"], rows, min_repeats, min_seconds)
+            median = float(np.median(times))
+            results[f"{name}@{batch}"] = {
+                "kind": case["kind"],
+                "batch": batch,
+                "timed_rows": rows,
+                "repeats": len(times),
+                "us_per_row": round(median / rows * 1e6, 3),
+                "batch_ms": round(median / rows * batch * 1000, 3),
+            }
+            print(f"🔹 {name}@{batch}: {results[f'{name}@{batch}']['us_per_row']} us/row", file=sys.stderr)
+    return results
+
+def compare(results: Dict[str, Dict], baseline: Dict[str, Dict], threshold: float) -> List[Dict]:
+    """Cases whose us_per_row grew more than threshold percent over the baseline."""
+    regressions = []
+    for key, current in results.items():
+        base = baseline.get(key)
+        if base is None or base["us_per_row"] < MIN_COMPARABLE_US:
+            continue
+        change = (current["us_per_row"] - base["us_per_row"]) / base["us_per_row"] * 100
+        current["change_pct"] = round(change, 1)
+        if change > threshold:
+            regressions.append({"case": key, "baseline_us": base["us_per_row"], "current_us": current["us_per_row"],
+                                "change_pct": round(change, 1)})
+    return regressions
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Micro-benchmarks of the ML inference hot paths")
+    parser.add_argument("--cases", nargs="*", default=None, help="case names (default: all)")
+    parser.add_argument("--batch-sizes", nargs="+", type=int, default=BATCH_SIZES)
+    parser.add_argument("--max-loop-rows", type=int, default=2000, help="rows timed for per-row cases")
+    parser.add_argument("--min-repeats", type=int, default=3)
+    parser.add_argument("--min-seconds", type=float, default=0.5, help="minimum timed seconds per case")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save-baseline", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--require-baseline", action="store_true",
+                        help="exit 2 instead of only reporting when there is no baseline")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD, help="allowed slowdown in percent")
+    parser.add_argument("--output", default=None, help="also write the JSON report here")
+    args = parser.parse_args(argv)
+    if args.require_baseline and not args.save_baseline and not os.path.exists(args.baseline):
+        print(f"❌ No baseline at {args.baseline}; run with --save-baseline on this machine first", file=sys.stderr)
+        return 2
+
+    results = run_benchmarks(args.cases, args.batch_sizes, args.max_loop_rows, args.min_repeats, args.min_seconds)
+    report = {"results": results, "timestamp": datetime.datetime.now().isoformat(timespec="seconds")}
+
+    if args.save_baseline:
+        with open(args.baseline, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"💾 Baseline saved to: {args.baseline}", file=sys.stderr)
+        regressions = []
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        report.update({"baseline": args.baseline, "threshold_pct": args.threshold, "regressions": regressions})
+    else:
+        print(f"⚠️ No baseline at {args.baseline}; run with --save-baseline first", file=sys.stderr)
+        regressions = []
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output)
+    print(output)
+
+    for r in regressions:
+        print(f"❌ {r['case']}: {r['baseline_us']} -> {r['current_us']} us/row (+{r['change_pct']}%)", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+# benchmarks/stubs.py
+"""Local stand-ins for weatherapi.com and the data.gov.in Agmarknet resource.
+
+Each stub is a threaded HTTP server on 127.0.0.1 with an ephemeral port and an
+optional fixed response delay, so load tests exercise the real httpx client
+path (connection pooling, timeouts) without network access or API keys. Every
+request is logged on the server (StubServer.requests) for tests to inspect.
+"""
+import datetime
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Tuple, Union
+from urllib.parse import parse_qs, urlparse
+
+STATES = ["Haryana", "Punjab", "Maharashtra", "Karnataka", "Uttar Pradesh"]
+COMMODITIES = ["Brinjal", "Tomato", "Onion", "Potato", "Wheat", "Rice"]
+
+def weather_forecast(location: str, days: int) -> Dict:
+    """A weatherapi.com /forecast.json response with deterministic values per location."""
+    rng = random.Random(location)
+    today = datetime.date.today()
+    condition = {"text": rng.choice(["Sunny", "Partly cloudy", "Light rain"])}
+    return {
+        "location": {"name": location.title(), "region": "Stub", "country": "India"},
+        "current": {
+            "temp_c": round(rng.uniform(15, 38), 1), "humidity": rng.randint(30, 90), "condition": condition,
+            "wind_kph": round(rng.uniform(0, 25), 1), "precip_mm": round(rng.uniform(0, 10), 1),
+            "air_quality": {"pm10": round(rng.uniform(10, 120), 1)},
+        },
+        "forecast": {"forecastday": [
+            {"date": (today + datetime.timedelta(days=i)).isoformat(), "day": {
+                "maxtemp_c": 32.0, "mintemp_c": 21.0, "avgtemp_c": 26.5, "maxwind_kph": 14.0,
+                "totalprecip_mm": 2.5, "avghumidity": 65, "condition": condition, "daily_chance_of_rain": 40,
+            }}
+            for i in range(days)
+        ]},
+    }
+
+def agmarknet_page(total: int, offset: int, limit: int) -> Dict:
+    """One page of a data.gov.in resource holding `total` synthetic market records."""
+    today = datetime.date.today()
+    records = []
+    for i in range(offset, min(offset + limit, total)):
+        rng = random.Random(i)
+        modal = rng.randint(800, 6000)
+        records.append({
+            "state": rng.choice(STATES), "district": f"District {i % 40}", "market": f"Market {i % 200}",
+            "commodity": rng.choice(COMMODITIES), "variety": "Other",
+            "arrival_date": (today - datetime.timedelta(days=i % 7)).strftime("%d/%m/%Y"),
+            "min_price": str(modal - 200), "max_price": str(modal + 200), "modal_price": str(modal),
+        })
+    return {"total": total, "count": len(records), "offset": offset, "limit": limit, "records": records}
+
+# (status, payload) or (status, payload, extra response headers)
+Response = Union[Tuple[int, Dict], Tuple[int, Dict, Dict[str, str]]]
+Handler = Callable[[str, Dict[str, str]], Response]
+
+def _make_handler(route: Handler, delay: float, log: List[Tuple[float, str, Dict[str, str]]]):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like the real APIs
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            params = {k: v[-1] for k, v in parse_qs(url.query).items()}
+            log.append((time.monotonic(), url.path, params))
+            if delay:
+                time.sleep(delay)
+            status, payload, *headers = route(url.path, params)
+            body = json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers[0] if headers else {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    return StubHandler
+
+class StubServer:
+    """A JSON HTTP server running on a daemon thread; use as a context manager."""
+
+    def __init__(self, route: Handler, delay_ms: float = 0.0):
+        # (monotonic arrival time, path, query params) per request
+        self.requests: List[Tuple[float, str, Dict[str, str]]] = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), _make_handler(route, delay_ms / 1000, self.requests))
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self) -> "StubServer":
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+def weather_stub(delay_ms: float = 0.0) -> StubServer:
+    def route(path: str, params: Dict[str, str]) -> Tuple[int, Dict]:
+        if path != "/forecast.json":
+            return 404, {"error": {"message": "not found"}}
+        return 200, weather_forecast(params.get("q", ""), int(params.get("days", 7)))
+    return StubServer(route, delay_ms)
+
+def agmarknet_stub(total_records: int = 5000, delay_ms: float = 0.0) -> StubServer:
+    def route(path: str, params: Dict[str, str]) -> Tuple[int, Dict]:
+        return 200, agmarknet_page(total_records, int(params.get("offset", 0)), int(params.get("limit", 1000)))
+    return StubServer(route, delay_ms)
@@ -0,0 +1,19 @@
+# tests/conftest.py
+import os
+import sys
+
+import pytest
+
+# Run from Backend/ or the repository root: app and benchmarks import from Backend/
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture
+def memory_storage():
+    """A fresh in-memory storage backend, swapped in for the test."""
+    from app.core import storage
+
+    previous = storage._storage
+    backend = storage.MemoryStorage()
+    storage.set_storage(backend)
+    yield backend
+    storage.set_storage(previous)
@@ -0,0 +1,151 @@
+# tests/test_agmarknet_service.py
+import asyncio
+import datetime
+import time
+
+import httpx
+import pytest
+
+from app.services import agmarknet_service as agmarknet
+from benchmarks.stubs import StubServer, agmarknet_page, agmarknet_stub
+
+@pytest.fixture
+def api(monkeypatch):
+    """agmarknet_service pointed at a stub server, with short backoffs."""
+    def use(server: StubServer):
+        monkeypatch.setattr(agmarknet, "API_URL", f"{server.url}/resource/stub")
+        return server
+
+    monkeypatch.setattr(agmarknet, "BACKOFF_BASE", 0.01)
+    monkeypatch.setattr(agmarknet, "MARKET_STORE_DIR", None)
+    return use
+
+def fetch(offset: int = 0, limit: int = 100, rate: float = 1000):
+    async def main():
+        async with httpx.AsyncClient(timeout=agmarknet.TIMEOUT) as client:
+            return await agmarknet.fetch_page(client, agmarknet.RateLimiter(rate), agmarknet.build_params(),
+                                              offset, limit)
+    return asyncio.run(main())
+
+def market_record(day: datetime.date, market: str):
+    return {"state": "Haryana", "district": "Ambala", "market": market, "commodity": "Wheat", "variety": "Other",
+            "arrival_date": day.strftime("%d/%m/%Y"), "min_price": "2000", "max_price": "2400",
+            "modal_price": "2200"}
+
+def failing_then_ok(failures, status: int = 429, headers=None):
+    """A route answering `failures` times with `status`, then with a normal page."""
+    remaining = [failures]
+
+    def route(path, params):
+        if remaining[0] > 0:
+            remaining[0] -= 1
+            return status, {"error": "slow down"}, headers or {}
+        return 200, agmarknet_page(250, int(params["offset"]), int(params["limit"]))
+    return route
+
+def test_fetch_page_passes_offset_and_limit(api):
+    with api(agmarknet_stub(total_records=250)) as server:
+        page = fetch(offset=200, limit=100)
+    assert page["total"] == 250
+    assert len(page["records"]) == 50
+    assert server.requests[0][2]["offset"] == "200"
+    assert server.requests[0][2]["limit"] == "100"
+
+def test_fetch_page_retries_429(api):
+    with api(StubServer(failing_then_ok(2))) as server:
+        page = fetch()
+    assert len(page["records"]) == 100
+    assert len(server.requests) == 3
+
+def test_fetch_page_honours_retry_after(api):
+    with api(StubServer(failing_then_ok(1, headers={"Retry-After": "1"}))) as server:
+        page = fetch()
+    (first, *_), (second, *_) = server.requests
+    assert len(page["records"]) == 100
+    assert second - first >= 1.0
+
+def test_fetch_page_gives_up_after_max_retries(api, monkeypatch):
+    monkeypatch.setattr(agmarknet, "MAX_RETRIES", 2)
+    with api(StubServer(failing_then_ok(10, status=503))) as server:
+        with pytest.raises(RuntimeError, match="failed after 2 retries: HTTP 503"):
+            fetch()
+    assert len(server.requests) == 3
+
+def test_fetch_page_does_not_retry_client_errors(api):
+    with api(StubServer(failing_then_ok(1, status=400))) as server:
+        with pytest.raises(httpx.HTTPStatusError):
+            fetch()
+    assert len(server.requests) == 1
+
+def test_rate_limiter_paces_acquires():
+    limiter = agmarknet.RateLimiter(rate=20, burst=2)
+
+    async def main():
+        start = time.monotonic()
+        await asyncio.gather(*[limiter.acquire() for _ in range(12)])
+        return time.monotonic() - start
+
+    # The burst of 2 is free; the other 10 tokens refill at 20/s
+    elapsed = asyncio.run(main())
+    assert 0.45 <= elapsed < 1.0
+
+def test_ingest_pages_are_rate_limited(api, memory_storage):
+    with api(agmarknet_stub(total_records=1000)) as server:
+        stats = asyncio.run(agmarknet.ingest_daily_prices(
+            incremental=False, page_size=100, concurrency=4, rate_limit=5))
+    assert stats["pages"] == 10
+    times = sorted(t for t, *_ in server.requests)
+    # A burst of 5 goes out at once; the other 5 pages wait for tokens refilling at 5/s
+    assert times[4] - times[0] < 0.5
+    assert times[-1] - times[0] >= 0.9
+
+def test_ingest_writes_every_record_once(api, memory_storage):
+    with api(agmarknet_stub(total_records=2500)) as server:
+        stats = asyncio.run(agmarknet.ingest_daily_prices(incremental=False, page_size=1000, rate_limit=1000))
+        again = asyncio.run(agmarknet.ingest_daily_prices(incremental=False, page_size=1000, rate_limit=1000))
+
+    expected = {agmarknet.record_id(agmarknet.normalize_record(r)) for r in agmarknet_page(2500, 0, 2500)["records"]}
+    stored = list(memory_storage.list(agmarknet.COLLECTION))
+    assert stats["pages"] == 3 and stats["written"] == 2500
+    assert again["written"] == 2500
+    # Deterministic record IDs: repeats within and across runs overwrite rather than duplicate
+    assert {r["id"] for r in stored} == expected
+    assert len(server.requests) == 6
+
+def test_incremental_run_refetches_the_watermark_day(api, memory_storage):
+    today = datetime.date.today()
+    yesterday = today - datetime.timedelta(days=1)
+    published = [market_record(yesterday, "Market A"), market_record(today, "Market A")]
+
+    def route(path, params):
+        day = params.get("filters[arrival_date]")
+        records = [r for r in published if day is None or r["arrival_date"] == day]
+        return 200, {"total": len(records), "records": records}
+
+    with api(StubServer(route)) as server:
+        first = asyncio.run(agmarknet.ingest_daily_prices(rate_limit=1000))
+        # Published after the first run, for the day the watermark already reached
+        published.append(market_record(today, "Market B"))
+        second = asyncio.run(agmarknet.ingest_daily_prices(rate_limit=1000))
+
+    assert first["watermark"] == second["watermark"] == today.isoformat()
+    assert first["written"] == 2
+    assert second["written"] == 2 and second["skipped"] == 0
+    assert server.requests[-1][2]["filters[arrival_date]"] == today.strftime("%d/%m/%Y")
+    markets = {r["market"] for r in memory_storage.list(agmarknet.COLLECTION)}
+    assert markets == {"Market A", "Market B"}
+    assert len(list(memory_storage.list(agmarknet.COLLECTION))) == 3
+
+def test_ingest_indexes_page_by_page(api, memory_storage, monkeypatch, tmp_path):
+    from app.ml.market_store import MarketPriceStore
+
+    monkeypatch.setattr(agmarknet, "MARKET_STORE_DIR", str(tmp_path / "prices.store"))
+    batches = []
+    monkeypatch.setattr(agmarknet, "add_price_records", lambda records: batches.append(len(records)))
+    with api(agmarknet_stub(total_records=2500)):
+        stats = asyncio.run(agmarknet.ingest_daily_prices(incremental=False, page_size=1000, rate_limit=1000))
+
+    # Each page goes to the store and the price history as it arrives, not as one run-sized batch
+    assert sorted(batches) == [500, 1000, 1000]
+    assert stats["written"] == 2500
+    assert MarketPriceStore(str(tmp_path / "prices.store")).num_rows > 0
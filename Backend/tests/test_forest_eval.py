@@ -0,0 +1,60 @@
+# tests/test_forest_eval.py
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesRegressor, RandomForestClassifier, RandomForestRegressor
+
+from app.ml import forest_eval
+from app.ml.forest_eval import CompiledForest, mean_evaluator
+
+@pytest.fixture
+def data():
+    rng = np.random.default_rng(0)
+    X = rng.normal(size=(600, 6))
+    y_class = (X[:, 0] + X[:, 1] ** 2 + rng.normal(scale=0.5, size=600) > 1).astype(int) + (X[:, 2] > 0.5)
+    y_reg = X[:, 0] * 3 + np.sin(X[:, 1]) + rng.normal(scale=0.1, size=600)
+    return X, y_class, y_reg, rng.normal(size=(257, 6))
+
+@pytest.fixture(params=[False, True], ids=["one-chunk", "many-chunks"])
+def chunked(request, monkeypatch):
+    # Tiny chunks exercise the chunked accumulation and the tree-group boundaries
+    if request.param:
+        monkeypatch.setattr(forest_eval, "MAX_CHUNK_CELLS", 1000)
+        monkeypatch.setattr(forest_eval, "TREE_GROUP_CELLS", 70)
+    return request.param
+
+def test_classifier_matches_sklearn(data, chunked):
+    X, y, _, X_test = data
+    model = RandomForestClassifier(n_estimators=30, random_state=0).fit(X, y)
+    forest = CompiledForest.from_sklearn(model)
+
+    np.testing.assert_allclose(forest.predict_proba(X_test), model.predict_proba(X_test), rtol=0, atol=1e-12)
+    np.testing.assert_array_equal(forest.predict(X_test), model.predict(X_test))
+    np.testing.assert_array_equal(forest.apply(X_test), np.concatenate(
+        [est.apply(X_test.astype(np.float32))[None, :] for est in model.estimators_]) + forest.roots[:, None])
+
+def test_regressor_matches_sklearn(data, chunked):
+    X, _, y, X_test = data
+    for model in (RandomForestRegressor(n_estimators=20, random_state=0).fit(X, y),
+                  ExtraTreesRegressor(n_estimators=20, random_state=0).fit(X, np.c_[y, -y])):
+        forest = CompiledForest.from_sklearn(model)
+        np.testing.assert_allclose(forest.predict(X_test), model.predict(X_test), rtol=1e-12, atol=1e-9)
+        np.testing.assert_allclose(forest.predict_per_tree(X_test).mean(axis=0), model.predict(X_test),
+                                   rtol=1e-12, atol=1e-9)
+
+def test_single_row(data):
+    X, y, _, X_test = data
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    forest = CompiledForest.from_sklearn(model)
+    np.testing.assert_allclose(forest.predict_proba(X_test[0]), model.predict_proba(X_test[:1]), atol=1e-12)
+
+def test_mean_evaluator_sends_large_batches_to_sklearn(data, monkeypatch):
+    X, y, _, _ = data
+    monkeypatch.setattr(forest_eval, "COMPILED_MAX_ROWS", 100)
+    model = RandomForestClassifier(n_estimators=5, random_state=0).fit(X, y)
+    forest = CompiledForest.from_sklearn(model)
+
+    assert mean_evaluator(model, forest, 100) is forest
+    assert mean_evaluator(model, forest, 101) is model
+    # Serving bundles carry only the compiled forest
+    assert mean_evaluator(forest, forest, 10_000) is forest
+    assert mean_evaluator(model, None, 1) is model
@@ -0,0 +1,107 @@
+# tests/test_market_store.py
+import os
+import threading
+
+import numpy as np
+
+from app.ml import market_store
+from app.ml.market_store import MarketPriceStore, open_store
+
+HEADER = "State,District,Market,Commodity,Variety,Grade,Arrival_Date,Min Price,Max Price,Modal Price\n"
+
+def write_csv(path, rows, mtime):
+    with open(path, "w") as f:
+        f.write(HEADER + "".join(row + "\n" for row in rows))
+    os.utime(path, (mtime, mtime))
+
+def agmarknet_record(market, day, modal):
+    return {"state": "Gujarat", "district": "Amreli", "market": market, "commodity": "Brinjal",
+            "variety": "Other", "grade": "FAQ", "arrival_date": day, "min_price": modal - 100,
+            "max_price": modal + 100, "modal_price": modal}
+
+def modal_prices(store):
+    df = store.query()
+    return {(str(r.market), str(r.arrival_date.date())): float(r.modal_price) for r in df.itertuples()}
+
+def test_rebuild_keeps_appended_records(tmp_path):
+    csv_path, root = str(tmp_path / "prices.csv"), str(tmp_path / "prices.store")
+    write_csv(csv_path, ["Gujarat,Amreli,Damnagar,Brinjal,Other,FAQ,27-07-2023,2200,3000,2450"], mtime=1_000_000)
+    open_store(csv_path, root)
+    MarketPriceStore(root).append([agmarknet_record("Rajula", "28/07/2023", 2600)])
+
+    # The CSV is regenerated with a corrected price and a new row
+    write_csv(csv_path, [
+        "Gujarat,Amreli,Damnagar,Brinjal,Other,FAQ,27-07-2023,2200,3000,2500",
+        "Gujarat,Amreli,Damnagar,Brinjal,Other,FAQ,28-07-2023,2200,3000,2550",
+    ], mtime=os.path.getmtime(os.path.join(root, market_store.MANIFEST)) + 10)
+    store = open_store(csv_path, root)
+
+    assert modal_prices(store) == {
+        ("Damnagar", "2023-07-27"): 2500.0,
+        ("Damnagar", "2023-07-28"): 2550.0,
+        ("Rajula", "2023-07-28"): 2600.0,
+    }
+    assert "source" not in store.query().columns
+    assert sorted(os.listdir(tmp_path)) == ["prices.csv", "prices.store", "prices.store.lock"]
+
+def test_rebuild_keeps_rows_of_version_1_shards(tmp_path):
+    csv_path, root = str(tmp_path / "prices.csv"), str(tmp_path / "prices.store")
+    write_csv(csv_path, ["Gujarat,Amreli,Damnagar,Brinjal,Other,FAQ,27-07-2023,2200,3000,2450"], mtime=1_000_000)
+    store = open_store(csv_path, root)
+    store.append([agmarknet_record("Rajula", "28/07/2023", 2600)])
+    for shard in store._manifest["shards"]:
+        os.remove(os.path.join(root, shard, "source.npy"))
+
+    write_csv(csv_path, ["Gujarat,Amreli,Damnagar,Brinjal,Other,FAQ,29-07-2023,2200,3000,2700"],
+              mtime=os.path.getmtime(os.path.join(root, market_store.MANIFEST)) + 10)
+    assert len(modal_prices(open_store(csv_path, root))) == 3
+
+def test_concurrent_opens_rebuild_once(tmp_path, monkeypatch):
+    csv_path, root = str(tmp_path / "prices.csv"), str(tmp_path / "prices.store")
+    rows = [f"Gujarat,Amreli,Market {i},Brinjal,Other,FAQ,27-07-2023,2200,3000,{2000 + i}" for i in range(200)]
+    write_csv(csv_path, rows, mtime=1_000_000)
+
+    builds = []
+    rebuild = market_store.rebuild
+    monkeypatch.setattr(market_store, "rebuild", lambda *a: (builds.append(a), rebuild(*a)))
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(open_store(csv_path, root).num_rows))
+               for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert len(builds) == 1
+    assert results == [200] * 8
+    assert np.array_equal(np.sort(open_store(csv_path, root).scan(columns=["modal_price"])["modal_price"]),
+                          np.arange(2000, 2200, dtype=np.float32))
+
+def shard_dirs(root):
+    return {name for name in os.listdir(root) if name.startswith("state-")}
+
+def test_readers_keep_the_shard_version_of_their_manifest(tmp_path):
+    root = str(tmp_path / "prices.store")
+    writer = MarketPriceStore(root)
+    writer.append([agmarknet_record("Rajula", "28/07/2023", 2600)])
+    reader = MarketPriceStore(root)
+
+    # Rewrites the Gujarat shard into a new directory; the reader's manifest still points to the old one
+    writer.append([agmarknet_record("Damnagar", "28/07/2023", 2450)])
+    assert modal_prices(reader) == {("Rajula", "2023-07-28"): 2600.0}
+    assert len(shard_dirs(root)) == 2
+
+    reader.refresh()
+    assert modal_prices(reader) == {("Rajula", "2023-07-28"): 2600.0, ("Damnagar", "2023-07-28"): 2450.0}
+
+def test_replaced_shards_are_collected_after_the_grace_period(tmp_path, monkeypatch):
+    monkeypatch.setattr(market_store, "SHARD_GRACE_SECONDS", -1)
+    root = str(tmp_path / "prices.store")
+    writer = MarketPriceStore(root)
+    writer.append([agmarknet_record("Rajula", "28/07/2023", 2600)])
+    reader = MarketPriceStore(root)
+
+    writer.append([agmarknet_record("Damnagar", "28/07/2023", 2450)])
+    assert shard_dirs(root) == set(writer._manifest["shards"])
+    # The reader's shard version is gone, so it moves on to the current manifest
+    assert modal_prices(reader) == {("Rajula", "2023-07-28"): 2600.0, ("Damnagar", "2023-07-28"): 2450.0}
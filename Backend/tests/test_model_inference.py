@@ -0,0 +1,102 @@
+# tests/test_model_inference.py
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+from pydantic import ValidationError
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.preprocessing import LabelEncoder, StandardScaler
+
+from app.ml import forest_eval, model_inference
+from app.ml.forest_eval import compile_forest
+from app.ml.model_inference import FEATURE_KEYS, _encode_column, predict_crops_batch, top_k_indices
+from app.ml.model_registry import CropModelBundle
+
+CROPS = ["maize", "rice", "wheat", "cotton", "jute"]
+
+class Bundle:
+    def __init__(self, **cat_encoders):
+        self.cat_encoders = cat_encoders
+
+def test_encode_column_matches_label_encoder():
+    bundle = Bundle(soil=LabelEncoder().fit(["Sandy", "Clay", "Loamy", "Black"]))
+    values = ["Loamy", "Black", "Sandy", "Clay", "Loamy"]
+    np.testing.assert_array_equal(_encode_column(bundle, "soil", values), bundle.cat_encoders["soil"].transform(values))
+
+def test_encode_column_falls_back_to_zero():
+    bundle = Bundle(soil=LabelEncoder().fit(["Sandy", "Clay", "Loamy"]))
+    codes = _encode_column(bundle, "soil", ["Sandy", None, "Peaty", float("nan"), "Loamy"])
+    np.testing.assert_array_equal(codes, [2, 0, 0, 0, 1])
+
+def test_batch_request_size_is_capped():
+    from app.api.routes_crop import MAX_BATCH_SIZE, CropBatchRequest
+
+    row = {"N": 90, "P": 42, "K": 43, "temperature": 21, "humidity": 82, "ph": 6.5, "rainfall": 203}
+    assert len(CropBatchRequest(records=[row] * MAX_BATCH_SIZE).records) == MAX_BATCH_SIZE
+    with pytest.raises(ValidationError):
+        CropBatchRequest(records=[row] * (MAX_BATCH_SIZE + 1))
+
+def reference_top_k(proba, k):
+    """Every column sorted by value, ties by lower index, cut to k."""
+    return np.argsort(-proba, axis=1, kind="stable")[:, :k]
+
+def test_top_k_indices_are_sorted_descending():
+    proba = np.random.default_rng(0).dirichlet(np.ones(8), size=200)
+    for k in range(1, 9):
+        idx = top_k_indices(proba, k)
+        assert idx.shape == (200, k)
+        np.testing.assert_array_equal(idx, reference_top_k(proba, k))
+        assert np.all(np.diff(np.take_along_axis(proba, idx, axis=1), axis=1) <= 0)
+
+def test_top_k_beyond_the_class_count_returns_every_class():
+    proba = np.random.default_rng(1).dirichlet(np.ones(4), size=10)
+    for k in (4, 5, 100):
+        np.testing.assert_array_equal(top_k_indices(proba, k), reference_top_k(proba, 4))
+
+def test_top_k_ties_go_to_the_lower_index():
+    np.testing.assert_array_equal(top_k_indices(np.array([[0.2, 0.3, 0.3, 0.2]]), 1), [[1]])
+    np.testing.assert_array_equal(top_k_indices(np.array([[0.2, 0.3, 0.3, 0.2]]), 3), [[1, 2, 0]])
+    # Many tied values, including ties straddling the k-th place
+    proba = np.random.default_rng(2).integers(0, 3, size=(500, 6)) / 4
+    for k in range(1, 7):
+        np.testing.assert_array_equal(top_k_indices(proba, k), reference_top_k(proba, k))
+    np.testing.assert_array_equal(top_k_indices(proba, 1)[:, 0], np.argmax(proba, axis=1))
+
+@pytest.fixture
+def crop_model(monkeypatch):
+    """A small crop bundle trained on synthetic rows, served in place of the registry's."""
+    rng = np.random.default_rng(0)
+    X = rng.uniform(0, 100, size=(400, len(FEATURE_KEYS)))
+    labels = np.array(CROPS)[(X[:, 0] // 20).astype(int)]
+    scaler = StandardScaler().fit(X)
+    encoder = LabelEncoder().fit(labels)
+    model = RandomForestClassifier(n_estimators=15, max_depth=4, random_state=0)
+    model.fit(scaler.transform(X), encoder.transform(labels))
+    bundle = CropModelBundle(model=model, scaler=scaler, label_encoder=encoder, cat_encoders={},
+                             numeric_cols=FEATURE_KEYS, cat_cols=[], forest=compile_forest(model))
+    monkeypatch.setattr(model_inference, "get_crop_model", lambda: SimpleNamespace(bundle=bundle))
+    rows = [dict(zip(FEATURE_KEYS, x)) for x in rng.uniform(0, 100, size=(50, len(FEATURE_KEYS))).tolist()]
+    return bundle, rows
+
+@pytest.fixture(params=["compiled", "sklearn"])
+def evaluator(request, monkeypatch):
+    monkeypatch.setattr(forest_eval, "COMPILED_MAX_ROWS", 10_000 if request.param == "compiled" else 0)
+    return request.param
+
+def test_top_1_matches_predict(crop_model, evaluator):
+    _, rows = crop_model
+    plain = predict_crops_batch(rows)
+    ranked = predict_crops_batch(rows, top_k=1)
+    assert [p["recommended_crop"] for p in ranked] == [p["recommended_crop"] for p in plain]
+    assert all(len(p["top_k"]) == 1 and p["top_k"][0]["crop"] == p["recommended_crop"] for p in ranked)
+
+def test_top_k_lists_every_crop_once_best_first(crop_model, evaluator):
+    bundle, rows = crop_model
+    proba = bundle.model.predict_proba(bundle.scaler.transform([[r[k] for k in FEATURE_KEYS] for r in rows]))
+    for prediction, row_proba in zip(predict_crops_batch(rows, top_k=10), proba):
+        crops = [c["crop"] for c in prediction["top_k"]]
+        probabilities = [c["probability"] for c in prediction["top_k"]]
+        assert sorted(crops) == sorted(CROPS)
+        assert probabilities == sorted(probabilities, reverse=True)
+        assert sum(probabilities) == pytest.approx(1.0, abs=1e-3)
+        assert probabilities[0] == round(float(row_proba.max()), 4)
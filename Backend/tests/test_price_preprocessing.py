@@ -0,0 +1,120 @@
+# tests/test_price_preprocessing.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.ml import price_preprocessing
+from app.ml.price_preprocessing import preprocess, preprocess_incremental
+
+KEY = ["state", "district", "market", "commodity", "variety", "arrival_date"]
+RECORD_COLS = ["state", "district", "market", "crop", "variety", "arrival_date"]
+
+def market_rows(days, markets=("Rajkot", "Surat"), crops=("Onion", "Wheat"), seed=0):
+    rng = np.random.default_rng(seed)
+    rows = [
+        {"state": "Gujarat", "district": market, "market": market, "commodity": crop, "variety": "Other",
+         "arrival_date": pd.Timestamp(day), "arrivals": float(rng.integers(0, 50)),
+         "min_price": np.nan, "max_price": 2500.0, "modal_price": float(rng.integers(1000, 3000))}
+        for day in days for market in markets for crop in crops
+    ]
+    return pd.DataFrame(rows)
+
+def reference(parts):
+    """preprocess() on the concatenated history, each record kept once (first occurrence)."""
+    return preprocess(pd.concat(parts, ignore_index=True).drop_duplicates(KEY))
+
+def by_record(df):
+    return df.assign(arrival_date=df["arrival_date"].astype("datetime64[ns]")).set_index(RECORD_COLS).sort_index()
+
+class Upserted:
+    """Every run's returned rows upserted by record, which should reproduce preprocess() on the whole history."""
+
+    def __init__(self):
+        self.df = None
+
+    def add(self, result):
+        X, y, df, encoders, feature_cols = result
+        np.testing.assert_array_equal(X, df[feature_cols].astype(float).values)
+        np.testing.assert_array_equal(y, df["modal_price"].astype(float).values)
+        for col, encoder in encoders.items():
+            # Codes may differ from a full refit, but must decode to the row's category
+            np.testing.assert_array_equal(encoder.inverse_transform(df[col + "_enc"]), df[col])
+        rows = by_record(df)
+        self.df = rows if self.df is None else pd.concat([self.df[~self.df.index.isin(rows.index)], rows]).sort_index()
+
+    def assert_matches(self, expected):
+        X_ref, y_ref, df_ref, encoders_ref, feature_cols_ref = expected
+        cols = [c for c in feature_cols_ref if not c.endswith("_enc")] + ["modal_price"]
+        pd.testing.assert_frame_equal(self.df[cols], by_record(df_ref)[cols])
+
+def days(start, n):
+    return pd.date_range(start, periods=n, freq="D")
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    return str(tmp_path / "cache")
+
+def test_first_run_matches_full_preprocess(cache_dir):
+    part = market_rows(days("2024-01-01", 10), seed=1)
+    result = preprocess_incremental(part, cache_dir=cache_dir)
+    X, y, df, encoders, feature_cols = reference([part])
+    np.testing.assert_array_equal(result[0], X)
+    np.testing.assert_array_equal(result[1], y)
+    pd.testing.assert_frame_equal(result[2].reset_index(drop=True), df.reset_index(drop=True))
+
+def test_in_order_runs_match_full_preprocess(cache_dir, monkeypatch):
+    parts = [market_rows(days("2024-01-01", 10), seed=1), market_rows(days("2024-01-11", 5), seed=2),
+             market_rows(days("2024-01-16", 3), markets=("Rajkot", "Amreli"), seed=3)]
+    upserted = Upserted()
+    upserted.add(preprocess_incremental(parts[0], cache_dir=cache_dir))
+
+    # In-order runs only compute the new rows: no cached rows are read back
+    monkeypatch.setattr(price_preprocessing, "_cached_group_rows", None)
+    for i in range(1, len(parts)):
+        result = preprocess_incremental(parts[i], cache_dir=cache_dir)
+        assert len(result[1]) == len(parts[i])
+        upserted.add(result)
+        upserted.assert_matches(reference(parts[:i + 1]))
+
+def test_overlapping_runs_do_not_duplicate_rows(cache_dir):
+    first = market_rows(days("2024-01-01", 10), seed=1)
+    # A retry of the last 3 days (with changed prices, which the first occurrence wins over) plus 2 new days
+    overlap = pd.concat([market_rows(days("2024-01-08", 3), seed=9), market_rows(days("2024-01-11", 2), seed=2)])
+    upserted = Upserted()
+    upserted.add(preprocess_incremental(first, cache_dir=cache_dir))
+    result = preprocess_incremental(overlap, cache_dir=cache_dir)
+    assert len(result[1]) == 2 * 4
+    upserted.add(result)
+    assert len(upserted.df) == 12 * 4
+    upserted.assert_matches(reference([first, overlap]))
+
+    # Running the same input again is a no-op
+    assert len(preprocess_incremental(overlap, cache_dir=cache_dir)[1]) == 0
+
+def test_late_rows_refit_their_groups(cache_dir):
+    # Every other day first; the missing days arrive later, and only for some groups
+    first = market_rows(days("2024-01-01", 20)[::2], seed=1)
+    late = market_rows(days("2024-01-02", 20)[::2], markets=("Rajkot",), crops=("Onion",), seed=2)
+    newer = market_rows(days("2024-01-21", 3), seed=3)
+    parts = [first, pd.concat([late, newer]), market_rows(days("2024-01-24", 2), seed=4)]
+    upserted = Upserted()
+    for i in range(len(parts)):
+        upserted.add(preprocess_incremental(parts[i], cache_dir=cache_dir))
+        upserted.assert_matches(reference(parts[:i + 1]))
+
+def test_same_day_rows_keep_arrival_order(cache_dir):
+    first = market_rows(days("2024-01-01", 5), seed=1)
+    # Same group and date as the last cached rows, but different varieties
+    same_day = market_rows(days("2024-01-05", 1), seed=2).assign(variety="Hybrid")
+    upserted = Upserted()
+    upserted.add(preprocess_incremental(first, cache_dir=cache_dir))
+    upserted.add(preprocess_incremental(same_day, cache_dir=cache_dir))
+    upserted.assert_matches(reference([first, same_day]))
+
+def test_preprocess_accepts_a_repeated_index():
+    parts = [market_rows(days("2024-01-01", 5), seed=1), market_rows(days("2024-01-06", 5), seed=2)]
+    X, y, df, _, _ = preprocess(pd.concat(parts))
+    X_ref, y_ref, df_ref, _, _ = preprocess(pd.concat(parts, ignore_index=True))
+    np.testing.assert_array_equal(X, X_ref)
+    np.testing.assert_array_equal(y, y_ref)
+    np.testing.assert_array_equal(df.index, np.concatenate([p.index for p in parts])[df_ref.index])
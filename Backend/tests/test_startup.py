@@ -0,0 +1,57 @@
+# tests/test_startup.py
+import asyncio
+
+import pytest
+
+from app.core import startup as startup_module
+from app.core.startup import StartupState
+from app.ml import model_registry
+from app.ml.model_registry import ModelRegistry
+
+@pytest.fixture
+def registry(tmp_path, monkeypatch, memory_storage):
+    """A registry of bundles in tmp_path swapped in for the app's, and a function writing one."""
+    import joblib
+
+    registry = ModelRegistry(check_interval=0)
+    for name, optional in (("crop", False), ("npk", True)):
+        registry.register(name, str(tmp_path / f"{name}.pkl"), dict, optional=optional)
+    monkeypatch.setattr(model_registry, "registry", registry)
+    monkeypatch.setattr(startup_module, "WARMUP_RETRY_INTERVAL", 0.05)
+    return registry, lambda name: joblib.dump({"model": name}, tmp_path / f"{name}.pkl")
+
+def test_missing_optional_model_is_a_warning(registry):
+    _, write = registry
+    write("crop")
+    state = StartupState()
+    asyncio.run(state.warm_up())
+
+    assert state.ready
+    assert not state.errors
+    assert "model_load.npk" in state.warnings
+
+def test_ready_after_a_retry_succeeds(registry):
+    _, write = registry
+    state = StartupState()
+
+    async def run():
+        await state.warm_up()
+        assert not state.ready and "model_load.crop" in state.errors
+        write("crop")
+        await asyncio.wait_for(state._retry_task, 5)
+
+    asyncio.run(run())
+    assert state.ready
+    assert not state.errors
+
+def test_ready_after_the_model_loads_on_a_request(registry, monkeypatch):
+    registry, write = registry
+    monkeypatch.setattr(startup_module, "WARMUP_RETRY_INTERVAL", 0)
+    state = StartupState()
+    asyncio.run(state.warm_up())
+    assert not state.ready
+
+    write("crop")
+    registry.get("crop")
+    assert state.ready
+    assert not state.errors
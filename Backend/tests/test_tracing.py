@@ -0,0 +1,58 @@
+# tests/test_tracing.py
+import asyncio
+
+import pytest
+
+from app.core import tracing
+
+TRACE_ID = "4bf92f3577b34da6a3ce929d0e0e4736"
+
+async def app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b"ok"})
+
+def request(traceparent=None):
+    """Send one request through TracingMiddleware; returns the response's X-Trace-Id, if any."""
+    headers = [(b"traceparent", traceparent.encode())] if traceparent else []
+    scope = {"type": "http", "method": "GET", "path": "/api/v1/crops", "headers": headers}
+    sent = []
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(tracing.TracingMiddleware(app)(scope, receive, send))
+    return dict(sent[0]["headers"]).get(b"x-trace-id")
+
+@pytest.fixture
+def traces(monkeypatch):
+    monkeypatch.setattr(tracing, "TRACE_EXPORT", ["memory"])
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 0.0)
+    monkeypatch.setattr(tracing, "_forced", tracing._TokenBucket(2))
+    tracing._buffer.clear()
+    yield tracing._buffer
+    tracing._buffer.clear()
+
+def test_upstream_sampled_flag_is_rate_limited(traces):
+    traced = [request(f"00-{TRACE_ID}-00f067aa0ba902b7-01") for _ in range(20)]
+    # Only the bucket's burst is traced, not every request that asks for it
+    assert traced.count(TRACE_ID.encode()) == 2
+    assert traced.count(None) == 18
+    assert all(span["trace_id"] == TRACE_ID and span["parent_id"] == "00f067aa0ba902b7" for span in traces)
+
+def test_unsampled_flag_and_no_header_follow_the_local_rate(traces, monkeypatch):
+    assert request(f"00-{TRACE_ID}-00f067aa0ba902b7-00") is None
+    assert request() is None
+    monkeypatch.setattr(tracing, "TRACE_SAMPLE_RATE", 1.0)
+    # Locally sampled requests still join the caller's trace
+    assert request(f"00-{TRACE_ID}-00f067aa0ba902b7-00") == TRACE_ID.encode()
+    assert len(request()) == 32
+
+def test_token_bucket_refills():
+    bucket = tracing._TokenBucket(1000)
+    assert sum(bucket.allow() for _ in range(2000)) < 1100
+    bucket.updated -= 1
+    assert bucket.allow()
+    assert not tracing._TokenBucket(0).allow()
@@ -0,0 +1,101 @@
+# tests/test_weather_service.py
+import asyncio
+
+import pytest
+
+from app.services import weather_service
+from benchmarks.stubs import StubServer, weather_forecast, weather_stub
+
+@pytest.fixture
+def weather(monkeypatch):
+    """weather_service pointed at a stub server with an empty cache."""
+    def use(server: StubServer, ttl: float = 600.0):
+        monkeypatch.setattr(weather_service, "BASE_URL", server.url)
+        monkeypatch.setattr(weather_service, "CACHE_TTL", ttl)
+        return server
+
+    weather_service.clear_cache()
+    yield use
+    weather_service.clear_cache()
+
+def run(coro):
+    """Run against a fresh event loop, closing the shared client bound to it."""
+    async def main():
+        try:
+            return await coro
+        finally:
+            await weather_service.close_client()
+    return asyncio.run(main())
+
+def test_cached_within_ttl(weather):
+    with weather(weather_stub()) as server:
+        async def calls():
+            first = await weather_service.get_weather_forecast("Pune")
+            second = await weather_service.get_weather_forecast("  PUNE ")
+            return first, second
+
+        first, second = run(calls())
+    assert first == second
+    assert first["location"]["name"] == "Pune"
+    assert len(server.requests) == 1
+
+def test_refetched_after_ttl_expiry(weather):
+    with weather(weather_stub(), ttl=0.05) as server:
+        async def calls():
+            await weather_service.get_weather_forecast("Pune")
+            await asyncio.sleep(0.1)
+            await weather_service.get_weather_forecast("Pune")
+
+        run(calls())
+    assert len(server.requests) == 2
+
+def test_days_are_part_of_the_cache_key(weather):
+    with weather(weather_stub()) as server:
+        async def calls():
+            three = await weather_service.get_weather_forecast("Pune", days=3)
+            seven = await weather_service.get_weather_forecast("Pune", days=7)
+            return three, seven
+
+        three, seven = run(calls())
+    assert (len(three["forecast"]), len(seven["forecast"])) == (3, 7)
+    assert len(server.requests) == 2
+
+def test_concurrent_requests_share_one_upstream_call(weather):
+    with weather(weather_stub(delay_ms=100)) as server:
+        async def calls():
+            return await asyncio.gather(*[weather_service.get_weather_forecast("Nashik") for _ in range(20)])
+
+        results = run(calls())
+    assert len(server.requests) == 1
+    assert all(result == results[0] for result in results)
+
+def test_cancelled_caller_does_not_cancel_shared_fetch(weather):
+    with weather(weather_stub(delay_ms=100)) as server:
+        async def calls():
+            first = asyncio.ensure_future(weather_service.get_weather_forecast("Nagpur"))
+            second = asyncio.ensure_future(weather_service.get_weather_forecast("Nagpur"))
+            await asyncio.sleep(0.02)
+            first.cancel()
+            return await second
+
+        result = run(calls())
+    assert result["location"]["name"] == "Nagpur"
+    assert len(server.requests) == 1
+
+def test_upstream_errors_are_not_cached(weather):
+    responses = [(500, {"error": {"message": "boom"}})]
+
+    def route(path, params):
+        if responses:
+            return responses.pop()
+        return 200, weather_forecast(params["q"], int(params["days"]))
+
+    with weather(StubServer(route)) as server:
+        async def calls():
+            with pytest.raises(Exception, match="Error fetching weather data"):
+                await weather_service.get_weather_forecast("Pune")
+            return await weather_service.get_weather_forecast("Pune")
+
+        result = run(calls())
+    assert result["location"]["name"] == "Pune"
+    assert len(server.requests) == 2
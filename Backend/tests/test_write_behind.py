@@ -0,0 +1,32 @@
+# tests/test_write_behind.py
+import asyncio
+
+from app.core import write_behind
+from app.core.write_behind import COMMIT_RETRIES, WriteBehindQueue
+
+def test_enqueue_many_writes_every_document_under_backpressure(memory_storage):
+    queue = WriteBehindQueue(max_pending=3, batch_size=2, flush_interval=0.01)
+
+    async def main():
+        ids = await queue.enqueue_many("crop_data", [{"n": i} for i in range(10)])
+        ids.append(await queue.enqueue("crop_data", {"n": 10}))
+        await queue.drain()
+        return ids
+
+    ids = asyncio.run(main())
+    assert len(set(ids)) == 11
+    assert {doc_id: memory_storage.get("crop_data", doc_id)["n"] for doc_id in ids} == dict(zip(ids, range(11)))
+    assert queue.written == 11
+
+def test_failed_commit_does_not_sleep_after_the_last_attempt(monkeypatch):
+    sleeps = []
+    monkeypatch.setattr(write_behind.time, "sleep", sleeps.append)
+    queue = WriteBehindQueue()
+
+    def fail(batch):
+        raise ConnectionError("storage unavailable")
+
+    monkeypatch.setattr(queue, "_commit", fail)
+    queue._commit_with_retry([(("crop_data", "id", {}), None)])
+    assert len(sleeps) == COMMIT_RETRIES - 1
+    assert queue.dropped == 1